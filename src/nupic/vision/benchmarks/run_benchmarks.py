@@ -0,0 +1,553 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Benchmarks the throughput and memory use of the vision pipeline on synthetic
+MNIST-like digits, and optionally compares the results with a baseline.
+
+Each benchmark runs in a fresh process, so that its peak memory use is not
+affected by the other benchmarks. The time of the fastest of several repeats
+is reported. Benchmarks whose optional dependencies are missing are reported
+as skipped; benchmarks that raise any other error are reported as failed.
+
+Save a baseline with:
+
+    python -m nupic.vision.benchmarks.run_benchmarks --output baseline.json
+
+and compare a later run with it:
+
+    python -m nupic.vision.benchmarks.run_benchmarks --baseline baseline.json
+
+The comparison exits with status 1 if any benchmark is slower, or uses more
+memory, than the baseline by more than the tolerance, or if a benchmark that
+ran in the baseline is now skipped, failed or missing.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy
+from PIL import Image
+import yaml
+
+from nupic.vision.benchmarks.synthetic_digits import (createDigitArrays,
+                                                      createDigitImages,
+                                                      writeDigitDataset)
+
+# Filters in ImageSensorFilters and the arguments to benchmark them with
+FILTER_ARGS = [
+    ("AddBackgroundImage", {}),
+    ("AddNoise", {"noiseLevel": 0.2}),
+    ("AffineTransform", {"seed": 42}),
+    ("BoxFixer", {}),
+    ("Brightness", {"factor": 1.5}),
+    ("CenterSurroundConvolution", {}),
+    ("CenteredMultipleScales", {"scales": [0.5, 1]}),
+    ("Contrast", {"factor": 1.5}),
+    ("Crop", {"box": (2, 2, 26, 26)}),
+    ("EqualizeHistogram", {}),
+    ("FillBackground", {"value": 0}),
+    ("Flip", {"seed": 42}),
+    ("GaborConvolution", {}),
+    ("GaborFilter", {}),
+    ("GaussianBlur", {}),
+    ("Gradient", {"seed": 42}),
+    ("HistogramShift", {"seed": 42}),
+    ("Lines", {"seed": 42}),
+    ("LogPolar", {"xsize": 28, "ysize": 28, "c": 4}),
+    ("Mirror", {"seed": 42}),
+    ("MultipleScales", {"scales": [0.5, 1]}),
+    ("NormalizeContrast", {}),
+    ("Occlusion", {"seed": 42}),
+    ("PadToFit", {"width": 32, "height": 32}),
+    ("Resize", {"size": (32, 32)}),
+    ("Rotation2D", {"angles": [-15, 0, 15]}),
+    ("ScaleToFit", {"width": 32, "height": 32}),
+    ("Thicken", {}),
+    ("Tracking", {"targetDims": (32, 32)}),
+]
+
+# Explorers benchmarked through ImageSensor.compute, with the sensor size
+EXPLORER_ARGS = [
+    ("Flash", {}, 28),
+    ("RandomFlash", {"replacement": False, "seed": 42}, 28),
+    ("ExhaustiveSweep", {}, 16),
+    ("RandomSaccade", {"replacement": False, "saccadeMin": 7, "saccadeMax": 7,
+                       "numSaccades": 20, "maxDrift": -2, "seed": 42}, 28),
+]
+
+# Time per benchmark is compared with the baseline in items per second, and
+# memory as the increase of the peak resident set size during the benchmark
+_SPEED_KEY = "itemsPerSecond"
+_MEMORY_KEY = "rssIncreaseKB"
+
+
+
+def _getPeakRSS():
+  """ Return the peak resident set size of this process in KB """
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == "darwin":
+    # Reported in bytes instead of KB
+    peak /= 1024
+  return peak
+
+
+
+def _requireAlgorithms():
+  """
+  Raise ImportError if the _algorithms C extension used by the convolution
+  filters and GaborNode2 is missing. They only print a warning when it fails
+  to load, and then fail when they are used.
+  """
+  import nupic.bindings._algorithms #pylint: disable=W0612
+
+
+
+def _createOutputs(sensor, names):
+  outputs = {}
+  for name in names:
+    try:
+      count = sensor.getOutputElementCount(name)
+    except Exception:
+      count = 1
+    outputs[name] = numpy.zeros(max(count, 1), dtype=numpy.float32)
+  return outputs
+
+
+
+def _createSensor(explorer, size, dataDir=None):
+  if explorer[0] == "RandomSaccade":
+    # RandomSaccade needs the saccade outputs of SaccadeSensor
+    from nupic.vision.regions.SaccadeSensor import SaccadeSensor
+    sensor = SaccadeSensor(
+        width=size, height=size, mode="bw", background=0,
+        explorer=yaml.dump(explorer),
+        postFilters=yaml.dump([["Resize", {"size": (14, 14),
+                                           "method": "center"}]]))
+    outputNames = ["dataOut", "categoryOut", "resetOut", "saccadeOut"]
+  else:
+    from nupic.vision.regions.ImageSensor import ImageSensor
+    sensor = ImageSensor(width=size, height=size, mode="bw", background=0,
+                         explorer=yaml.dump(explorer))
+    outputNames = ["dataOut", "categoryOut", "resetOut"]
+  if dataDir is not None:
+    sensor.loadMultipleImages(dataDir)
+  return sensor, _createOutputs(sensor, outputNames)
+
+
+
+def _createLAImages(config):
+  images, _ = createDigitImages(config["numImages"], config["seed"])
+  for image in images:
+    image.putalpha(Image.new("L", image.size, 255))
+  return [image.convert("LA") for image in images]
+
+
+
+def benchmarkLoadMultipleImages(config):
+  from nupic.vision.regions.ImageSensor import ImageSensor
+  sensor = ImageSensor(width=28, height=28, mode="bw", background=0)
+  start = time.time()
+  sensor.loadMultipleImages(config["dataDir"])
+  return sensor.getParameter("numImages"), time.time() - start
+
+
+
+def benchmarkLoadArrayImages(config):
+  from nupic.vision.regions.ImageSensor import ImageSensor
+  sensor = ImageSensor(width=28, height=28, mode="bw", background=0)
+  pixels, digits = createDigitArrays(config["numImages"], config["seed"])
+  start = time.time()
+  sensor.loadArrayImages(pixels, digits)
+  return sensor.getParameter("numImages"), time.time() - start
+
+
+
+def benchmarkCompute(config, explorerName):
+  explorerArgs, size = [(args, size) for name, args, size in EXPLORER_ARGS
+                        if name == explorerName][0]
+  sensor, outputs = _createSensor([explorerName, explorerArgs], size,
+                                  config["dataDir"])
+  numIterations = config["numIterations"]
+  start = time.time()
+  for _ in xrange(numIterations):
+    sensor.compute(None, outputs)
+  return numIterations, time.time() - start
+
+
+
+def benchmarkIterateBatches(config):
+  """ ImageSensor outputs with the Flash explorer, 100 per batch """
+  sensor, _ = _createSensor(["Flash", {}], 28, config["dataDir"])
+  numIterations = config["numIterations"]
+  start = time.time()
+  for _ in sensor.iterateBatches(100, numIterations):
+    pass
+  return numIterations, time.time() - start
+
+
+
+def benchmarkFilter(config, filterName):
+  filterArgs = dict(FILTER_ARGS)[filterName]
+  module = __import__("nupic.vision.regions.ImageSensorFilters.%s"
+                      % filterName, {}, {}, filterName)
+  filterClass = getattr(module, filterName)
+  from nupic.vision.regions.ImageSensorFilters.Convolution import Convolution
+  if issubclass(filterClass, Convolution):
+    _requireAlgorithms()
+  filterObject = filterClass(**filterArgs)
+  filterObject.update(mode="gray", background=0)
+  images = _createLAImages(config)
+
+  start = time.time()
+  if getattr(filterObject, "supportsArrays", False):
+    from nupic.vision.regions.ImageSensorFilters.BaseFilter import (
+        imageToArrays)
+    for image in images:
+      filterObject.processArray(*imageToArrays(image))
+  else:
+    for image in images:
+      filterObject.process(image)
+  return len(images), time.time() - start
+
+
+
+def benchmarkGaborNode2(config):
+  from nupic.vision.regions.extra.GaborNode2 import GaborNode2
+  _requireAlgorithms()
+  gabor = GaborNode2()
+  gabor.prepare([(28, 28)])
+  images = [image.convert("L") for image in _createLAImages(config)]
+  start = time.time()
+  for image in images:
+    gabor.filter(image)
+  return len(images), time.time() - start
+
+
+
+def _createPCAInputs(config):
+  pixels, _ = createDigitArrays(config["numImages"], config["seed"])
+  return pixels.reshape(len(pixels), -1).astype(numpy.float32) / 255
+
+
+
+def _createPCANode(config):
+  from nupic.vision.regions.PCANode import PCANode
+  return PCANode(SVDSampleCount=config["numImages"], SVDDimCount=20,
+                 bottomUpCount=28 * 28)
+
+
+
+def benchmarkPCANodeLearn(config):
+  """ Collect the samples and compute the SVD """
+  inputs = _createPCAInputs(config)
+  pca = _createPCANode(config)
+  outputs = numpy.zeros(28 * 28, dtype=numpy.float32)
+  start = time.time()
+  for vector in inputs:
+    pca.compute(vector, outputs)
+  pca.computeSVD()
+  return len(inputs), time.time() - start
+
+
+
+def benchmarkPCANodeInfer(config):
+  inputs = _createPCAInputs(config)
+  pca = _createPCANode(config)
+  outputs = numpy.zeros(28 * 28, dtype=numpy.float32)
+  for vector in inputs:
+    pca.compute(vector, outputs)
+  pca.computeSVD()
+  start = time.time()
+  for vector in inputs:
+    pca.compute(vector, outputs)
+  return len(inputs), time.time() - start
+
+
+
+def benchmarkPCANodeProjectBatch(config):
+  inputs = _createPCAInputs(config)
+  pca = _createPCANode(config)
+  outputs = numpy.zeros(28 * 28, dtype=numpy.float32)
+  for vector in inputs:
+    pca.compute(vector, outputs)
+  pca.computeSVD()
+  start = time.time()
+  pca.projectBatch(inputs)
+  return len(inputs), time.time() - start
+
+
+
+def _createMNISTNetwork(config):
+  """ Create the run_mnist_experiment network with the images loaded """
+  from nupic.vision.mnist.run_mnist_experiment import createNetwork
+  net = createNetwork()
+  net.regions["sensor"].executeCommand(["loadMultipleImages",
+                                        config["dataDir"]])
+  net.regions["sensor"].setParameter("explorer", yaml.dump(["Flash"]))
+  return net
+
+
+
+def _setModes(net, spLearning, classifierLearning, classifierInference):
+  net.regions["SP"].setParameter("learningMode", int(spLearning))
+  net.regions["SP"].setParameter("inferenceMode", int(not spLearning))
+  net.regions["classifier"].setParameter("learningMode",
+                                         int(classifierLearning))
+  net.regions["classifier"].setParameter("inferenceMode",
+                                         int(classifierInference))
+
+
+
+def benchmarkTrainSP(config):
+  """ Sensor -> SP with SP learning, as in the first pass of trainNetwork """
+  net = _createMNISTNetwork(config)
+  _setModes(net, True, False, False)
+  start = time.time()
+  net.run(config["numImages"])
+  return config["numImages"], time.time() - start
+
+
+
+def benchmarkTrainClassifier(config):
+  """ Sensor -> SP -> KNN with classifier learning """
+  net = _createMNISTNetwork(config)
+  _setModes(net, False, True, False)
+  start = time.time()
+  net.run(config["numImages"])
+  return config["numImages"], time.time() - start
+
+
+
+def benchmarkInfer(config):
+  """ Sensor -> SP -> KNN inference after learning the same images """
+  net = _createMNISTNetwork(config)
+  _setModes(net, False, True, False)
+  net.run(config["numImages"])
+  _setModes(net, False, False, True)
+  start = time.time()
+  net.run(config["numImages"])
+  return config["numImages"], time.time() - start
+
+
+
+def getBenchmarks():
+  """ Return the list of (name, function, extra arguments) to run """
+  benchmarks = [("loadMultipleImages", benchmarkLoadMultipleImages, ()),
+                ("loadArrayImages", benchmarkLoadArrayImages, ())]
+  benchmarks.extend(("compute/%s" % name, benchmarkCompute, (name,))
+                    for name, _, _ in EXPLORER_ARGS)
+  benchmarks.append(("iterateBatches", benchmarkIterateBatches, ()))
+  benchmarks.extend(("filter/%s" % name, benchmarkFilter, (name,))
+                    for name, _ in FILTER_ARGS)
+  benchmarks.extend([
+      ("GaborNode2", benchmarkGaborNode2, ()),
+      ("PCANode/learn", benchmarkPCANodeLearn, ()),
+      ("PCANode/infer", benchmarkPCANodeInfer, ()),
+      ("PCANode/projectBatch", benchmarkPCANodeProjectBatch, ()),
+      ("network/trainSP", benchmarkTrainSP, ()),
+      ("network/trainClassifier", benchmarkTrainClassifier, ()),
+      ("network/infer", benchmarkInfer, ()),
+  ])
+  return benchmarks
+
+
+
+def _measure(args):
+  """
+  Run one repeat of a benchmark. Runs in a fresh worker process.
+  """
+  name, config = args
+  function, extraArgs = [(function, extraArgs)
+                         for benchmarkName, function, extraArgs
+                         in getBenchmarks() if benchmarkName == name][0]
+  startRSS = _getPeakRSS()
+  try:
+    numItems, seconds = function(config, *extraArgs)
+  except ImportError as e:
+    # An optional dependency is missing
+    return {"skipped": "%s: %s" % (type(e).__name__, e)}
+  except Exception as e:
+    return {"failed": "%s: %s" % (type(e).__name__, e)}
+  peakRSS = _getPeakRSS()
+  return {"items": numItems,
+          "seconds": seconds,
+          _SPEED_KEY: numItems / seconds if seconds > 0 else 0.0,
+          "peakRSSKB": peakRSS,
+          _MEMORY_KEY: peakRSS - startRSS}
+
+
+
+def runBenchmarks(config, repeat=3, pattern=None):
+  """
+  Run the benchmarks whose name matches the regular expression pattern, each
+  repeat times in its own process.
+
+  :return: {name: result}; the result of the fastest repeat is kept, with the
+    largest memory increase of all repeats
+  """
+  results = {}
+  for name, _, _ in getBenchmarks():
+    if pattern is not None and not re.search(pattern, name):
+      continue
+    best = None
+    for _ in xrange(repeat):
+      pool = multiprocessing.Pool(1, maxtasksperchild=1)
+      try:
+        result = pool.apply(_measure, ((name, config),))
+      finally:
+        pool.close()
+        pool.join()
+      if "skipped" in result or "failed" in result:
+        best = result
+        break
+      if best is None or result["seconds"] < best["seconds"]:
+        memory = max(result[_MEMORY_KEY],
+                     best[_MEMORY_KEY] if best is not None else 0)
+        best = result
+        best[_MEMORY_KEY] = memory
+    results[name] = best
+    if "skipped" in best:
+      print "{:<36} skipped ({reason})".format(name, reason=best["skipped"])
+    elif "failed" in best:
+      print "{:<36} FAILED ({reason})".format(name, reason=best["failed"])
+    else:
+      print "{:<36}{:>12.1f} items/s{:>10d} KB".format(
+          name, best[_SPEED_KEY], best[_MEMORY_KEY])
+  return results
+
+
+
+def compareResults(results, baseline, tolerance):
+  """
+  Print a comparison of results with the baseline results.
+
+  :return: Names of the benchmarks that are slower, or use more memory, than
+    the baseline by more than the fraction tolerance, and of the benchmarks
+    that ran in the baseline but are now skipped, failed or missing
+  """
+  regressions = []
+  print "{:<36}{:>14}{:>14}{:>9}{:>9}  {}".format(
+      "Benchmark", "Base items/s", "Items/s", "Speed", "Memory", "Status")
+  for name in sorted(set(results) | set(baseline)):
+    result = results.get(name)
+    base = baseline.get(name)
+    baseRan = base is not None and _SPEED_KEY in base
+    if result is None or _SPEED_KEY not in result or not baseRan:
+      if result is None:
+        status = "missing"
+      elif "skipped" in result:
+        status = "skipped"
+      elif "failed" in result:
+        status = "failed"
+      else:
+        status = "new" if base is None else "did not run in baseline"
+      if baseRan:
+        regressions.append(name)
+        status = status.upper()
+      print "{:<36}{:>14}{:>14}{:>9}{:>9}  {}".format(name, "", "", "", "",
+                                                      status)
+      continue
+
+    speed = result[_SPEED_KEY] / base[_SPEED_KEY] - 1
+    # Small memory increases are noise from the allocator
+    memory = (result[_MEMORY_KEY] - base[_MEMORY_KEY]) / float(
+        max(base[_MEMORY_KEY], 1024))
+    status = "ok"
+    if speed < -tolerance:
+      status = "SLOWER"
+    if memory > tolerance:
+      status = "SLOWER, MORE MEMORY" if status != "ok" else "MORE MEMORY"
+    if status != "ok":
+      regressions.append(name)
+    print "{:<36}{:>14.1f}{:>14.1f}{:>+8.0f}%{:>+8.0f}%  {}".format(
+        name, base[_SPEED_KEY], result[_SPEED_KEY], 100 * speed,
+        100 * memory, status)
+  return regressions
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--output", default=None,
+                      help="Write the results to this JSON file")
+  parser.add_argument("--baseline", default=None,
+                      help="Compare the results with this JSON results file")
+  parser.add_argument("--tolerance", type=float, default=0.1,
+                      help=("Fraction by which a benchmark may be slower, or "
+                            "use more memory, than the baseline"))
+  parser.add_argument("--num-images", dest="numImages", type=int, default=200,
+                      help="Number of synthetic digit images")
+  parser.add_argument("--num-iterations", dest="numIterations", type=int,
+                      default=500,
+                      help="Number of sensor computes per explorer benchmark")
+  parser.add_argument("--repeat", type=int, default=3,
+                      help="Number of times each benchmark is run")
+  parser.add_argument("--seed", type=int, default=42,
+                      help="Seed for the synthetic digits")
+  parser.add_argument("--benchmarks", dest="pattern", default=None,
+                      help="Only run benchmarks matching this regex")
+  args = parser.parse_args()
+
+  dataDir = tempfile.mkdtemp(prefix="vision_benchmarks_")
+  try:
+    writeDigitDataset(dataDir, args.numImages, args.seed)
+    config = {"dataDir": dataDir,
+              "numImages": args.numImages,
+              "numIterations": args.numIterations,
+              "seed": args.seed}
+    results = runBenchmarks(config, args.repeat, args.pattern)
+  finally:
+    shutil.rmtree(dataDir, ignore_errors=True)
+
+  if args.output is not None:
+    with open(args.output, "w") as f:
+      json.dump({"date": datetime.datetime.now().isoformat(),
+                 "platform": platform.platform(),
+                 "python": platform.python_version(),
+                 "numpy": numpy.__version__,
+                 "config": dict((key, value) for key, value
+                                in config.iteritems() if key != "dataDir"),
+                 "results": results}, f, indent=2, sort_keys=True)
+    print "Saved results to",args.output
+
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    baselineResults = dict((name, result) for name, result
+                           in baseline["results"].iteritems()
+                           if args.pattern is None or
+                           re.search(args.pattern, name))
+    regressions = compareResults(results, baselineResults, args.tolerance)
+    if regressions:
+      print "Regressions:",", ".join(regressions)
+      sys.exit(1)
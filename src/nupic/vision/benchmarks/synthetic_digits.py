@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Generates MNIST-like images of handwritten digits, so that the vision
+pipeline can be exercised without downloading MNIST.
+
+Each digit is drawn as a set of strokes on a unit square. The stroke vertices,
+the stroke width, the rotation and the position are jittered with a seeded
+random number generator, so the same seed always gives the same images.
+"""
+
+import os
+
+import numpy
+from PIL import Image, ImageDraw
+
+# Strokes of each digit as polylines of (x, y) points in [0, 1]
+_DIGIT_STROKES = {
+    0: [[(0.5, 0.0), (0.15, 0.2), (0.1, 0.5), (0.15, 0.8), (0.5, 1.0),
+         (0.85, 0.8), (0.9, 0.5), (0.85, 0.2), (0.5, 0.0)]],
+    1: [[(0.3, 0.2), (0.55, 0.0), (0.55, 1.0)]],
+    2: [[(0.15, 0.2), (0.5, 0.0), (0.85, 0.2), (0.8, 0.45), (0.1, 1.0),
+         (0.9, 1.0)]],
+    3: [[(0.15, 0.1), (0.5, 0.0), (0.85, 0.15), (0.8, 0.4), (0.45, 0.5)],
+        [(0.45, 0.5), (0.85, 0.6), (0.85, 0.9), (0.5, 1.0), (0.15, 0.9)]],
+    4: [[(0.65, 1.0), (0.65, 0.0), (0.1, 0.7), (0.9, 0.7)]],
+    5: [[(0.85, 0.0), (0.2, 0.0), (0.15, 0.45), (0.6, 0.4), (0.85, 0.65),
+         (0.75, 0.9), (0.45, 1.0), (0.15, 0.9)]],
+    6: [[(0.75, 0.0), (0.3, 0.3), (0.15, 0.7), (0.35, 1.0), (0.75, 0.95),
+         (0.85, 0.7), (0.6, 0.5), (0.3, 0.55), (0.15, 0.7)]],
+    7: [[(0.1, 0.0), (0.9, 0.0), (0.4, 1.0)], [(0.3, 0.5), (0.75, 0.5)]],
+    8: [[(0.5, 0.5), (0.2, 0.3), (0.3, 0.05), (0.7, 0.05), (0.8, 0.3),
+         (0.5, 0.5), (0.15, 0.7), (0.3, 0.95), (0.7, 0.95), (0.85, 0.7),
+         (0.5, 0.5)]],
+    9: [[(0.85, 0.3), (0.6, 0.5), (0.25, 0.45), (0.15, 0.2), (0.4, 0.0),
+         (0.8, 0.05), (0.85, 0.3), (0.7, 0.7), (0.4, 1.0)]],
+}
+
+
+
+def createDigitImage(digit, random, size=28, jitter=0.06):
+  """
+  Draw a single digit and return it as an 'L' image of size x size pixels
+  with white strokes on a black background, like MNIST.
+
+  :param int digit: The digit to draw, 0 to 9
+  :param random: numpy RandomState used to jitter the digit
+  :param int size: Width and height of the image
+  :param float jitter: Standard deviation of the vertex jitter, relative to
+    the height of the digit
+  """
+  # Draw at 4x resolution and downsample to get antialiased strokes
+  scale = 4
+  canvasSize = size * scale
+  height = canvasSize * random.uniform(0.6, 0.75)
+  width = height * random.uniform(0.55, 0.8)
+  left = (canvasSize - width) / 2 + random.uniform(-0.08, 0.08) * canvasSize
+  top = (canvasSize - height) / 2 + random.uniform(-0.08, 0.08) * canvasSize
+  strokeWidth = int(round(random.uniform(1.5, 3.0) * scale))
+
+  canvas = Image.new("L", (canvasSize, canvasSize), 0)
+  draw = ImageDraw.Draw(canvas)
+  for stroke in _DIGIT_STROKES[digit]:
+    points = numpy.array(stroke) + random.normal(0, jitter, (len(stroke), 2))
+    points = [(left + x * width, top + y * height) for x, y in points]
+    draw.line(points, fill=255, width=strokeWidth)
+    # Round the joints and ends of the stroke
+    radius = strokeWidth / 2.0
+    for x, y in points:
+      draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=255)
+
+  canvas = canvas.rotate(random.uniform(-15, 15), Image.BILINEAR)
+  return canvas.resize((size, size), Image.ANTIALIAS)
+
+
+
+def createDigitImages(numImages, seed=42, size=28):
+  """
+  Create numImages digit images, cycling through the digits 0 to 9.
+
+  :return: (list of 'L' images, list of digits)
+  """
+  random = numpy.random.RandomState(seed)
+  digits = [i % 10 for i in xrange(numImages)]
+  images = [createDigitImage(digit, random, size) for digit in digits]
+  return images, digits
+
+
+
+def createDigitArrays(numImages, seed=42, size=28):
+  """
+  Same as createDigitImages, but return the images as a uint8 array of shape
+  (numImages, size, size) together with an int32 array of the digits.
+  """
+  images, digits = createDigitImages(numImages, seed, size)
+  pixels = numpy.zeros((numImages, size, size), dtype=numpy.uint8)
+  for i, image in enumerate(images):
+    pixels[i] = numpy.asarray(image)
+  return pixels, numpy.array(digits, dtype=numpy.int32)
+
+
+
+def writeDigitDataset(dataDir, numImages, seed=42, size=28):
+  """
+  Write numImages digit images as PNG files to dataDir, in one subdirectory
+  per digit, the layout loadMultipleImages expects for MNIST.
+
+  :return: dataDir
+  """
+  images, digits = createDigitImages(numImages, seed, size)
+  for i, (image, digit) in enumerate(zip(images, digits)):
+    digitDir = os.path.join(dataDir, str(digit))
+    if not os.path.exists(digitDir):
+      os.makedirs(digitDir)
+    image.save(os.path.join(digitDir, "%d.png" % i))
+  return dataDir
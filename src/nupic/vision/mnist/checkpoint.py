@@ -0,0 +1,163 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Periodic checkpoints for long training runs.
+
+A checkpoint is a directory containing the saved network and a pickled
+dictionary with the rest of the training state, e.g. the image index, the
+sensor's explorer state and accumulated statistics. The Python and numpy
+random states are saved with it. Checkpoints are written to a temporary
+directory first, and a small pointer file naming the latest complete
+checkpoint is replaced atomically, so a crash while saving leaves the previous
+checkpoint intact.
+"""
+
+import cPickle as pickle
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy
+
+_LATEST_FILE = "latest"
+_NETWORK_FILE = "network.nta"
+_STATE_FILE = "state.pkl"
+
+
+
+class Checkpointer(object):
+  """
+  Saves a checkpoint every N images and/or every T minutes.
+  """
+
+
+  def __init__(self, checkpointDir, everyImages=None, everyMinutes=None):
+    """
+    :param str checkpointDir: Directory the checkpoints are written to
+    :param int everyImages: (optional) Save after this many images
+    :param float everyMinutes: (optional) Save when this many minutes have
+      passed since the last checkpoint
+    """
+    self.checkpointDir = checkpointDir
+    self.everyImages = everyImages
+    self.everyMinutes = everyMinutes
+
+    if not os.path.exists(checkpointDir):
+      os.makedirs(checkpointDir)
+
+    self._numImages = 0
+    self._lastSaveTime = time.time()
+
+
+  def step(self, numImages=1):
+    """
+    Count numImages more images and return True if a checkpoint is due.
+    """
+    self._numImages += numImages
+    if self.everyImages and self._numImages >= self.everyImages:
+      return True
+    if (self.everyMinutes and
+        time.time() - self._lastSaveTime >= 60 * self.everyMinutes):
+      return True
+    return False
+
+
+  def save(self, net, state):
+    """
+    Save the network and the state dictionary as the latest checkpoint.
+    """
+    print "Saving checkpoint to {path}".format(path=self.checkpointDir)
+    tmpDir = tempfile.mkdtemp(prefix=".tmp_", dir=self.checkpointDir)
+    try:
+      net.save(os.path.join(tmpDir, _NETWORK_FILE))
+
+      state = dict(state)
+      state["pythonRandomState"] = random.getstate()
+      state["numpyRandomState"] = numpy.random.get_state()
+      with open(os.path.join(tmpDir, _STATE_FILE), "wb") as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+
+      name = "checkpoint_%s" % time.strftime("%Y_%m_%d_%H_%M_%S")
+      suffix = 0
+      while os.path.exists(os.path.join(self.checkpointDir, name)):
+        suffix += 1
+        name = "checkpoint_%s_%d" % (time.strftime("%Y_%m_%d_%H_%M_%S"),
+                                     suffix)
+      os.rename(tmpDir, os.path.join(self.checkpointDir, name))
+    except:
+      shutil.rmtree(tmpDir, ignore_errors=True)
+      raise
+
+    previous = self._getLatestName()
+    self._setLatestName(name)
+    if previous is not None and previous != name:
+      shutil.rmtree(os.path.join(self.checkpointDir, previous),
+                    ignore_errors=True)
+
+    self._numImages = 0
+    self._lastSaveTime = time.time()
+
+
+  def load(self):
+    """
+    Restore the Python and numpy random states of the latest checkpoint.
+
+    :return: (path of the saved network, state dictionary), or None if there
+      is no checkpoint
+    """
+    name = self._getLatestName()
+    if name is None:
+      return None
+
+    path = os.path.join(self.checkpointDir, name)
+    print "Loading checkpoint from {path}".format(path=path)
+    with open(os.path.join(path, _STATE_FILE), "rb") as f:
+      state = pickle.load(f)
+    random.setstate(state.pop("pythonRandomState"))
+    numpy.random.set_state(state.pop("numpyRandomState"))
+
+    self._numImages = 0
+    self._lastSaveTime = time.time()
+
+    return os.path.join(path, _NETWORK_FILE), state
+
+
+  def _getLatestName(self):
+    latestPath = os.path.join(self.checkpointDir, _LATEST_FILE)
+    if not os.path.exists(latestPath):
+      return None
+    with open(latestPath) as f:
+      return f.read().strip()
+
+
+  def _setLatestName(self, name):
+    latestPath = os.path.join(self.checkpointDir, _LATEST_FILE)
+    tmpPath = latestPath + ".tmp"
+    with open(tmpPath, "w") as f:
+      f.write(name + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+    os.rename(tmpPath, latestPath)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Serves a saved MNIST network for classifying single images.
+
+The network is loaded once. Requests from concurrent clients are queued and
+grouped into micro-batches: a batch is run as soon as it is full, or when the
+oldest request in it has waited for the maximum delay. The images of a batch
+are handed to the sensor as arrays, without going through files, and run
+through the sensor, SP and classifier one after the other.
+
+The server listens on localhost over HTTP:
+
+    POST /classify    Body: JSON {"pixels": [[...], ...]} with 28x28 or
+                      32x32 gray values, or the 784 or 1024 raw bytes of the
+                      image with Content-Type application/octet-stream.
+                      Returns JSON {"category": c, "scores": [...]}.
+    GET /stats        Returns the throughput and latency counters as JSON.
+
+or, with --unix-socket, on a Unix socket with one JSON object per line:
+{"pixels": ...} to classify an image, {"command": "stats"} for the counters.
+"""
+
+import argparse
+import BaseHTTPServer
+import collections
+import json
+import os
+import Queue
+import SocketServer
+import threading
+import time
+
+import numpy
+import yaml
+
+from nupic.engine import Network
+
+# Image sizes the server accepts
+IMAGE_SIZES = (28, 32)
+
+# Number of recent requests the latency percentiles are computed from
+_LATENCY_WINDOW = 10000
+
+
+
+def toPixelArray(pixels):
+  """
+  Convert the pixels of a request to a square uint8 array, checking its size.
+
+  :param pixels: Nested lists of gray values, or a string of raw bytes
+  :raises ValueError: if the image is not 28x28 or 32x32
+  """
+  if isinstance(pixels, str):
+    array = numpy.frombuffer(pixels, dtype=numpy.uint8)
+    size = int(round(numpy.sqrt(len(array))))
+    if size * size == len(array):
+      array = array.reshape(size, size)
+  else:
+    array = numpy.asarray(pixels)
+    if array.dtype != numpy.uint8:
+      if array.size and (array.min() < 0 or array.max() > 255):
+        raise ValueError("Pixel values must be in [0, 255]")
+      array = array.astype(numpy.uint8)
+
+  if array.ndim != 2 or array.shape[0] != array.shape[1] or \
+      array.shape[0] not in IMAGE_SIZES:
+    raise ValueError("Expected a 28x28 or 32x32 image, got shape %s"
+                     % (array.shape,))
+  return array
+
+
+
+class _Request(object):
+  """ One queued image and, once classified, its result """
+
+  def __init__(self, pixels):
+    self.pixels = pixels
+    self.arrivalTime = time.time()
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+
+
+class InferenceServer(object):
+  """
+  Classifies images with a saved network, batching concurrent requests.
+
+  classify() may be called from any number of threads. The network is only
+  ever used by the batching thread started by start().
+  """
+
+
+  def __init__(self, savedNetworkFile, maxBatchSize=32, maxDelay=0.005):
+    """
+    :param str savedNetworkFile: Network saved by run_mnist_experiment
+    :param int maxBatchSize: Maximum number of images per batch
+    :param float maxDelay: Maximum time in seconds a request waits for more
+      requests to join its batch
+    """
+    self.net = Network(savedNetworkFile)
+    self.maxBatchSize = maxBatchSize
+    self.maxDelay = maxDelay
+
+    self.sensor = self.net.regions["sensor"]
+    self.classifier = self.net.regions["classifier"]
+    sp = self.net.regions["SP"]
+
+    self.sensor.setParameter("explorer", yaml.dump(["Flash"]))
+    sp.setParameter("inferenceMode", 1)
+    sp.setParameter("learningMode", 0)
+    self.classifier.setParameter("inferenceMode", 1)
+    self.classifier.setParameter("learningMode", 0)
+
+    self._queue = Queue.Queue()
+    self._thread = None
+
+    self._statsLock = threading.Lock()
+    self.resetStats()
+
+
+  def start(self):
+    """ Start the batching thread """
+    self._thread = threading.Thread(target=self._batchLoop,
+                                    name="InferenceServer")
+    self._thread.daemon = True
+    self._thread.start()
+
+
+  def stop(self):
+    """ Stop the batching thread after the queued requests are done """
+    self._queue.put(None)
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+
+  def classify(self, pixels):
+    """
+    Classify one image. Blocks until the batch containing it has run.
+
+    :param pixels: 28x28 or 32x32 image, see toPixelArray
+    :return: {"category": inferred category, "scores": classifier output}
+    """
+    request = _Request(toPixelArray(pixels))
+    self._queue.put(request)
+    request.done.wait()
+    if request.error is not None:
+      raise request.error
+    return request.result
+
+
+  def resetStats(self):
+    with self._statsLock:
+      self._startTime = time.time()
+      self._numRequests = 0
+      self._numBatches = 0
+      self._numErrors = 0
+      self._computeTime = 0.0
+      self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+
+
+  def getStats(self):
+    """
+    Return the throughput and latency counters since the last resetStats().
+    Latencies are from the arrival of a request to its result, in
+    milliseconds, over the most recent requests.
+    """
+    with self._statsLock:
+      uptime = time.time() - self._startTime
+      latencies = 1000 * numpy.array(self._latencies)
+      stats = {
+          "uptime": uptime,
+          "requests": self._numRequests,
+          "errors": self._numErrors,
+          "batches": self._numBatches,
+          "queued": self._queue.qsize(),
+          "meanBatchSize": (float(self._numRequests) / self._numBatches
+                            if self._numBatches else 0.0),
+          "requestsPerSecond": (self._numRequests / uptime
+                                if uptime > 0 else 0.0),
+          "computeRequestsPerSecond": (self._numRequests / self._computeTime
+                                       if self._computeTime > 0 else 0.0),
+      }
+    for percentile in (50, 95, 99):
+      stats["latencyP%dMs" % percentile] = (
+          float(numpy.percentile(latencies, percentile))
+          if len(latencies) else 0.0)
+    stats["latencyMeanMs"] = float(latencies.mean()) if len(latencies) else 0.0
+    return stats
+
+
+  def _getBatch(self):
+    """
+    Wait for a request, then collect more until the batch is full or the
+    first request has waited maxDelay. Returns None when stopped.
+    """
+    request = self._queue.get()
+    if request is None:
+      return None
+    batch = [request]
+    deadline = request.arrivalTime + self.maxDelay
+    while len(batch) < self.maxBatchSize:
+      timeout = deadline - time.time()
+      try:
+        if timeout > 0:
+          request = self._queue.get(timeout=timeout)
+        else:
+          request = self._queue.get_nowait()
+      except Queue.Empty:
+        break
+      if request is None:
+        # Run what we have, then stop
+        self._queue.put(None)
+        break
+      batch.append(request)
+    return batch
+
+
+  def _batchLoop(self):
+    while True:
+      batch = self._getBatch()
+      if batch is None:
+        break
+
+      start = time.time()
+      try:
+        results = self._classifyBatch([request.pixels for request in batch])
+        error = None
+      except Exception as e:
+        results = [None] * len(batch)
+        error = e
+      end = time.time()
+
+      with self._statsLock:
+        self._numBatches += 1
+        self._numRequests += len(batch)
+        self._computeTime += end - start
+        if error is not None:
+          self._numErrors += len(batch)
+        for request in batch:
+          self._latencies.append(end - request.arrivalTime)
+
+      for request, result in zip(batch, results):
+        request.result = result
+        request.error = error
+        request.done.set()
+
+
+  def _classifyBatch(self, images):
+    """
+    Load the images into the sensor and run each through the network.
+    """
+    pysensor = self.sensor.getSelf()
+    if len(set(pixels.shape for pixels in images)) == 1:
+      pysensor.loadArrayImages(numpy.array(images))
+    else:
+      # 28x28 and 32x32 images can't share an array
+      pysensor.clearImageList(skipExplorerUpdate=True)
+      for pixels in images:
+        pysensor.loadArrayImages(pixels[numpy.newaxis], clearImageList=False)
+
+    # The explorer moves to the next image before each output, so seek to the
+    # last image to start with the first one.
+    pysensor.seek(image=len(images) - 1)
+    results = []
+    for _ in images:
+      self.net.run(1)
+      scores = self.classifier.getOutputData("categoriesOut")
+      results.append({"category": int(scores.argmax()),
+                      "scores": [float(score) for score in scores]})
+    return results
+
+
+
+class _HTTPRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+  def _sendJSON(self, code, response):
+    body = json.dumps(response)
+    self.send_response(code)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+
+  def do_GET(self):
+    if self.path == "/stats":
+      self._sendJSON(200, self.server.inferenceServer.getStats())
+    else:
+      self._sendJSON(404, {"error": "Unknown path %s" % self.path})
+
+
+  def do_POST(self):
+    if self.path != "/classify":
+      self._sendJSON(404, {"error": "Unknown path %s" % self.path})
+      return
+    body = self.rfile.read(int(self.headers.getheader("Content-Length", 0)))
+    try:
+      if self.headers.getheader("Content-Type") == "application/octet-stream":
+        pixels = body
+      else:
+        pixels = json.loads(body)["pixels"]
+      result = self.server.inferenceServer.classify(pixels)
+    except (ValueError, KeyError, TypeError) as e:
+      self._sendJSON(400, {"error": str(e)})
+      return
+    except Exception as e:
+      self._sendJSON(500, {"error": "%s: %s" % (type(e).__name__, e)})
+      return
+    self._sendJSON(200, result)
+
+
+  def log_message(self, *args):
+    # Logging every request costs more than classifying it
+    pass
+
+
+
+class _UnixRequestHandler(SocketServer.StreamRequestHandler):
+
+  def handle(self):
+    # One JSON request per line, until the client disconnects
+    for line in iter(self.rfile.readline, ""):
+      try:
+        request = json.loads(line)
+        if request.get("command") == "stats":
+          response = self.server.inferenceServer.getStats()
+        else:
+          response = self.server.inferenceServer.classify(request["pixels"])
+      except Exception as e:
+        response = {"error": "%s: %s" % (type(e).__name__, e)}
+      self.wfile.write(json.dumps(response) + "\n")
+      self.wfile.flush()
+
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+
+
+
+class _ThreadingUnixServer(SocketServer.ThreadingMixIn,
+                           SocketServer.UnixStreamServer):
+  daemon_threads = True
+
+
+
+def createServer(inferenceServer, port=8080, unixSocket=None):
+  """
+  Create a threading server for inferenceServer, on the given Unix socket
+  path, or else on the given port of localhost. Each connection is handled in
+  its own thread so that concurrent requests can share batches.
+  """
+  if unixSocket is not None:
+    if os.path.exists(unixSocket):
+      os.remove(unixSocket)
+    server = _ThreadingUnixServer(unixSocket, _UnixRequestHandler)
+  else:
+    server = _ThreadingHTTPServer(("127.0.0.1", port), _HTTPRequestHandler)
+  server.inferenceServer = inferenceServer
+  return server
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("network",
+                      help="Network saved by run_mnist_experiment")
+  parser.add_argument("--port", type=int, default=8080,
+                      help="Port of the HTTP server on localhost")
+  parser.add_argument("--unix-socket", dest="unixSocket", default=None,
+                      help="Listen on this Unix socket instead of HTTP")
+  parser.add_argument("--max-batch-size", dest="maxBatchSize", type=int,
+                      default=32, help="Maximum number of images per batch")
+  parser.add_argument("--max-delay-ms", dest="maxDelayMs", type=float,
+                      default=5.0,
+                      help=("Maximum time a request waits for others to "
+                            "join its batch, in milliseconds"))
+  args = parser.parse_args()
+
+  inferenceServer = InferenceServer(args.network, args.maxBatchSize,
+                                    args.maxDelayMs / 1000.0)
+  inferenceServer.start()
+  server = createServer(inferenceServer, args.port, args.unixSocket)
+  print "Serving",args.network,"on",args.unixSocket or \
+      "http://127.0.0.1:%d" % args.port
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    inferenceServer.stop()
+    if args.unixSocket is not None and os.path.exists(args.unixSocket):
+      os.remove(args.unixSocket)
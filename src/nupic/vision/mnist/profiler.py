@@ -0,0 +1,168 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Per-region timing for experiments driven through the Network API.
+
+NetworkProfiler turns on the network's region compute timers and reads them
+around each image, so that it can report the total compute time of every
+region as well as the distribution of its time per image.
+"""
+
+import json
+import os
+import time
+
+import numpy
+
+_PERCENTILES = (50, 95, 99)
+
+
+
+class NetworkProfiler(object):
+  """
+  Records the compute time of each region of a network per image.
+
+  Use run() instead of net.run() for images that take a single call, or wrap
+  the calls for one image in beginImage() and endImage(). Call report() at the
+  end of each phase.
+  """
+
+
+  def __init__(self, net, outputDir=None):
+    """
+    :param net: The Network to profile
+    :param str outputDir: (optional) Directory report() writes a JSON file
+      per phase to
+    """
+    self.net = net
+    self.outputDir = outputDir
+    self.regionNames = sorted(net.regions.keys())
+
+    if outputDir is not None and not os.path.exists(outputDir):
+      os.makedirs(outputDir)
+
+    net.enableProfiling()
+    self.reset()
+
+
+  def reset(self):
+    """ Clear all timings """
+    self.net.resetProfiling()
+    self._imageTimes = dict((name, []) for name in self.regionNames)
+    self._imageTimes["total"] = []
+    self._imageStart = None
+    self._phaseStart = time.time()
+
+
+  def _getElapsed(self):
+    return dict((name, self.net.regions[name].getComputeTimer().getElapsed())
+                for name in self.regionNames)
+
+
+  def beginImage(self):
+    self._imageStart = (time.time(), self._getElapsed())
+
+
+  def endImage(self):
+    wallStart, elapsedStart = self._imageStart
+    elapsed = self._getElapsed()
+    for name in self.regionNames:
+      self._imageTimes[name].append(elapsed[name] - elapsedStart[name])
+    self._imageTimes["total"].append(time.time() - wallStart)
+    self._imageStart = None
+
+
+  def run(self, n=1):
+    """ Run the network for n iterations, timed as one image """
+    self.beginImage()
+    self.net.run(n)
+    self.endImage()
+
+
+  def getStats(self):
+    """
+    Return a dictionary with the statistics of each region, and of the total
+    time per image under "total". Times are in seconds, percentiles are of the
+    time per image.
+    """
+    stats = {}
+    wallTime = time.time() - self._phaseStart
+    for name in self.regionNames + ["total"]:
+      times = numpy.array(self._imageTimes[name])
+      if name == "total":
+        computeTime = times.sum()
+        calls = len(times)
+      else:
+        timer = self.net.regions[name].getComputeTimer()
+        computeTime = timer.getElapsed()
+        calls = timer.getStartCount()
+      regionStats = {
+          "computeTime": computeTime,
+          "calls": calls,
+          "callsPerSecond": calls / computeTime if computeTime > 0 else 0.0,
+          "fractionOfWallTime": computeTime / wallTime if wallTime > 0 else 0.0,
+      }
+      for percentile in _PERCENTILES:
+        if len(times):
+          value = numpy.percentile(times, percentile)
+        else:
+          value = 0.0
+        regionStats["p%d" % percentile] = float(value)
+      stats[name] = regionStats
+
+    return {"numImages": len(self._imageTimes["total"]),
+            "wallTime": wallTime,
+            "regions": stats}
+
+
+  def report(self, phase):
+    """
+    Print a summary table for the phase, write the statistics to
+    <outputDir>/<phase>_profile.json and reset the timers.
+
+    :return: The statistics, as returned by getStats()
+    """
+    stats = self.getStats()
+
+    print "============= Profile: {phase} =================".format(phase=phase)
+    print "Images: {n}; Wall time: {t:.3f}s".format(n=stats["numImages"],
+                                                  t=stats["wallTime"])
+    print "{:<12}{:>12}{:>9}{:>10}{:>10}{:>10}{:>10}".format(
+        "Region", "Time (s)", "%", "Calls/s", "p50 (ms)", "p95 (ms)",
+        "p99 (ms)")
+    for name in self.regionNames + ["total"]:
+      regionStats = stats["regions"][name]
+      print "{:<12}{:>12.3f}{:>9.1f}{:>10.1f}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+          name, regionStats["computeTime"],
+          100 * regionStats["fractionOfWallTime"],
+          regionStats["callsPerSecond"], 1000 * regionStats["p50"],
+          1000 * regionStats["p95"], 1000 * regionStats["p99"])
+
+    if self.outputDir is not None:
+      path = os.path.join(self.outputDir,
+                          "%s_profile.json" % phase.replace(" ", "_"))
+      with open(path, "w") as f:
+        json.dump(dict(stats, phase=phase), f, indent=2, sort_keys=True)
+      print "Saved profile to",path
+
+    self.reset()
+    return stats
@@ -55,6 +55,7 @@ CPP SP seed                 = 1956
 
 import argparse
 import datetime
+import multiprocessing
 import time
 import yaml
 import numpy
@@ -64,6 +65,9 @@ import pkg_resources
 from nupic.bindings.math import GetNTAReal
 from nupic.engine import Network
 
+from nupic.vision.mnist.checkpoint import Checkpointer
+from nupic.vision.mnist.profiler import NetworkProfiler
+from nupic.vision.mnist.shards import runShards
 from nupic.vision.regions.ImageSensor import ImageSensor
 
 DEFAULT_IMAGESENSOR_PARAMS ={
@@ -129,13 +133,43 @@ def createNetwork():
 
 
 
-def trainNetwork(net, dataDir, networkFile="mnist_net.nta"):
+def trainNetwork(net, dataDir, networkFile="mnist_net.nta", checkpointer=None,
+                 resumeState=None, profileDir=None):
+  """
+  Train the SP, then the classifier, on the training images and save the
+  network to networkFile.
+
+  If a Checkpointer is given, a checkpoint is saved whenever it is due. To
+  resume, pass the network and state loaded from the latest checkpoint.
+
+  If profileDir is given, the compute time of each region is profiled and
+  reported at the end of each phase.
+  """
   # Some stuff we will need later
   sensor = net.regions["sensor"]
   sp = net.regions["SP"]
   pysp = sp.getSelf()
   classifier = net.regions["classifier"]
   dutyCycles = numpy.zeros(DEFAULT_SP_PARAMS["columnCount"], dtype=GetNTAReal())
+  phase = "SP"
+  startIteration = 0
+  if resumeState is not None:
+    dutyCycles = resumeState["dutyCycles"]
+    phase = resumeState["phase"]
+    startIteration = resumeState["iteration"]
+
+  profiler = None
+  run = net.run
+  if profileDir is not None:
+    profiler = NetworkProfiler(net, profileDir)
+    run = profiler.run
+
+  def saveCheckpoint(phase, iteration):
+    checkpointer.save(net, {"networkFile": networkFile,
+                            "phase": phase,
+                            "iteration": iteration,
+                            "dutyCycles": dutyCycles,
+                            "sensor": sensor.getSelf().getExplorerState()})
 
   print "============= Loading training images ================="
   t1 = time.time()
@@ -146,17 +180,30 @@ def trainNetwork(net, dataDir, networkFile="mnist_net.nta"):
   print "Number of training images",numTrainingImages
 
   # First train just the SP
-  print "============= SP training ================="
-  classifier.setParameter("inferenceMode", 0)
-  classifier.setParameter("learningMode", 0)
-  sp.setParameter("learningMode", 1)
-  sp.setParameter("inferenceMode", 0)
   nTrainingIterations = numTrainingImages
-  for i in range(nTrainingIterations):
-    net.run(1)
-    dutyCycles += pysp._spatialPoolerOutput
-    if i%(nTrainingIterations/100)== 0:
-      print "Iteration",i,"Category:",sensor.getOutputData("categoryOut")
+  if phase == "SP":
+    print "============= SP training ================="
+    classifier.setParameter("inferenceMode", 0)
+    classifier.setParameter("learningMode", 0)
+    sp.setParameter("learningMode", 1)
+    sp.setParameter("inferenceMode", 0)
+    if resumeState is not None:
+      sensor.getSelf().setExplorerState(resumeState["sensor"])
+      print "Resuming at iteration",startIteration
+    if profiler is not None:
+      profiler.reset()
+    for i in range(startIteration, nTrainingIterations):
+      run(1)
+      dutyCycles += pysp._spatialPoolerOutput
+      if i%(nTrainingIterations/100)== 0:
+        print "Iteration",i,"Category:",sensor.getOutputData("categoryOut")
+      if checkpointer is not None and checkpointer.step():
+        saveCheckpoint("SP", i + 1)
+    if profiler is not None:
+      profiler.report("SP training")
+    phase = "classifier"
+    startIteration = 0
+    resumeState = None
 
   # Now train just the classifier sequentially on all training images
   print "============= Classifier training ================="
@@ -165,10 +212,19 @@ def trainNetwork(net, dataDir, networkFile="mnist_net.nta"):
   classifier.setParameter("learningMode", 1)
   sp.setParameter("learningMode", 0)
   sp.setParameter("inferenceMode", 1)
-  for i in range(numTrainingImages):
-    net.run(1)
+  if resumeState is not None:
+    sensor.getSelf().setExplorerState(resumeState["sensor"])
+    print "Resuming at iteration",startIteration
+  if profiler is not None:
+    profiler.reset()
+  for i in range(startIteration, numTrainingImages):
+    run(1)
     if i%(numTrainingImages/100)== 0:
       print "Iteration",i,"Category:",sensor.getOutputData("categoryOut")
+    if checkpointer is not None and checkpointer.step():
+      saveCheckpoint("classifier", i + 1)
+  if profiler is not None:
+    profiler.report("classifier training")
 
   # Save the trained network
   net.save(networkFile)
@@ -191,7 +247,7 @@ def trainNetwork(net, dataDir, networkFile="mnist_net.nta"):
 
 
 
-def testNetwork(testPath, savedNetworkFile="mnist_net.nta"):
+def testNetwork(testPath, savedNetworkFile="mnist_net.nta", profileDir=None):
   net = Network(savedNetworkFile)
   sensor = net.regions["sensor"]
   sp = net.regions["SP"]
@@ -212,9 +268,15 @@ def testNetwork(testPath, savedNetworkFile="mnist_net.nta"):
   sp.setParameter("inferenceMode", 1)
   sp.setParameter("learningMode", 0)
 
+  profiler = None
+  run = net.run
+  if profileDir is not None:
+    profiler = NetworkProfiler(net, profileDir)
+    run = profiler.run
+
   numCorrect = 0
   for i in range(numTestImages):
-    net.run(1)
+    run(1)
     inferredCategory = classifier.getOutputData("categoriesOut").argmax()
     if sensor.getOutputData("categoryOut") == inferredCategory:
       numCorrect += 1
@@ -222,6 +284,13 @@ def testNetwork(testPath, savedNetworkFile="mnist_net.nta"):
       print "Iteration",i,"numCorrect=",numCorrect
 
   # Some interesting statistics
+  printTestSummary(start, numTestImages, numCorrect)
+  if profiler is not None:
+    profiler.report("testing %s" % os.path.basename(testPath))
+
+
+
+def printTestSummary(start, numTestImages, numCorrect):
   print "Testing time:",time.time()-start
   print "Number of test images",numTestImages
   print "num correct=",numCorrect
@@ -229,6 +298,52 @@ def testNetwork(testPath, savedNetworkFile="mnist_net.nta"):
 
 
 
+def _setUpTesting(net):
+  """
+  Turn learning off and classifier inference on. Used by testNetworkParallel.
+  """
+  net.regions["classifier"].setParameter("inferenceMode", 1)
+  net.regions["classifier"].setParameter("learningMode", 0)
+  net.regions["SP"].setParameter("inferenceMode", 1)
+  net.regions["SP"].setParameter("learningMode", 0)
+
+
+
+def _getCategories(net):
+  """
+  Return the (inferred, actual) category of the current image. Used by
+  testNetworkParallel.
+  """
+  inferred = net.regions["classifier"].getOutputData("categoriesOut").argmax()
+  actual = net.regions["sensor"].getOutputData("categoryOut")[0]
+  return inferred, actual
+
+
+
+def testNetworkParallel(testPath, savedNetworkFile="mnist_net.nta",
+                        numWorkers=None):
+  """
+  Same as testNetwork, but splits the test images into one contiguous shard
+  per worker process. Each worker loads the saved network and infers its
+  shard; learning is off, so the images are independent.
+
+  Returns the inferred and actual categories of the test images, in order.
+  """
+  if numWorkers is None:
+    numWorkers = multiprocessing.cpu_count()
+
+  start = time.time()
+  _, categories = runShards(testPath, savedNetworkFile, _setUpTesting,
+                            _getCategories, numWorkers)
+  categories = numpy.array(categories, dtype=numpy.int32).reshape(-1, 2)
+  inferred = categories[:, 0]
+  actual = categories[:, 1]
+
+  printTestSummary(start, len(categories), int((inferred == actual).sum()))
+  return inferred, actual
+
+
+
 def checkNet(net):
   # DEBUG: Verify we set parameters correctly
   # This is the "correct" way to access internal region parameters. It will
@@ -259,9 +374,41 @@ if __name__ == "__main__":
   parser.add_argument("--data-dir", dest="dataDir", default="data",
                       help=("Location of MNIST data files downloaded by "
                             "nupic.vision.mnist.download"))
+  parser.add_argument("--num-workers", dest="numWorkers", type=int, default=1,
+                      help=("Number of processes used to test on the full "
+                            "test set"))
+  parser.add_argument("--train", action="store_true",
+                      help=("Train a new network instead of loading the "
+                            "saved one"))
+  parser.add_argument("--checkpoint-dir", dest="checkpointDir",
+                      default="checkpoints",
+                      help="Directory for training checkpoints")
+  parser.add_argument("--checkpoint-every", dest="checkpointEvery", type=int,
+                      default=None,
+                      help="Save a checkpoint every N training images")
+  parser.add_argument("--checkpoint-minutes", dest="checkpointMinutes",
+                      type=float, default=None,
+                      help="Save a checkpoint every T minutes of training")
+  parser.add_argument("--resume", action="store_true",
+                      help=("Resume training from the latest checkpoint in "
+                            "the checkpoint directory"))
+  parser.add_argument("--profile-dir", dest="profileDir", default=None,
+                      help=("Profile the compute time of each region and "
+                            "write the statistics of each phase to this "
+                            "directory"))
   args =parser.parse_args()
   dataDir = os.path.join(os.getcwd(), args.dataDir)
 
+  if ((args.checkpointEvery or args.checkpointMinutes) and
+      not (args.train or args.resume)):
+    parser.error("--checkpoint-every and --checkpoint-minutes need --train "
+                 "or --resume")
+
+  checkpointer = None
+  if args.resume or args.checkpointEvery or args.checkpointMinutes:
+    checkpointer = Checkpointer(args.checkpointDir, args.checkpointEvery,
+                                args.checkpointMinutes)
+
   # Create network and train it
   net = createNetwork()
   datetimestr = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
@@ -269,12 +416,21 @@ if __name__ == "__main__":
   if not os.path.exists(networkDirName):
     os.makedirs(networkDirName)
   netName = "%s/%s_mnist_net.nta" % (networkDirName, datetimestr)
-  # train network
-  #trainNetwork(net, dataDir, netName)
-
-  # load network instead of train newly
-  netName = "networks/2017_11_22_17_59_11_mnist_net.nta"
-  net = Network(netName)
+  if args.resume:
+    checkpoint = checkpointer.load()
+    if checkpoint is None:
+      parser.error("No checkpoint found in %s" % args.checkpointDir)
+    checkpointFile, resumeState = checkpoint
+    netName = resumeState["networkFile"]
+    net = trainNetwork(Network(checkpointFile), dataDir, netName,
+                       checkpointer, resumeState, args.profileDir)
+  elif args.train:
+    net = trainNetwork(net, dataDir, netName, checkpointer,
+                       profileDir=args.profileDir)
+  else:
+    # load network instead of train newly
+    netName = "networks/2017_11_22_17_59_11_mnist_net.nta"
+    net = Network(netName)
   checkNet(net)
 
   # As a debugging step, verify we've learned the training set well
@@ -282,7 +438,13 @@ if __name__ == "__main__":
   # mnist/small_training
 
   print "Test on small part of training set"
-  testNetwork(os.path.join(dataDir, "small_training"), netName)
+  testNetwork(os.path.join(dataDir, "small_training"), netName,
+              args.profileDir)
   checkNet(net)
   print "Test on full test set"
-  testNetwork(os.path.join(dataDir, "testing"), savedNetworkFile=netName)
+  if args.numWorkers > 1:
+    testNetworkParallel(os.path.join(dataDir, "testing"),
+                        savedNetworkFile=netName, numWorkers=args.numWorkers)
+  else:
+    testNetwork(os.path.join(dataDir, "testing"), savedNetworkFile=netName,
+                profileDir=args.profileDir)
@@ -30,6 +30,7 @@ from htmresearch.regions.ColumnPoolerRegion import ColumnPoolerRegion
 from htmresearch.regions.ExtendedTMRegion import ExtendedTMRegion
 from nupic.engine import Network
 
+from nupic.vision.mnist.profiler import NetworkProfiler
 from nupic.vision.regions.SaccadeSensor import SaccadeSensor
 from nupic.vision.image import deserializeImage
 
@@ -136,7 +137,9 @@ class SaccadeNetwork(object):
                validationSet=None,
                detailedSaccadeWidth=IMAGE_WIDTH,
                detailedSaccadeHeight=IMAGE_HEIGHT,
-               createNetwork=True):
+               createNetwork=True,
+               checkpointer=None,
+               profileDir=None):
     """
     :param str networkName: Where the network will be serialized/saved to
     :param str trainingSet: Path to set of images to train on
@@ -150,6 +153,11 @@ class SaccadeNetwork(object):
       return from the runNetworkOneImage and testNetworkOneImage
     :param bool createNetwork: If false, wait until createNet is manually
       called to create the network. Otherwise, create on __init__
+    :param checkpointer: (optional) Checkpointer used to periodically save
+      training checkpoints in runNetworkBatch
+    :param str profileDir: (optional) Profile the compute time of each region
+      in runNetworkBatch and testNetworkBatch, and write the statistics of
+      each phase to this directory when reportProfile is called
     """
     self.loggingDir = loggingDir
     self.netFile = networkName
@@ -158,6 +166,9 @@ class SaccadeNetwork(object):
     self.testingSet = testingSet
     self.detailedSaccadeWidth = detailedSaccadeWidth
     self.detailedSaccadeHeight = detailedSaccadeHeight
+    self.checkpointer = checkpointer
+    self.profileDir = profileDir
+    self.profiler = None
 
     self.net = None
     self.trainingImageIndex = None
@@ -173,6 +184,8 @@ class SaccadeNetwork(object):
     self.trainingImageIndex = 0
     self.testingImageIndex = 0
     self.numCorrect = 0
+    self.trainingPhase = None
+    self.learningModes = {}
 
     if createNetwork:
       self.createNet()
@@ -239,6 +252,21 @@ class SaccadeNetwork(object):
     self.networkTM = self.net.regions["TM"]
     self.networkTP = self.net.regions["TP"]
     self.networkClassifier = self.net.regions["classifier"]
+    self._createProfiler()
+
+
+  def _createProfiler(self):
+    if self.profileDir is not None:
+      self.profiler = NetworkProfiler(self.net, self.profileDir)
+
+
+  def reportProfile(self, phase):
+    """ Report the region timings since the last report, if profiling
+
+    :param str phase: Name of the phase that just finished
+    """
+    if self.profiler is not None:
+      self.profiler.report(phase)
 
 
   def loadFromFile(self, filename):
@@ -258,11 +286,16 @@ class SaccadeNetwork(object):
 
     self.networkSP = self.net.regions["SP"]
     self.networkClassifier = self.net.regions["classifier"]
+    self._createProfiler()
 
     self.numCorrect = 0
 
-  def loadExperiment(self):
-    """ Load images into ImageSensor and set the learning mode for the SP. """
+  def loadExperiment(self, trainingPhase=None):
+    """ Load images into ImageSensor and set the learning mode for the SP.
+
+    :param str trainingPhase: (optional) Name of the training phase, saved
+      with checkpoints so that a resumed experiment can skip finished phases
+    """
     print "============= Loading training images ================="
     t1 = time.time()
     self.networkSensor.executeCommand(
@@ -274,6 +307,7 @@ class SaccadeNetwork(object):
 
     self.numTrainingImages = numTrainingImages
     self.trainingImageIndex = 0
+    self.trainingPhase = trainingPhase
 
 
   def runNetworkOneImage(self, enableViz=False):
@@ -417,10 +451,16 @@ class SaccadeNetwork(object):
     startTime = time.time()
     while self.trainingImageIndex < self.numTrainingImages:
       self.networkTM.executeCommand(["reset"])
+      if self.profiler is not None:
+        self.profiler.beginImage()
       for i in range(SACCADES_PER_IMAGE_TRAINING):
         self.net.run(1)
+      if self.profiler is not None:
+        self.profiler.endImage()
 
       self.trainingImageIndex += 1
+      if self.checkpointer is not None and self.checkpointer.step():
+        self.saveCheckpoint()
       if self.trainingImageIndex % batchSize == 0:
         print ("Iteration: {iter}; Category: {cat}; Time per batch: {t}"
                .format(iter=self.trainingImageIndex,
@@ -572,10 +612,14 @@ class SaccadeNetwork(object):
     while self.testingImageIndex < self.numTestingImages:
       inferredCategoryList = []
       self.networkTM.executeCommand(["reset"])
+      if self.profiler is not None:
+        self.profiler.beginImage()
       for i in range(SACCADES_PER_IMAGE_TESTING):
         self.net.run(1)
         inferredCategoryList.append(
             self.networkClassifier.getOutputData("categoriesOut").argmax())
+      if self.profiler is not None:
+        self.profiler.endImage()
       inferredCategory = self._getMostCommonCategory(inferredCategoryList)
       if self.networkSensor.getOutputData("categoryOut") == inferredCategory:
         self.numCorrect += 1
@@ -600,6 +644,10 @@ class SaccadeNetwork(object):
                       learningTM=False,
                       learningTP=False,
                       learningClassifier=False):
+    self.learningModes = {"learningSP": learningSP,
+                          "learningTM": learningTM,
+                          "learningTP": learningTP,
+                          "learningClassifier": learningClassifier}
     if learningSP:
       self.networkSP.setParameter("learningMode", 1)
       self.networkSP.setParameter("inferenceMode", 0)
@@ -630,5 +678,53 @@ class SaccadeNetwork(object):
     self.net.save(self.netFile)
 
 
+  def saveCheckpoint(self):
+    """ Save the network and training position with the checkpointer """
+    self.checkpointer.save(self.net, {
+        "networkFile": self.netFile,
+        "trainingPhase": self.trainingPhase,
+        "trainingImageIndex": self.trainingImageIndex,
+        "learningModes": self.learningModes,
+        "sensor": self.networkSensor.getSelf().getExplorerState()})
+
+
+  def loadCheckpoint(self):
+    """ Load the latest checkpoint of the checkpointer, reload the training
+    images and restore the training position, so that runNetworkBatch
+    continues where the checkpointed run stopped.
+
+    :return: The name of the training phase to continue, or False if there
+      is no checkpoint
+    """
+    checkpoint = self.checkpointer.load()
+    if checkpoint is None:
+      return False
+    networkFile, state = checkpoint
+
+    Network.unregisterRegion(SaccadeSensor.__name__)
+    Network.registerRegion(SaccadeSensor)
+    Network.unregisterRegion(ExtendedTMRegion.__name__)
+    Network.registerRegion(ExtendedTMRegion)
+    Network.unregisterRegion(ColumnPoolerRegion.__name__)
+    Network.registerRegion(ColumnPoolerRegion)
+
+    self.net = Network(networkFile)
+    self.networkSensor = self.net.regions["sensor"]
+    self.networkSP = self.net.regions["SP"]
+    self.networkTM = self.net.regions["TM"]
+    self.networkTP = self.net.regions["TP"]
+    self.networkClassifier = self.net.regions["classifier"]
+    self._createProfiler()
+
+    self.loadExperiment(state["trainingPhase"])
+    self.setLearningMode(**state["learningModes"])
+    self.trainingImageIndex = state["trainingImageIndex"]
+    self.networkSensor.getSelf().setExplorerState(state["sensor"])
+    print "Resuming {phase} at image {index}".format(
+        phase=self.trainingPhase, index=self.trainingImageIndex)
+
+    return self.trainingPhase
+
+
   def resetIndex(self):
     self.trainingImageIndex = 0
@@ -21,8 +21,10 @@
 
 """Saccading vision demo with MNIST."""
 
+import argparse
 import pkg_resources
 
+from nupic.vision.mnist.checkpoint import Checkpointer
 from nupic.vision.mnist.saccade_network import SaccadeNetwork
 
 TRAIN_IMAGES = "data/small_training"
@@ -30,56 +32,74 @@ TEST_IMAGES = "data/small_training"
 #LOG_DIR = pkg_resources.resource_filename("nupic.vision.mnist", "logs")
 LOG_DIR = None
 
+# Training phases, in order, with the learning modes of each phase
+TRAINING_PHASES = [
+    ("SP", {"learningSP": True}),
+    ("TM", {"learningTM": True}),
+    ("classifier", {"learningTP": True, "learningClassifier": True}),
+]
 
 
-def createNetwork():
+
+def createNetwork(checkpointer=None, profileDir=None):
   trainingNetwork = SaccadeNetwork(
       networkName="SaccadeNetwork",
       trainingSet=TRAIN_IMAGES, validationSet=None,
       testingSet=TEST_IMAGES, loggingDir=LOG_DIR,
-      createNetwork=True)
+      createNetwork=True, checkpointer=checkpointer, profileDir=profileDir)
   return trainingNetwork
 
 
 
 if __name__ == "__main__":
-  net = createNetwork()
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--checkpoint-dir", dest="checkpointDir",
+                      default="checkpoints",
+                      help="Directory for training checkpoints")
+  parser.add_argument("--checkpoint-every", dest="checkpointEvery", type=int,
+                      default=None,
+                      help="Save a checkpoint every N training images")
+  parser.add_argument("--checkpoint-minutes", dest="checkpointMinutes",
+                      type=float, default=None,
+                      help="Save a checkpoint every T minutes of training")
+  parser.add_argument("--resume", action="store_true",
+                      help=("Resume training from the latest checkpoint in "
+                            "the checkpoint directory"))
+  parser.add_argument("--profile-dir", dest="profileDir", default=None,
+                      help=("Profile the compute time of each region and "
+                            "write the statistics of each phase to this "
+                            "directory"))
+  args = parser.parse_args()
 
-  # Training
-  numTrain = 1
+  checkpointer = None
+  if args.resume or args.checkpointEvery or args.checkpointMinutes:
+    checkpointer = Checkpointer(args.checkpointDir, args.checkpointEvery,
+                                args.checkpointMinutes)
+  net = createNetwork(checkpointer, args.profileDir)
 
-  # train SP
-  net.loadExperiment()
-  net.setLearningMode(learningSP=True,
-                      learningTM=False,
-                      learningTP=False,
-                      learningClassifier=False)
-  for i in xrange(numTrain):
-    print "Running SP train batch #{}".format(i)
-    net.runNetworkBatch(10)
-  print "Train index: {}".format(net.trainingImageIndex)
+  resumePhase = None
+  if args.resume:
+    resumePhase = net.loadCheckpoint()
+    if resumePhase is False:
+      parser.error("No checkpoint found in %s" % args.checkpointDir)
 
-  # train TM
-  net.loadExperiment()
-  net.setLearningMode(learningSP=False,
-                      learningTM=True,
-                      learningTP=False,
-                      learningClassifier=False)
-  for i in xrange(numTrain):
-    print "Running TM train batch #{}".format(i)
-    net.runNetworkBatch(10)
-  print "Train index: {}".format(net.trainingImageIndex)
+  # Training
+  numTrain = 1
 
-  # train classifier
-  net.loadExperiment()
-  net.setLearningMode(learningSP=False,
-                      learningTM=False,
-                      learningTP=True,
-                      learningClassifier=True)
-  for i in xrange(numTrain):
-    print "Running classifier train batch #{}".format(i)
-    net.runNetworkBatch(10)
-  print "Train index: {}".format(net.trainingImageIndex)
+  phaseNames = [name for name, _ in TRAINING_PHASES]
+  for name, learningModes in TRAINING_PHASES:
+    if resumePhase is not None and \
+        phaseNames.index(name) < phaseNames.index(resumePhase):
+      continue
+    if name != resumePhase:
+      net.loadExperiment(name)
+      net.setLearningMode(**learningModes)
+    for i in xrange(numTrain):
+      print "Running {} train batch #{}".format(name, i)
+      net.runNetworkBatch(10)
+    print "Train index: {}".format(net.trainingImageIndex)
+    net.reportProfile("{} training".format(name))
+    resumePhase = None
 
   # Testing
   numTest = 10
@@ -91,4 +111,5 @@ if __name__ == "__main__":
   net.setupNetworkTest()
   numCorrect = net.testNetworkBatch(numTest)
   print "Got {} correct out of {}".format(numCorrect, numTest)
+  net.reportProfile("testing")
   print "Train index: {}".format(net.trainingImageIndex)
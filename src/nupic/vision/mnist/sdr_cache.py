@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Runs the sensor and SP of a saved MNIST network over a dataset once and
+stores the active SP columns of every image in an SDR cache file. The KNN
+classifier can then be trained and tested straight from the caches, so trying
+different classifier parameters does not pay for SP inference again.
+
+The cache is stored in compressed sparse row form: the active columns of
+image i are indices[offsets[i]:offsets[i + 1]], and its category is labels[i].
+"""
+
+import argparse
+import os
+import time
+
+import numpy
+
+from nupic.algorithms.KNNClassifier import KNNClassifier
+from nupic.bindings.math import GetNTAReal
+
+from nupic.vision.mnist.run_mnist_experiment import (DEFAULT_CLASSIFIER_PARAMS,
+                                                     printTestSummary)
+from nupic.vision.mnist.shards import runShards
+
+
+
+class SDRCache(object):
+  """
+  The active SP columns and categories of a dataset, in CSR form.
+  """
+
+
+  def __init__(self, offsets, indices, labels, columnCount):
+    self.offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    self.indices = numpy.asarray(indices,
+                                 dtype=self.getIndexDType(columnCount))
+    self.labels = numpy.asarray(labels, dtype=numpy.int32)
+    self.columnCount = int(columnCount)
+
+
+  @staticmethod
+  def getIndexDType(columnCount):
+    """
+    Column indices are stored as int16 unless there are too many columns.
+    """
+    if columnCount <= numpy.iinfo(numpy.int16).max + 1:
+      return numpy.int16
+    return numpy.int32
+
+
+  @classmethod
+  def fromSDRs(cls, sdrs, labels, columnCount):
+    """
+    Create a cache from a list of active column arrays, one per image.
+    """
+    offsets = numpy.zeros(len(sdrs) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(sdr) for sdr in sdrs])
+    if len(sdrs) > 0:
+      indices = numpy.concatenate(sdrs)
+    else:
+      indices = numpy.zeros(0)
+    return cls(offsets, indices, labels, columnCount)
+
+
+  @classmethod
+  def load(cls, path):
+    with open(path, "rb") as f:
+      data = numpy.load(f)
+      return cls(data["offsets"], data["indices"], data["labels"],
+                 data["columnCount"])
+
+
+  def save(self, path):
+    # Write to a file object so that numpy does not append a suffix
+    with open(path, "wb") as f:
+      numpy.savez(f, offsets=self.offsets, indices=self.indices,
+                  labels=self.labels, columnCount=self.columnCount)
+
+
+  def __len__(self):
+    return len(self.labels)
+
+
+  def getSDR(self, i):
+    """
+    Return the active columns of image i.
+    """
+    return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+
+  def getDense(self, i):
+    """
+    Return image i as a dense SP output vector.
+    """
+    dense = numpy.zeros(self.columnCount, dtype=GetNTAReal())
+    dense[self.getSDR(i)] = 1
+    return dense
+
+
+
+def _setUpSDRs(net):
+  """
+  Disable the classifier and turn SP learning off. Used by buildSDRCache.
+
+  Returns the number of SP columns.
+  """
+  net.regions["classifier"].setParameter("inferenceMode", 0)
+  net.regions["classifier"].setParameter("learningMode", 0)
+  net.regions["SP"].setParameter("inferenceMode", 1)
+  net.regions["SP"].setParameter("learningMode", 0)
+  return net.regions["SP"].getParameter("columnCount")
+
+
+
+def _getSDR(net):
+  """
+  Return the (active columns, category) of the current image. Used by
+  buildSDRCache.
+  """
+  return (net.regions["SP"].getOutputData("bottomUpOut").nonzero()[0],
+          int(net.regions["sensor"].getOutputData("categoryOut")[0]))
+
+
+
+def buildSDRCache(dataPath, cacheFile, savedNetworkFile="mnist_net.nta",
+                  numWorkers=1):
+  """
+  Run the saved network's sensor and SP over all images in dataPath and save
+  the resulting SDR cache to cacheFile.
+
+  With more than one worker, the images are split into one contiguous shard
+  per worker process, like testNetworkParallel in run_mnist_experiment. SP
+  learning is off, so the images are independent and the merged cache is the
+  same as the one computed by a single process.
+  """
+  print "Computing SDRs for",dataPath
+  start = time.time()
+  columnCount, results = runShards(dataPath, savedNetworkFile, _setUpSDRs,
+                                   _getSDR, numWorkers)
+  cache = SDRCache.fromSDRs([sdr for sdr, _ in results],
+                            [label for _, label in results], columnCount)
+  cache.save(cacheFile)
+  print "SP inference time:",time.time() - start
+  print "Number of images",len(cache)
+  print "Saved SDR cache to",cacheFile
+
+  return cache
+
+
+
+def trainClassifierFromCache(cache, classifierParams=DEFAULT_CLASSIFIER_PARAMS):
+  """
+  Train a KNN classifier on every SDR in the cache and return it.
+  """
+  params = dict(classifierParams)
+  # Only used by the KNNClassifier region to size its outputs
+  params.pop("maxCategoryCount", None)
+  knn = KNNClassifier(**params)
+
+  start = time.time()
+  for i in range(len(cache)):
+    knn.learn(cache.getDense(i), cache.labels[i])
+
+  print "Classifier training time:",time.time() - start
+  print "Number of patterns stored",knn._numPatterns
+
+  return knn
+
+
+
+def testClassifierFromCache(knn, cache):
+  """
+  Infer the category of every SDR in the cache.
+
+  Returns the inferred and actual categories, in order.
+  """
+  start = time.time()
+  inferred = numpy.zeros(len(cache), dtype=numpy.int32)
+  for i in range(len(cache)):
+    winner = knn.infer(cache.getDense(i))[0]
+    inferred[i] = -1 if winner is None else winner
+
+  numCorrect = int((inferred == cache.labels).sum())
+  printTestSummary(start, len(cache), numCorrect)
+  return inferred, cache.labels
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("network",
+                      help="Network saved by run_mnist_experiment")
+  parser.add_argument("--data-dir", dest="dataDir", default="data",
+                      help=("Location of MNIST data files downloaded by "
+                            "nupic.vision.mnist.download"))
+  parser.add_argument("--cache-dir", dest="cacheDir", default="sdr_cache",
+                      help="Directory for the SDR cache files")
+  parser.add_argument("--num-workers", dest="numWorkers", type=int, default=1,
+                      help="Number of processes used to compute the SDRs")
+  args = parser.parse_args()
+
+  if not os.path.exists(args.cacheDir):
+    os.makedirs(args.cacheDir)
+
+  # Compute the SDRs of each dataset the first time only
+  caches = {}
+  for dataset in ("training", "testing"):
+    cacheFile = os.path.join(args.cacheDir, "%s_%s.npz" % (
+        os.path.splitext(os.path.basename(args.network))[0], dataset))
+    if os.path.exists(cacheFile):
+      caches[dataset] = SDRCache.load(cacheFile)
+    else:
+      caches[dataset] = buildSDRCache(os.path.join(args.dataDir, dataset),
+                                      cacheFile, args.network,
+                                      args.numWorkers)
+
+  print "============= Classifier training ================="
+  knn = trainClassifierFromCache(caches["training"])
+  print "Test on full test set"
+  testClassifierFromCache(knn, caches["testing"])
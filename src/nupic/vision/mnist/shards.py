@@ -0,0 +1,121 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Runs a saved network over a directory of images split into contiguous shards,
+one per worker process. Learning must be off, so that the images are
+independent and the results do not depend on the number of workers.
+"""
+
+import multiprocessing
+
+import yaml
+
+from nupic.engine import Network
+
+from nupic.vision.regions.ImageSensor import ImageSensor
+
+
+
+def countImages(dataPath):
+  """
+  Return the number of images loadMultipleImages finds in dataPath. Uses a
+  bare ImageSensor, which only lists the images, instead of a saved network.
+  """
+  numImages, _ = ImageSensor().loadMultipleImages(dataPath)
+  return numImages
+
+
+
+def runShard(args):
+  """
+  Load the saved network and the images in dataPath, call setUpNetwork(net)
+  and then run the network on the images with indices in [shardStart,
+  shardEnd) in order, calling processImage(net) after each one. Runs in a
+  worker process of runShards.
+
+  Returns (shardStart, setUpNetwork result, processImage results).
+  """
+  (dataPath, savedNetworkFile, shardStart, shardEnd, setUpNetwork,
+   processImage) = args
+  net = Network(savedNetworkFile)
+  sensor = net.regions["sensor"]
+  sensor.executeCommand(["loadMultipleImages", dataPath])
+  numImages = sensor.getParameter("numImages")
+
+  # Visit the images in order, starting with the first image of the shard.
+  # The explorer moves to the next image before each output, so seek to the
+  # image before it.
+  sensor.setParameter("explorer", yaml.dump(["Flash"]))
+  sensor.getSelf().seek(image=(shardStart - 1) % numImages)
+  setUp = setUpNetwork(net)
+
+  results = []
+  for _ in xrange(shardEnd - shardStart):
+    net.run(1)
+    results.append(processImage(net))
+
+  print "Shard",shardStart,"-",shardEnd,"done"
+  return shardStart, setUp, results
+
+
+
+def runShards(dataPath, savedNetworkFile, setUpNetwork, processImage,
+              numWorkers=1):
+  """
+  Run the saved network over every image in dataPath, split into one
+  contiguous shard per worker process. With a single worker the shard is run
+  in this process. setUpNetwork and processImage are called as in runShard,
+  and must be module level functions so that they can be sent to the
+  workers.
+
+  Returns (setUpNetwork result of the first shard, processImage results in
+  image order), or (None, []) if there are no images.
+  """
+  numImages = countImages(dataPath)
+  if numImages == 0:
+    return None, []
+
+  numWorkers = max(1, min(numWorkers, numImages))
+  bounds = [numImages * i // numWorkers for i in xrange(numWorkers + 1)]
+  shards = [(dataPath, savedNetworkFile, bounds[i], bounds[i + 1],
+             setUpNetwork, processImage)
+            for i in xrange(numWorkers)]
+  if numWorkers == 1:
+    results = [runShard(shards[0])]
+  else:
+    pool = multiprocessing.Pool(numWorkers)
+    try:
+      results = pool.map(runShard, shards)
+    except BaseException:
+      # Includes errors raised in the workers and KeyboardInterrupt
+      pool.terminate()
+      raise
+    else:
+      pool.close()
+    finally:
+      pool.join()
+
+  # Merge the shards in image order
+  results.sort(key=lambda result: result[0])
+  return (results[0][1],
+          [output for result in results for output in result[2]])
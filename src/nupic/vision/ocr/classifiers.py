@@ -24,6 +24,8 @@ This module contains different classifiers to try when using NuPIC on visual
 tasks.
 """
 
+import numpy
+
 from nupic.algorithms.KNNClassifier import KNNClassifier
 
 
@@ -69,3 +71,120 @@ class exactMatch(object):
       # format return value to match KNNClassifier
       result = (winner, [], [], [])
       return result
+
+
+
+class bitPackedMatch(object):
+  """
+  This classifier stores each distinct SDR bit-packed into 64 bit words,
+  together with the categories it was learned with.  When queried for the
+  category of an SDR it first looks for an exact match in a hash table and
+  returns its first category, like exactMatch.  If there is no exact match
+  and k is positive, the k stored SDRs with the largest overlap vote on the
+  category instead.  The overlaps with all stored SDRs are computed in one
+  pass over the packed matrix.
+  """
+
+
+  # Number of set bits in each possible byte value
+  _popCounts = numpy.array([bin(i).count("1") for i in xrange(256)],
+                           dtype=numpy.uint8)
+
+
+  def __init__(self, k=1):
+    """
+    This classifier keeps track of:
+
+    - The number of nearest SDRs that vote when there is no exact match (0 to
+      only use exact matches)
+
+    - A matrix of the packed SDRs, one row per distinct SDR
+
+    - A table mapping each packed SDR to its row
+
+    - The categories associated with each row
+    """
+    self.k = k
+    self.clear()
+
+
+  def clear(self):
+    self.SDRs = None
+    self.numPatterns = 0
+    self.rows = {}
+    self.categories = []
+
+
+  def learn(self, inputPattern, inputCategory, isSparse=0):
+    packed = self._pack(inputPattern)
+    key = packed.tostring()
+    row = self.rows.get(key)
+    if row is not None:
+      self.categories[row].append(inputCategory)
+      return
+
+    if self.SDRs is None:
+      self.SDRs = numpy.zeros((16, packed.size), dtype=numpy.uint64)
+    elif self.numPatterns == self.SDRs.shape[0]:
+      # Double the capacity of the matrix
+      self.SDRs = numpy.vstack((self.SDRs, numpy.zeros_like(self.SDRs)))
+    self.SDRs[self.numPatterns] = packed
+    self.rows[key] = self.numPatterns
+    self.categories.append([inputCategory])
+    self.numPatterns += 1
+
+
+  def infer(self, inputPattern):
+    """
+    Returns (winner, votes, dist, categoryDist) to match KNNClassifier, where
+    votes counts the votes for each category among the k nearest SDRs, dist
+    is the fraction of the active input bits missing from each stored SDR,
+    and categoryDist is the smallest dist for each category.  For an exact
+    match, or if nothing has been learned, the last three are empty lists.
+    """
+    packed = self._pack(inputPattern)
+    row = self.rows.get(packed.tostring())
+    if row is not None:
+      return (self.categories[row][0], [], [], [])
+    if not self.k or not self.numPatterns:
+      return (None, [], [], [])
+
+    overlaps = self.overlaps(packed)
+    numActive = max(self._popCount(packed[numpy.newaxis])[0], 1)
+    dist = 1.0 - overlaps / float(numActive)
+
+    # Let the k SDRs with the largest overlap vote, breaking ties in favor of
+    # the category with the closest SDR
+    rowCategories = numpy.array([c[0] for c in self.categories])
+    nearest = rowCategories[numpy.argsort(-overlaps, kind="mergesort")[:self.k]]
+    numCategories = rowCategories.max() + 1
+    votes = numpy.bincount(nearest, minlength=numCategories)
+    winner = [c for c in nearest if votes[c] == votes.max()][0]
+
+    categoryDist = numpy.ones(numCategories)
+    numpy.minimum.at(categoryDist, rowCategories, dist)
+    return (winner, votes, dist, categoryDist)
+
+
+  def overlaps(self, packed):
+    """
+    Returns the overlap of a packed SDR with each of the stored SDRs.
+    """
+    return self._popCount(self.SDRs[:self.numPatterns] & packed)
+
+
+  def _pack(self, inputPattern):
+    """
+    Packs a dense pattern into an array of 64 bit words.
+    """
+    packed = numpy.packbits(numpy.asarray(inputPattern) != 0)
+    padded = numpy.zeros(-(-packed.size // 8) * 8, dtype=numpy.uint8)
+    padded[:packed.size] = packed
+    return padded.view(numpy.uint64)
+
+
+  def _popCount(self, words):
+    """
+    Returns the number of set bits in each row of a 2D array of words.
+    """
+    return self._popCounts[words.view(numpy.uint8)].sum(axis=1, dtype=int)
@@ -26,13 +26,22 @@ sets come in different formats so there are routines for reading each format
 that has been used with nupic.vision.
 """
 
+import os
 import pkg_resources
 from xml.dom import minidom
+from xml.etree import cElementTree
 
+import numpy
 from PIL import Image
 
+from nupic.vision.ocr import image_encoders
+
 DEBUG = 0
 
+# Process-local cache of encoded data sets, keyed by (XML path, mtime).
+# Values are (vectors, tags) tuples.
+_vectorCache = {}
+
 
 
 def getImagesAndTags(filename):
@@ -61,3 +70,125 @@ def getImagesAndTags(filename):
     fp.close()
     #imagePatches[-1].show()
   return images, tags
+
+
+
+class LazyImageSequence(object):
+  """
+  A sequence of images that are only opened and decoded when accessed.
+  Decoded images are not kept, so iterating over a large data set does not
+  hold every image in memory.
+  """
+
+
+  def __init__(self, paths):
+    self.paths = list(paths)
+
+
+  def __len__(self):
+    return len(self.paths)
+
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return LazyImageSequence(self.paths[index])
+    fp = open(self.paths[index], 'rb')
+    try:
+      im = Image.open(fp)
+      im.load()
+    finally:
+      fp.close()
+    return im
+
+
+  def __iter__(self):
+    for i in xrange(len(self)):
+      yield self[i]
+
+
+
+def getImagePathsAndTags(filename):
+  """
+  This routine streams through the XML file that lists the images and
+  returns the full path to each image file along with its tag.
+  """
+  filename = pkg_resources.resource_filename("nupic.vision.data", filename)
+  directoryPath = os.path.dirname(filename)
+  paths = []
+  tags = []
+  for _, element in cElementTree.iterparse(filename):
+    if element.tag == 'image':
+      tags.append(element.get('tag'))
+      paths.append(os.path.join(directoryPath, element.get('file')))
+    element.clear()
+  return paths, tags
+
+
+
+def getLazyImagesAndTags(filename):
+  """
+  Like getImagesAndTags, but returns a LazyImageSequence that only opens each
+  image when it is accessed.
+  """
+  paths, tags = getImagePathsAndTags(filename)
+  return LazyImageSequence(paths), tags
+
+
+
+def getVectorsAndTags(filename, numProcesses=1):
+  """
+  This routine returns the bit vectors of the images listed in the XML file,
+  as the rows of the matrix returned by image_encoders.imagesToMatrix, along
+  with their tags.  The result is memoized in a process-local cache that is
+  invalidated when the XML file is modified, so reading the same data set
+  again (e.g. for each parameter combination) does not decode the images
+  again.  The cache can be saved and loaded with saveVectorCache and
+  loadVectorCache.
+  """
+  path = pkg_resources.resource_filename("nupic.vision.data", filename)
+  key = (os.path.abspath(path), os.path.getmtime(path))
+  if key not in _vectorCache:
+    paths, tags = getImagePathsAndTags(filename)
+    vectors = image_encoders.imagesToMatrix(paths, numProcesses)
+    _vectorCache[key] = (vectors, tags)
+  vectors, tags = _vectorCache[key]
+  return vectors, list(tags)
+
+
+
+def saveVectorCache(cacheFile):
+  """
+  Save the cache of encoded data sets to a compressed .npz file.  The bit
+  vectors are stored packed, eight to a byte.
+  """
+  arrays = {}
+  for i, ((path, mtime), (vectors, tags)) in enumerate(_vectorCache.items()):
+    arrays["path_%d" % i] = numpy.array(path)
+    arrays["mtime_%d" % i] = numpy.array(mtime)
+    arrays["shape_%d" % i] = numpy.array(vectors.shape)
+    arrays["bits_%d" % i] = numpy.packbits(vectors.astype(bool), axis=-1)
+    arrays["tags_%d" % i] = numpy.array(tags)
+  numpy.savez_compressed(cacheFile, numEntries=len(_vectorCache), **arrays)
+
+
+
+def loadVectorCache(cacheFile):
+  """
+  Add the entries saved by saveVectorCache to the cache.  Entries for XML
+  files that no longer exist or have been modified since are ignored.  Does
+  nothing if the cache file does not exist.
+  """
+  if not os.path.exists(cacheFile):
+    return
+  arrays = numpy.load(cacheFile)
+  for i in xrange(int(arrays["numEntries"])):
+    path = str(arrays["path_%d" % i])
+    mtime = float(arrays["mtime_%d" % i])
+    if not os.path.exists(path) or os.path.getmtime(path) != mtime:
+      continue
+    numVectors, numBits = arrays["shape_%d" % i]
+    bits = numpy.unpackbits(arrays["bits_%d" % i], axis=-1)
+    vectors = numpy.ascontiguousarray(bits[:, :numBits], dtype='uint32')
+    vectors = vectors.reshape(numVectors, numBits)
+    tags = arrays["tags_%d" % i].tolist()
+    _vectorCache[(path, mtime)] = (vectors, tags)
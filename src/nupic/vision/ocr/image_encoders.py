@@ -24,6 +24,8 @@ These routines convert images to bit vectors that can be used as input to
 the spatial pooler.
 """
 
+from multiprocessing import Pool
+
 import numpy
 
 from PIL import Image
@@ -32,19 +34,69 @@ from PIL import Image
 
 def imageToVector(image):
   '''
-  Returns a bit vector representation (list of ints) of a PIL image.
+  Returns a bit vector representation (numpy array of uint32) of a PIL image.
   '''
-  # Convert the image to black and white
-  image = image.convert('1',dither=Image.NONE)
-  # Pull out the data, turn that into a list, then a numpy array,
-  # then convert from 0 255 space to binary with a threshold.
-  # Finally cast the values into a type CPP likes
-  vector = (numpy.array(list(image.getdata())) < 100).astype('uint32')
-
-  return vector
+  return imagesToMatrix([image])[0]
 
 
 
 def imagesToVectors(images):
-  vectors = [imageToVector(image) for image in images]
-  return vectors
+  '''
+  Returns a list of bit vectors, one for each image. The vectors are the rows
+  of the matrix returned by imagesToMatrix.
+  '''
+  return list(imagesToMatrix(images))
+
+
+
+def imagesToMatrix(images, numProcesses=1, dtype='uint32'):
+  '''
+  Returns the bit vector representations of a list of equally sized images as
+  the rows of a contiguous 2D numpy array of the given dtype (uint32 or bool).
+
+  The images may be PIL images or paths to image files. If numProcesses is
+  greater than 1, the images are decoded by a pool of that many processes,
+  which pays off for large character sets given as paths.
+  '''
+  if numProcesses > 1 and len(images) > 1:
+    # Give each process one contiguous chunk of the images
+    chunkSize = -(-len(images) // numProcesses)
+    chunks = [images[i:i + chunkSize]
+              for i in xrange(0, len(images), chunkSize)]
+    pool = Pool(numProcesses)
+    try:
+      pixels = numpy.concatenate(pool.map(_decodeImages, chunks))
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    pixels = _decodeImages(images)
+
+  # Threshold all the images at once: black pixels are on
+  numImages, height, width = pixels.shape
+  vectors = pixels.reshape(numImages, height * width) < 100
+  return numpy.ascontiguousarray(vectors, dtype=dtype)
+
+
+
+def _decodeImages(images):
+  '''
+  Returns an (N x H x W) uint8 array of the images converted to black (0) and
+  white (255).
+  '''
+  pixels = None
+  for i, image in enumerate(images):
+    if isinstance(image, basestring):
+      image = Image.open(image)
+    # Convert the image to black and white, then to 8 bit so it can be viewed
+    # as a numpy array
+    image = image.convert('1', dither=Image.NONE).convert('L')
+    if pixels is None:
+      pixels = numpy.empty((len(images), image.size[1], image.size[0]),
+                           dtype=numpy.uint8)
+    elif image.size != (pixels.shape[2], pixels.shape[1]):
+      raise ValueError("All images must have the same size")
+    pixels[i] = numpy.asarray(image)
+  if pixels is None:
+    pixels = numpy.empty((0, 0, 0), dtype=numpy.uint8)
+  return pixels
@@ -42,13 +42,19 @@ minAccuracy - minimum accuracy requred to stop training before
               maxTrainingCycles is reached
 
 maxTrainingCycles - maximum number of training cycles to perform
+
+resultsFile - file the result of each combination is appended to, so that an
+              interrupted search can be restarted where it left off
+
+useSuccessiveHalving - stop training the worst combinations early instead of
+                       training every combination for maxTrainingCycles
 """
 
 from nupic.algorithms.spatial_pooler import SpatialPooler
 
 from nupic.vision.ocr import dataset_readers as data
-from nupic.vision.ocr import image_encoders as encoder
-from nupic.vision.ocr.parameters import Parameters
+from nupic.vision.ocr.parameters import Parameters, SuccessiveHalving
+from nupic.vision.ocr.sweep_runner import SweepRunner
 from nupic.vision.ocr.vision_testbench import VisionTestBench
 from nupic.vision.ocr.classifiers import KNNClassifier
 
@@ -56,78 +62,113 @@ trainingDataset = "OCR/characters/cmr_hex.xml"
 minAccuracy = 100.0
 maxTrainingCycles = 5
 testingDataset = "OCR/characters/cmr_hex.xml"
+resultsFile = "parameter_search_results.json"
+useSuccessiveHalving = False
 
 
 
-if __name__ == "__main__":
-  # Get training images and convert them to vectors.
-  trainingImages, trainingTags = data.getImagesAndTags(trainingDataset)
-  trainingVectors = encoder.imagesToVectors(trainingImages)
+def createCandidate(values, seed=1956):
+  """
+  Creates the spatial pooler, test bench and classifier for one combination
+  of parameter values.  The default seed is the one that Grok uses.
+  """
+  synPermConn = values["synPermConn"]
+  synPermDec = synPermConn*values["synPermDecFrac"]
+  synPermInc = synPermConn*values["synPermIncFrac"]
+
+  # Instantiate our spatial pooler
+  sp = SpatialPooler(
+    inputDimensions=(32, 32), # Size of image patch
+    columnDimensions=(32, 32),
+    potentialRadius=10000, # Ensures 100% potential pool
+    potentialPct=0.8,
+    globalInhibition=True,
+    localAreaDensity=-1, # Using numActiveColumnsPerInhArea
+    numActiveColumnsPerInhArea=64,
+    # All input activity can contribute to feature output
+    stimulusThreshold=0,
+    synPermInactiveDec=synPermDec,
+    synPermActiveInc=synPermInc,
+    synPermConnected=synPermConn,
+    boostStrength=1.0,
+    seed=seed,
+    spVerbosity=1)
+
+  # Instantiate the spatial pooler test bench and the classifier.
+  return {"tb": VisionTestBench(sp), "clf": KNNClassifier(), "numCycles": 0}
+
+
+
+def trainCandidate(candidate, numCycles):
+  """
+  Trains a candidate for up to numCycles more training cycles and returns its
+  accuracy on the training data set.
+  """
+  # Get training images converted to vectors.
+  trainingVectors, trainingTags = data.getVectorsAndTags(trainingDataset)
+
+  # Train the spatial pooler on trainingVectors.
+  tb = candidate["tb"]
+  candidate["numCycles"] += tb.train(trainingVectors, trainingTags,
+    candidate["clf"], numCycles, minAccuracy)
+
+  # Save the permanences and connections after training.
+  #tb.savePermanences('perms.jpg')
+  #tb.showPermanences()
+  #tb.showConnections()
+
+  return tb.trainingAccuracy
+
+
 
+def evaluateCandidate(candidate):
+  """
+  Tests a trained candidate and returns the accuracy and the number of
+  training cycles.
+  """
+  # Get testing images converted to vectors (cached after the first time).
+  testingVectors, testingTags = data.getVectorsAndTags(testingDataset)
+
+  # Reverse the order of the vectors and tags for testing
+  testingTags = [testingTag for testingTag in reversed(testingTags)]
+  testingVectors = [testingVector for testingVector in reversed(testingVectors)]
+
+  # Test the spatial pooler on testingVectors.
+  accuracy = candidate["tb"].test(testingVectors, testingTags,
+    candidate["clf"])
+
+  return [accuracy, candidate["numCycles"]]
+
+
+
+def runCombination(values, seed):
+  """
+  Trains and tests the spatial pooler with one combination of parameter
+  values and returns the accuracy and the number of training cycles.
+  """
+  candidate = createCandidate(values, seed)
+  trainCandidate(candidate, maxTrainingCycles)
+  return evaluateCandidate(candidate)
+
+
+
+if __name__ == "__main__":
   # Specify parameter values to search
   parameters = Parameters()
   parameters.define("synPermConn", [0.5])
   parameters.define("synPermDecFrac", [1.0, 0.5, 0.1])
   parameters.define("synPermIncFrac", [1.0, 0.5, 0.1])
-
-
-  # Run the model until all combinations have been tried
-  while parameters.getNumResults() < parameters.numCombinations:
-
-    # Pick a combination of parameter values
-    parameters.nextCombination()
-    #parameters.nextRandomCombination()
-    synPermConn = parameters.getValue("synPermConn")
-    synPermDec = synPermConn*parameters.getValue("synPermDecFrac")
-    synPermInc = synPermConn*parameters.getValue("synPermIncFrac")
-
-    # Instantiate our spatial pooler
-    sp = SpatialPooler(
-      inputDimensions=(32, 32), # Size of image patch
-      columnDimensions=(32, 32),
-      potentialRadius=10000, # Ensures 100% potential pool
-      potentialPct=0.8,
-      globalInhibition=True,
-      localAreaDensity=-1, # Using numActiveColumnsPerInhArea
-      numActiveColumnsPerInhArea=64,
-      # All input activity can contribute to feature output
-      stimulusThreshold=0,
-      synPermInactiveDec=synPermDec,
-      synPermActiveInc=synPermInc,
-      synPermConnected=synPermConn,
-      boostStrength=1.0,
-      seed=1956, # The seed that Grok uses
-      spVerbosity=1)
-
-    # Instantiate the spatial pooler test bench.
-    tb = VisionTestBench(sp)
-
-    # Instantiate the classifier
-    clf = KNNClassifier()
-
-    # Train the spatial pooler on trainingVectors.
-    numCycles = tb.train(trainingVectors, trainingTags, clf, maxTrainingCycles,
-      minAccuracy)
-
-    # Save the permanences and connections after training.
-    #tb.savePermanences('perms.jpg')
-    #tb.showPermanences()
-    #tb.showConnections()
-
-    # Get testing images and convert them to vectors.
-    testingImages, testingTags = data.getImagesAndTags(testingDataset)
-    testingVectors = encoder.imagesToVectors(testingImages)
-
-    # Reverse the order of the vectors and tags for testing
-    testingTags = [testingTag for testingTag in reversed(testingTags)]
-    testingVectors = [testingVector for testingVector in reversed(testingVectors)]
-
-    # Test the spatial pooler on testingVectors.
-    accuracy = tb.test(testingVectors, testingTags, clf)
-
-    # Add results to the list
-    parameters.appendResults([accuracy, numCycles])
-
+  #parameters.nextRandomCombination()
+
+  if useSuccessiveHalving:
+    # Train all combinations for one cycle, then keep training the best third
+    # for three times as many cycles until one is left
+    SuccessiveHalving(parameters, createCandidate, trainCandidate,
+      evaluateCandidate, minCycles=1, maxCycles=maxTrainingCycles).run()
+  else:
+    # Run the model on all combinations in parallel, skipping any that are
+    # already in the results file
+    SweepRunner(parameters, runCombination, resultsFile).run()
 
   parameters.printResults(["Percent Accuracy", "Training Cycles"], [", %.2f", ", %d"])
   print "The maximum number of training cycles is set to:", maxTrainingCycles
@@ -19,6 +19,8 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import itertools
+import math
 import random
 
 
@@ -93,6 +95,26 @@ class Parameters(object):
     return self._allowedValues[i][self._valueIndexes[-1][i]]
 
 
+  def getValues(self, valueIndexes):
+    """
+    This method returns a dictionary of the parameter values selected by a
+    list of value indexes, such as one returned by getAllCombinations.
+    """
+    return dict((name, self._allowedValues[i][valueIndexes[i]])
+      for i, name in enumerate(self._names))
+
+
+  def getAllCombinations(self):
+    """
+    This method returns the value indexes of every combination of parameter
+    values, in the order they are visited by nextCombination.
+    """
+    # nextCombination advances the first parameter fastest
+    ranges = [range(len(values)) for values in reversed(self._allowedValues)]
+    return [list(reversed(combination))
+      for combination in itertools.product(*ranges)]
+
+
   def getAllValues(self):
     """
     This method returns the current values of all defined parameters.
@@ -113,6 +135,16 @@ class Parameters(object):
     print
 
 
+  def appendCombinationResults(self, valueIndexes, item):
+    """
+    This method adds an item to the results list for the combination of
+    parameter values given by valueIndexes, which need not be the current
+    combination.  It is used when combinations are evaluated out of order.
+    """
+    self._valueIndexes.append(list(valueIndexes))
+    self._results.append(item)
+
+
   def getNumResults(self):
     """
     This method returns the number of items in the results list.
@@ -182,3 +214,115 @@ class Parameters(object):
 
     print "Parameter Combination: ", self.getAllValues()
     print
+
+
+
+class SuccessiveHalving(object):
+  """
+  This class searches the combinations of parameter values defined in a
+  Parameters instance with successive halving.  All candidates are trained for
+  a few cycles, the best fraction of them by accuracy is kept, and the
+  survivors are trained for more cycles, until one is left or the maximum
+  number of cycles is reached.  The results of the surviving combinations are
+  added to the Parameters instance so they can be shown with printResults.
+
+  runHyperband runs several such brackets that trade the number of candidates
+  against the number of cycles they start with.
+  """
+
+
+  def __init__(self, parameters, createCandidate, trainCandidate,
+      evaluateCandidate, minCycles=1, maxCycles=27, eta=3):
+    """
+    parameters - Parameters instance defining the values to search
+
+    createCandidate - function called as createCandidate(values), where values
+      is a dictionary of parameter values, returning an object that holds
+      everything needed to train and test that combination
+
+    trainCandidate - function called as trainCandidate(candidate, numCycles)
+      that trains the candidate for numCycles more cycles and returns its
+      accuracy
+
+    evaluateCandidate - function called as evaluateCandidate(candidate) for
+      each surviving candidate, returning the list of results to record
+
+    minCycles - number of cycles all candidates are trained for
+
+    maxCycles - maximum total number of cycles a candidate is trained for
+
+    eta - only the best 1/eta of the candidates survive each round, and their
+      total number of cycles is multiplied by eta
+    """
+    assert eta > 1
+    assert 0 < minCycles <= maxCycles
+    self.parameters = parameters
+    self.createCandidate = createCandidate
+    self.trainCandidate = trainCandidate
+    self.evaluateCandidate = evaluateCandidate
+    self.minCycles = minCycles
+    self.maxCycles = maxCycles
+    self.eta = eta
+
+
+  def run(self, combinations=None, minCycles=None):
+    """
+    This method runs one bracket of successive halving on the given value
+    indexes, all the combinations by default, and returns the value indexes
+    of the survivors.
+    """
+    if combinations is None:
+      combinations = self.parameters.getAllCombinations()
+    if minCycles is None:
+      minCycles = self.minCycles
+
+    # Each candidate is [valueIndexes, candidate, accuracy]
+    candidates = [[c, self.createCandidate(self.parameters.getValues(c)), 0.0]
+      for c in combinations]
+    cyclesDone = 0
+    cycles = minCycles
+    while True:
+      for entry in candidates:
+        entry[2] = self.trainCandidate(entry[1], cycles - cyclesDone)
+      cyclesDone = cycles
+      print "Trained", len(candidates), "candidates for", cycles, "cycles"
+      print
+      if len(candidates) == 1 or cycles >= self.maxCycles:
+        break
+      # Keep the best candidates, in their original order if tied
+      ranked = sorted(candidates, key=lambda entry: -entry[2])
+      candidates = ranked[:max(1, len(candidates) // self.eta)]
+      cycles = min(cycles * self.eta, self.maxCycles)
+
+    for entry in candidates:
+      print "Surviving parameter Combination: ",
+      print self.parameters.getValues(entry[0])
+      self.parameters.appendCombinationResults(
+        entry[0], self.evaluateCandidate(entry[1]))
+    return [entry[0] for entry in candidates]
+
+
+  def runHyperband(self, seed=None):
+    """
+    This method runs the Hyperband brackets of successive halving, from many
+    candidates starting with few cycles to few candidates starting with
+    maxCycles.  The candidates of each bracket are chosen at random from all
+    the combinations.  Returns the value indexes of all the survivors; a
+    combination that survives more than one bracket is listed once for each.
+    """
+    rng = random.Random(seed)
+    combinations = self.parameters.getAllCombinations()
+    maxRounds = int(math.log(self.maxCycles / float(self.minCycles),
+                             self.eta) + 1e-9)
+    survivors = []
+    for rounds in xrange(maxRounds, -1, -1):
+      numCandidates = int(math.ceil((maxRounds + 1) * self.eta ** rounds /
+                                    float(rounds + 1)))
+      numCandidates = min(numCandidates, len(combinations))
+      minCycles = max(self.minCycles, self.maxCycles // self.eta ** rounds)
+      print "Hyperband bracket with", numCandidates, "candidates starting at",
+      print minCycles, "cycles"
+      print
+      survivors.extend(self.run(rng.sample(combinations, numCandidates),
+                                minCycles))
+    return survivors
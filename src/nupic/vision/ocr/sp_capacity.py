@@ -38,18 +38,72 @@ minAccuracy - minimum accuracy requred to stop training before
 
 maxTrainingCycles - maximum number of training cycles to perform
 
+resultsFile - file the result of each data set is appended to, so that an
+              interrupted run can be restarted where it left off
 
 """
 
 import dataset_readers as data
-import image_encoders as encoder
 from parameters import Parameters
+from sweep_runner import SweepRunner
 from nupic.research.spatial_pooler import SpatialPooler
 from vision_testbench import VisionTestBench
 from classifiers import KNNClassifier
 
 minAccuracy = 200.0
 maxTrainingCycles = 5
+resultsFile = "sp_capacity_results.json"
+
+
+
+def runCombination(values, seed):
+  """
+  Trains and tests the spatial pooler on one data set and returns the
+  accuracy and the number of training cycles.
+  """
+  trainingDataset = 'OCR/characters/capacity_datasets/' + values["dataSet"]
+  trainingVectors, trainingTags = data.getVectorsAndTags(trainingDataset)
+  testingDataset = 'OCR/characters/capacity_datasets/' + values["dataSet"]
+
+  # Instantiate our spatial pooler
+  sp = SpatialPooler(
+    inputDimensions= (32, 32), # Size of image patch
+    columnDimensions = (32, 32),
+    potentialRadius = 10000, # Ensures 100% potential pool
+    potentialPct = 0.8,
+    globalInhibition = True,
+    localAreaDensity = -1, # Using numActiveColumnsPerInhArea
+    numActiveColumnsPerInhArea = 64,
+    # All input activity can contribute to feature output
+    stimulusThreshold = 0,
+    synPermInactiveDec = 0.001,
+    synPermActiveInc = 0.001,
+    synPermConnected = 0.3,
+    boostStrength = 1.0,
+    seed = seed, # Derived from the data set by SweepRunner
+    spVerbosity = 1)
+
+  # Instantiate the spatial pooler test bench.
+  tb = VisionTestBench(sp)
+
+  # Instantiate the classifier
+  clf = KNNClassifier()
+
+  # Train the spatial pooler on trainingVectors.
+  numCycles = tb.train(trainingVectors, trainingTags, clf, maxTrainingCycles,
+    minAccuracy)
+
+  # Get testing images converted to vectors (cached after the first time).
+  testingVectors, testingTags = data.getVectorsAndTags(testingDataset)
+
+  # Reverse the order of the vectors and tags for testing
+  testingTags = [testingTag for testingTag in reversed(testingTags)]
+  testingVectors = [testingVector for testingVector in reversed(testingVectors)]
+
+  # Test the spatial pooler on testingVectors.
+  accuracy = tb.test(testingVectors, testingTags, clf)
+
+  return [accuracy, numCycles]
 
 
 
@@ -68,58 +122,9 @@ if __name__ == "__main__":
     '58.xml', '59.xml', '60.xml', '61.xml', '62.xml'])
 
 
-  # Run the model until all combinations have been tried
-  while parameters.getNumResults() < parameters.numCombinations:
-
-    # Pick a combination of parameter values
-    parameters.nextCombination()
-    dataSet = parameters.getValue("dataSet")
-    trainingDataset = 'OCR/characters/capacity_datasets/' + dataSet
-    trainingImages, trainingTags = data.getImagesAndTags(trainingDataset)
-    trainingVectors = encoder.imagesToVectors(trainingImages)
-    testingDataset = 'OCR/characters/capacity_datasets/' + dataSet
-
-    # Instantiate our spatial pooler
-    sp = SpatialPooler(
-      inputDimensions= (32, 32), # Size of image patch
-      columnDimensions = (32, 32),
-      potentialRadius = 10000, # Ensures 100% potential pool
-      potentialPct = 0.8,
-      globalInhibition = True,
-      localAreaDensity = -1, # Using numActiveColumnsPerInhArea
-      numActiveColumnsPerInhArea = 64,
-      # All input activity can contribute to feature output
-      stimulusThreshold = 0,
-      synPermInactiveDec = 0.001,
-      synPermActiveInc = 0.001,
-      synPermConnected = 0.3,
-      boostStrength = 1.0,
-      seed = 1956, # The seed that Grok uses
-      spVerbosity = 1)
-
-    # Instantiate the spatial pooler test bench.
-    tb = VisionTestBench(sp)
-
-    # Instantiate the classifier
-    clf = KNNClassifier()
-
-    # Train the spatial pooler on trainingVectors.
-    numCycles = tb.train(trainingVectors, trainingTags, clf, maxTrainingCycles,
-      minAccuracy)
-
-    # Get testing images and convert them to vectors.
-    testingImages, testingTags = data.getImagesAndTags(testingDataset)
-    testingVectors = encoder.imagesToVectors(testingImages)
-
-    # Reverse the order of the vectors and tags for testing
-    testingTags = [testingTag for testingTag in reversed(testingTags)]
-    testingVectors = [testingVector for testingVector in reversed(testingVectors)]
-
-    # Test the spatial pooler on testingVectors.
-    accuracy = tb.test(testingVectors, testingTags, clf)
-
-    # Add results to the list
-    parameters.appendResults([accuracy, numCycles])
+  # Run the model on all data sets, using every core and skipping any data
+  # sets that are already in the results file
+  SweepRunner(parameters, runCombination, resultsFile).run()
 
   # Print out a summary of the results for all data sets
   parameters.printResults(["Percent Accuracy", "Training Cycles"], [", %.2f", ", %d"])
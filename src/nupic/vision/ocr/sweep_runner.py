@@ -0,0 +1,171 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2015, Numenta, Inc.  Unless you have purchased from
+# Numenta, Inc. a separate commercial license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+This module runs a parameter sweep defined with the Parameters class in a pool
+of processes.  Each combination of parameter values is evaluated with its own
+deterministic seed, and its results are appended to a results file as soon as
+they are available, so that an interrupted sweep can be restarted and will
+skip the combinations that have already been recorded.
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import time
+import zlib
+
+import numpy
+
+
+
+def combinationSeed(values, baseSeed=1956):
+  """
+  Returns a seed that only depends on the parameter values and baseSeed, so
+  a combination gets the same seed no matter which process evaluates it or
+  in what order.
+  """
+  key = json.dumps(sorted(values.items()))
+  return (zlib.crc32(key) + baseSeed) & 0x7fffffff
+
+
+
+def _evaluateCombination(args):
+  """
+  Evaluates one combination in a worker process and returns its results
+  together with the wall-clock time it took.
+  """
+  evaluate, i, values, seed = args
+  random.seed(seed)
+  numpy.random.seed(seed)
+  start = time.time()
+  results = evaluate(values, seed)
+  return i, list(results), time.time() - start
+
+
+
+class SweepRunner(object):
+  """
+  This class evaluates every combination of parameter values defined in a
+  Parameters instance and records the results in it, so they can be shown
+  with Parameters.printResults.
+  """
+
+
+  def __init__(self, parameters, evaluate, resultsFile, numProcesses=None,
+      baseSeed=1956):
+    """
+    parameters - Parameters instance defining the values to sweep
+
+    evaluate - function called as evaluate(values, seed), where values is a
+      dictionary of parameter values, returning a list of results.  It must
+      be defined at module level so it can be sent to the worker processes.
+
+    resultsFile - file that each result is appended to as one line of JSON
+
+    numProcesses - number of worker processes, defaults to the number of
+      cores
+
+    baseSeed - seed combined with the parameter values to seed each
+      combination
+    """
+    self.parameters = parameters
+    self.evaluate = evaluate
+    self.resultsFile = resultsFile
+    self.numProcesses = numProcesses or multiprocessing.cpu_count()
+    self.baseSeed = baseSeed
+
+
+  def readResults(self):
+    """
+    Returns the results recorded in the results file, keyed by the JSON
+    encoding of the parameter values.  A partly written last line, left by
+    an interruption, is ignored.
+    """
+    recorded = {}
+    if not os.path.exists(self.resultsFile):
+      return recorded
+    with open(self.resultsFile) as f:
+      for line in f:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          continue
+        recorded[json.dumps(sorted(record["values"].items()))] = record
+    return recorded
+
+
+  def run(self):
+    """
+    Evaluates all the combinations that are not in the results file yet and
+    adds the results of every combination to the Parameters instance.
+    """
+    combinations = self.parameters.getAllCombinations()
+    allValues = [self.parameters.getValues(c) for c in combinations]
+    # Round trip through JSON so the keys match those in the results file
+    keys = [json.dumps(sorted(json.loads(json.dumps(values)).items()))
+            for values in allValues]
+
+    recorded = self.readResults()
+    pending = [i for i, key in enumerate(keys) if key not in recorded]
+    print "Parameter combinations already completed: ",
+    print len(combinations) - len(pending), "/", len(combinations)
+
+    if pending:
+      seeds = dict((i, combinationSeed(allValues[i], self.baseSeed))
+                   for i in pending)
+      tasks = [(self.evaluate, i, allValues[i], seeds[i]) for i in pending]
+      pool = multiprocessing.Pool(min(self.numProcesses, len(pending)))
+      try:
+        with open(self.resultsFile, "a+") as f:
+          # Start on a new line after a partly written line
+          f.seek(0, os.SEEK_END)
+          if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != "\n":
+              f.write("\n")
+          for i, results, seconds in pool.imap_unordered(
+              _evaluateCombination, tasks):
+            record = {"values": allValues[i],
+                      "seed": seeds[i],
+                      "results": results,
+                      "seconds": seconds}
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            recorded[keys[i]] = record
+            print "Just completed parameter Combination: ", allValues[i],
+            print "in %.1f seconds" % seconds
+      except BaseException:
+        # Includes errors raised in the workers and KeyboardInterrupt
+        pool.terminate()
+        raise
+      else:
+        pool.close()
+      finally:
+        pool.join()
+
+    for combination, key in zip(combinations, keys):
+      self.parameters.appendCombinationResults(combination,
+                                               recorded[key]["results"])
+    return recorded
@@ -26,6 +26,63 @@ DEBUG = 0
 
 
 
+class SDRRegistry(object):
+  """
+  Stores each distinct SDR once and maps it to an index.
+
+  SDRs are stored bit-packed in a growable array, one row per SDR, and are
+  looked up through a dict keyed by the packed bytes, so adding an SDR or
+  finding its index takes constant time. Indexing the registry returns the
+  SDR as a list of ints.
+  """
+
+
+  def __init__(self, initialCapacity=64):
+    self._indexes = {}
+    self._packed = None
+    self._numBits = None
+    self._initialCapacity = initialCapacity
+
+
+  def __len__(self):
+    return len(self._indexes)
+
+
+  def __getitem__(self, SDRI):
+    return self.getArray(SDRI).tolist()
+
+
+  def add(self, activeArray):
+    """
+    Return the index of the SDR given as a dense array, adding it first if it
+    has not been seen before.
+    """
+    packed = numpy.packbits(numpy.asarray(activeArray) != 0)
+    key = packed.tostring()
+    SDRI = self._indexes.get(key)
+    if SDRI is None:
+      SDRI = len(self._indexes)
+      if self._packed is None:
+        self._numBits = numpy.asarray(activeArray).size
+        self._packed = numpy.zeros((self._initialCapacity, packed.size),
+                                   dtype=numpy.uint8)
+      elif SDRI == self._packed.shape[0]:
+        # Double the capacity of the store
+        self._packed = numpy.vstack((self._packed,
+                                     numpy.zeros_like(self._packed)))
+      self._packed[SDRI] = packed
+      self._indexes[key] = SDRI
+    return SDRI
+
+
+  def getArray(self, SDRI):
+    """Return the SDR with the given index as an int32 array."""
+    assert SDRI < len(self)
+    bits = numpy.unpackbits(self._packed[SDRI])[:self._numBits]
+    return bits.astype('int32')
+
+
+
 class VisionTestBench(object):
   """
   This class provides methods for characterizing nupic's image recognition
@@ -34,12 +91,12 @@ class VisionTestBench(object):
   """
 
 
-  def __init__(self, sp):
+  def __init__(self, sp, statsSampleSize=None):
     """
     The test bench has just a few things to keep track off:
 
-    - A list of the output SDRs that is shared between the training and testing
-      routines
+    - A registry of the output SDRs that is shared between the training and
+      testing routines
 
     - Height and width of the spatial pooler's inputs and columns which are
       used for producing images of permanences and connected synapses
@@ -47,10 +104,15 @@ class VisionTestBench(object):
     - Images of permanences and connected synapses so these images do not have
       to be generated more than necessary
 
+    - The columns used for the permanence statistics printed during training.
+      If statsSampleSize is given, the statistics are computed from that many
+      randomly chosen columns instead of all of them, which makes reporting
+      cheap for large column grids.
+
     """
     self.sp = sp
 
-    self.SDRs = []
+    self.SDRs = SDRRegistry()
 
     self.tags = []
 
@@ -84,6 +146,15 @@ class VisionTestBench(object):
       self.columnHeight = columnDimensions
       self.columnWidth = 1
 
+    numCols = sp.getNumColumns()
+    if statsSampleSize is not None and statsSampleSize < numCols:
+      # Always sample the same columns so the statistics are comparable
+      # between training cycles
+      self.statsColumns = numpy.sort(numpy.random.RandomState(0).choice(
+          numCols, statsSampleSize, replace=False))
+    else:
+      self.statsColumns = numpy.arange(numCols)
+
 
   def train(self, trainingVectors, trainingTags, classifier, maxCycles=10,
       minAccuracy=100.0):
@@ -124,11 +195,7 @@ class VisionTestBench(object):
       for j,trainingVector in enumerate(trainingVectors):
         self.sp.compute(trainingVector, True, activeArray)
         # Build a list of indexes corresponding to each SDR
-        activeList = activeArray.astype('int32').tolist()
-        if activeList not in self.SDRs:
-          self.SDRs.append(activeList)
-        SDRI = self.SDRs.index(activeList)
-        SDRIs.append(SDRI)
+        SDRIs.append(self.SDRs.add(activeArray))
         # tell classifier to associate SDR and training Tag
         # if there are repeat tags give the index of the first occurrence
         if trainingTags[j] in self.tags:
@@ -141,8 +208,7 @@ class VisionTestBench(object):
       # Check the accuracy of the SP, classifier combination
       accuracy = 0.0
       for j in range(len(SDRIs)):
-        SDRI = SDRIs[j]
-        activeArray = numpy.array(self.SDRs[SDRI])
+        activeArray = self.SDRs.getArray(SDRIs[j])
         # if there are repeat tags give the index of the first occurrence
         category = self.tags.index(trainingTags[j])
         inferred_category = classifier.infer(activeArray)[0]
@@ -152,6 +218,9 @@ class VisionTestBench(object):
       # print updated stats
       self.printTrainingStats(cyclesCompleted, accuracy)
 
+    # Keep the accuracy so schedulers can compare candidates
+    self.trainingAccuracy = accuracy
+
     print
     return cyclesCompleted
 
@@ -173,10 +242,7 @@ class VisionTestBench(object):
     for j, testVector in enumerate(testVectors):
       self.sp.compute(testVector, learn, activeArray)
       # Build a list of indexes corresponding to each SDR
-      activeList = activeArray.astype('int32').tolist()
-      if activeList not in self.SDRs:
-        self.SDRs.append(activeList)
-      SDRIs.append(self.SDRs.index(activeList))
+      SDRIs.append(self.SDRs.add(activeArray))
       if learn:
         # tell classifier to associate SDR and testing Tag
         category = self.tags.index(testingTags[j])
@@ -188,7 +254,7 @@ class VisionTestBench(object):
     if verbose:
       print "%5s" % "Input", "Output"
     for j in range(len(SDRIs)):
-      activeArray = numpy.array(self.SDRs[SDRIs[j]])
+      activeArray = self.SDRs.getArray(SDRIs[j])
       category = self.tags.index(testingTags[j])
       inferred_category = classifier.infer(activeArray)[0]
       if inferred_category == category:
@@ -231,26 +297,8 @@ class VisionTestBench(object):
       print "%13s" % "Accuracy"
       print
     # Calculate permanence stats
-    pctConnected = 0
-    pctUnconnected = 0
-    connectedMean = 0
-    unconnectedMean = 0
-    #perms = numpy.zeros(self.sp.getInputDimensions())
-    perms = numpy.zeros(self.sp.getNumInputs())
-    numCols = self.sp.getNumColumns()
-    for i in range(numCols):
-      self.sp.getPermanence(i, perms)
-      numPerms = perms.size
-      connectedPerms = perms >= self.sp.getSynPermConnected()
-      numConnected = connectedPerms.sum()
-      pctConnected += 100.0/numCols*numConnected/numPerms
-      sumConnected = (perms*connectedPerms).sum()
-      connectedMean += sumConnected/(numConnected*numCols)
-      unconnectedPerms = perms < self.sp.getSynPermConnected()
-      numUnconnected = unconnectedPerms.sum()
-      pctUnconnected += 100.0/numCols*numUnconnected/numPerms
-      sumUnconnected = (perms*unconnectedPerms).sum()
-      unconnectedMean += sumUnconnected/(numUnconnected*numCols)
+    (pctConnected, connectedMean,
+     pctUnconnected, unconnectedMean) = self.getPermanenceStats()
     print "%5s" % trainingCyclesCompleted,
     print "%10s" % ("%.4f" % pctConnected),
     print "%8s" % ("%.3f" % connectedMean),
@@ -261,6 +309,32 @@ class VisionTestBench(object):
 
 
 
+  def getPermanenceStats(self):
+    """
+    Return the percentage of connected synapses, the mean connected synapse
+    permanence, the percentage of unconnected synapses and the mean
+    unconnected synapse permanence. Percentages are averaged over the
+    columns in self.statsColumns, as are the means of each column.
+    """
+    # Pull the permanences of all the columns into one matrix
+    perms = numpy.zeros((len(self.statsColumns), self.sp.getNumInputs()))
+    for row, i in enumerate(self.statsColumns):
+      self.sp.getPermanence(i, perms[row])
+
+    numPerms = perms.shape[1]
+    connectedPerms = perms >= self.sp.getSynPermConnected()
+    numConnected = connectedPerms.sum(axis=1)
+    numUnconnected = numPerms - numConnected
+    sumConnected = numpy.where(connectedPerms, perms, 0).sum(axis=1)
+    sumUnconnected = perms.sum(axis=1) - sumConnected
+
+    pctConnected = 100.0 * numConnected.mean() / numPerms
+    pctUnconnected = 100.0 * numUnconnected.mean() / numPerms
+    connectedMean = (sumConnected / numConnected).mean()
+    unconnectedMean = (sumUnconnected / numUnconnected).mean()
+    return pctConnected, connectedMean, pctUnconnected, unconnectedMean
+
+
   def printOutputHash(self,trainingCyclesCompleted):
     """This routine prints the MD5 hash of the output SDRs."""
     # Print header if this is the first training cycle
@@ -370,12 +444,13 @@ class VisionTestBench(object):
   # take an SDR index and print the corresponding SDR
   def printSDR(self, SDRI):
     assert SDRI < len(self.SDRs)
-    bitLength = len(self.SDRs[SDRI])
+    SDR = self.SDRs[SDRI]
+    bitLength = len(SDR)
     lineLength = int(numpy.sqrt(bitLength))
     for i in range(bitLength):
       if i != 0 and i % lineLength == 0:
         print
-      if self.SDRs[SDRI][i] == 1:
+      if SDR[i] == 1:
         print "1",
       else:
         print "_",
@@ -30,6 +30,7 @@ import inspect
 import os
 import re
 import shutil
+import time
 from unicodedata import normalize
 import yaml
 
@@ -43,6 +44,8 @@ from nupic.vision.image import (serializeImage,
                          deserializeImage,
                          imageExtensions)
 from nupic.bindings.regions.PyRegion import PyRegion
+from nupic.vision.regions.ImageSensorFilters.BaseFilter import (
+  arraysToImage, imageToArrays, releaseScalePyramid)
 
 
 
@@ -59,6 +62,103 @@ def containsConvolutionPostFilter(postFilters):
 
 
 
+def _isArrays(image):
+  """
+  Determine if a filter output is a (pixels, alpha) tuple of numpy arrays
+  rather than an 'LA' image.
+  """
+  return isinstance(image, tuple) and isinstance(image[0], numpy.ndarray)
+
+
+
+def _getImageSize(image):
+  """Return the (width, height) of an 'LA' image or (pixels, alpha) tuple."""
+  if _isArrays(image):
+    return image[0].shape[1], image[0].shape[0]
+  return image.size
+
+
+
+def _toImage(image):
+  """Return an 'LA' image, converting a (pixels, alpha) tuple if necessary."""
+  if _isArrays(image):
+    return arraysToImage(*image)
+  return image
+
+
+
+def _toArrays(image):
+  """Return a (pixels, alpha) tuple, converting an 'LA' image if necessary."""
+  if _isArrays(image) or image.mode != "LA":
+    # Leave images with an illegal mode for the caller to report
+    return image
+  return imageToArrays(image)
+
+
+
+def _mapFilterOutputs(function, filtered):
+  """Apply function to each image in a (possibly nested) list of outputs."""
+  if isinstance(filtered, list):
+    return [_mapFilterOutputs(function, item) for item in filtered]
+  return function(filtered)
+
+
+
+def _supportsArrays(filterObject):
+  """Determine if a filter implements the processArray() protocol."""
+  return getattr(filterObject, "supportsArrays", False)
+
+
+
+def _runFilter(filterObject, image, keepArrays):
+  """
+  Run a filter on an 'LA' image or a (pixels, alpha) tuple.
+
+  Filters that support arrays are called through processArray(), all others
+  through process(), converting the input only if needed. The outputs are
+  returned as (pixels, alpha) tuples if keepArrays is True, so that the next
+  filter can consume them directly, or as 'LA' images otherwise.
+
+  Post filters may return a tuple (images, rawOutput); rawOutput is passed
+  through unchanged.
+  """
+  if _supportsArrays(filterObject):
+    filtered = filterObject.processArray(*_toArrays(image))
+  else:
+    filtered = filterObject.process(_toImage(image))
+
+  convert = _toArrays if keepArrays else _toImage
+  if isinstance(filtered, tuple) and not _isArrays(filtered):
+    return (_mapFilterOutputs(convert, filtered[0]), filtered[1])
+  return _mapFilterOutputs(convert, filtered)
+
+
+
+def _getBoundingBoxes(pixels, background, tolerance=0):
+  """
+  Return the bounding box of the pixels that differ from the background by
+  more than tolerance, for each image of an (N, height, width) array, as an
+  (N, 4) array of (left, upper, right, lower). This is what Image.getbbox()
+  returns in automasking, except that images with no such pixels get the
+  full image instead of None.
+  """
+  numImages, height, width = pixels.shape
+  foreground = numpy.empty(pixels.shape, dtype=bool)
+  numpy.greater(numpy.abs(pixels.astype(numpy.int16) - int(background)),
+                tolerance, out=foreground)
+  rows = foreground.any(axis=2)
+  columns = foreground.any(axis=1)
+
+  bboxes = numpy.empty((numImages, 4), dtype=numpy.int32)
+  bboxes[:, 0] = columns.argmax(axis=1)
+  bboxes[:, 1] = rows.argmax(axis=1)
+  bboxes[:, 2] = width - columns[:, ::-1].argmax(axis=1)
+  bboxes[:, 3] = height - rows[:, ::-1].argmax(axis=1)
+  bboxes[~rows.any(axis=1)] = (0, 0, width, height)
+  return bboxes
+
+
+
 class ImageSensor(PyRegion):
 
   """
@@ -88,7 +188,10 @@ class ImageSensor(PyRegion):
   The filter plugins are located in regions/ImageSensorFilters. Bundled filters
   include scaling, contrast normalization, and Gabor filters. To make a new
   filter, subclass BaseFilter (using the other filters as examples), and drop
-  the new filter in the ImageSensorFilters directory.
+  the new filter in the ImageSensorFilters directory. Filters that also
+  implement BaseFilter.processArray() receive and return numpy arrays, and
+  images are passed between adjacent filters of that kind without being
+  converted to PIL images.
 
   The explorer plugins, located in regions/ImageSensorExplorers, control how
   the sensor moves through the set of input images, their filtered versions,
@@ -135,7 +238,8 @@ class ImageSensor(PyRegion):
                automaskingTolerance=0, automaskingPadding=0, memoryLimit=100,
                minimalBoundingBox=False, dataOut=None, categoryOut=None,
                partitionOut=None, resetOut=None, bboxOut=None, alphaOut=None,
-               auxDataWidth=None, **keywds):
+               auxDataWidth=None, collectPerfStats=False, batchSize=0,
+               **keywds):
     """
     width -- Width of the sensor's output to the network (pixels).
     height -- Height of the sensor's output to the network (pixels).
@@ -204,6 +308,13 @@ class ImageSensor(PyRegion):
     bboxOut -- The output element count of the 'bboxOut' output (NuPIC 1 only).
     auxDataWidth -- The output element count of the 'auxData' output
       (NuPIC2 only).
+    collectPerfStats -- Toggle for timing each stage of compute. The
+      cumulative timings are available through the 'perfStats' parameter and
+      are cleared by the resetPerfStats command.
+    batchSize -- If above 0, each compute advances the explorer batchSize
+      times and also sends all batchSize outputs out at once through the
+      'dataOutBatch', 'categoryOutBatch' and 'resetOutBatch' outputs. The
+      regular outputs hold the last output of the batch.
     """
     PyRegion.__init__(self, **keywds)
 
@@ -306,6 +417,7 @@ class ImageSensor(PyRegion):
     #   recreated later if necessary.
     self._imageList = []
     self.categoryInfo = []  # (categoryName, canonicalImage) for each category
+    self._categoryIndices = {}  # Index in categoryInfo of each categoryName
     self._imageQueue = []  # Queue of image indices for managing memory
     self._filterQueue = []  # Queue of filter outputs for mananging memory
     self._pixelCount = 0  # Count of total loaded pixels for mananging memory
@@ -314,6 +426,9 @@ class ImageSensor(PyRegion):
     self.prevPosition = None  # Position used for the last compute iteration
     self._categoryOutputFile = None  # To write the category on each iteration
     self._iteration = 0  # Internal iteration counter
+    self.collectPerfStats = collectPerfStats
+    self._perfStats = {}  # {stage: [count, total seconds]} for compute stages
+    self.batchSize = batchSize
     self.explorer = None
     self._setFilters(yaml.load(filters) if filters else [])
     self._setPostFilters(yaml.load(postFilters) if postFilters else [])
@@ -766,6 +881,64 @@ class ImageSensor(PyRegion):
     return self.getParameter("numImages"), self.getParameter("numMasks")
 
 
+  def loadArrayImages(self, pixels, categoryNames=None, masks=None,
+                      clearImageList=True):
+    """
+    Add a batch of grayscale images held in memory to the list of images.
+
+    The images are not copied: each image keeps a view of its slice of pixels
+    and is only converted to an image when it is first used, so pixels may
+    wrap shared memory or a buffer that the caller fills with frames. The
+    caller must not modify the slice of an image until it has been used.
+
+    pixels -- uint8 array of shape (numImages, height, width), or any object
+      exposing such a buffer, e.g. a memoryview.
+    categoryNames -- Optional category name of each image.
+    masks -- Optional uint8 array of the same shape as pixels, used as the
+      alpha channel of each image. Without masks, the bounding boxes used for
+      automasking are computed for the whole batch at once.
+    clearImageList -- If True, all loaded images are removed before these
+      images are loaded.
+
+    Only available on the Python object, e.g. through getSelf().
+    """
+    pixels = numpy.asarray(pixels, dtype=numpy.uint8)
+    if pixels.ndim != 3:
+      raise ValueError("pixels must have shape (numImages, height, width), "
+                       "got %s" % (pixels.shape,))
+    if categoryNames is not None and len(categoryNames) != len(pixels):
+      raise ValueError("Got %d category names for %d images"
+                       % (len(categoryNames), len(pixels)))
+    bboxes = None
+    if masks is not None:
+      masks = numpy.asarray(masks, dtype=numpy.uint8)
+      if masks.shape != pixels.shape:
+        raise ValueError("masks must have the shape of pixels %s, got %s"
+                         % (pixels.shape, masks.shape))
+    else:
+      bboxes = _getBoundingBoxes(pixels, self.background,
+                                 self.automaskingTolerance).tolist()
+
+    if clearImageList:
+      self.clearImageList(skipExplorerUpdate=True)
+
+    for i in xrange(len(pixels)):
+      categoryName = None
+      if categoryNames is not None and categoryNames[i] is not None:
+        categoryName = str(categoryNames[i])
+      self._addImage(categoryName=categoryName, array=pixels[i],
+                     mask=masks[i] if masks is not None else None,
+                     bbox=tuple(bboxes[i]) if bboxes is not None else None)
+    self.explorer[2].update(numImages=len(self._imageList))
+
+    if clearImageList:
+      self.explorer[2].first()
+
+    self._meetMemoryLimit()
+
+    return self.getParameter("numImages"), self.getParameter("numMasks")
+
+
   def clearImageList(self, skipExplorerUpdate=False):
     """
     Clear the list of images.
@@ -841,6 +1014,37 @@ class ImageSensor(PyRegion):
     self.explorer[2].seek(iteration=iteration, position=position)
 
 
+  def getExplorerState(self):
+    """
+    Return the state of the explorer and of the sensor's iteration counters,
+    such that setExplorerState() continues from the current position.
+
+    Together with the saved network, this allows a checkpointed run to resume
+    exactly where it stopped. The images themselves are not included.
+    """
+
+    return {"explorer": self.explorer[0],
+            "explorerState": self.explorer[2].getState(),
+            "iteration": self._iteration,
+            "holdForOffset": self._holdForOffset,
+            "prevPosition": copy.deepcopy(self.prevPosition)}
+
+
+  def setExplorerState(self, state):
+    """
+    Restore a state returned by getExplorerState(). The same explorer must be
+    set and the same images loaded.
+    """
+
+    if state["explorer"] != self.explorer[0]:
+      raise RuntimeError("Explorer state is for '%s', but the explorer is '%s'"
+                         % (state["explorer"], self.explorer[0]))
+    self.explorer[2].setState(state["explorerState"])
+    self._iteration = state["iteration"] #pylint: disable=W0201
+    self._holdForOffset = state["holdForOffset"] #pylint: disable=W0201
+    self.prevPosition = copy.deepcopy(state["prevPosition"]) #pylint: disable=W0201
+
+
   def getNumIterations(self, image=None):
     """
     Calculate how many samples the explorer will provide.
@@ -998,13 +1202,20 @@ class ImageSensor(PyRegion):
 
   def _addImage(self, image=None, imagePath=None, maskPath=None,
                 categoryName=None, erode=None, userAuxData=None, auxPath=None,
-                manualAux=False, sequenceIndex=None, frameIndex=None):
+                manualAux=False, sequenceIndex=None, frameIndex=None,
+                array=None, mask=None, bbox=None):
     """
     Create a dictionary for an image and metadata and add to the imageList.
+
+    array, mask and bbox are used by loadArrayImages: the image is created
+    from the array when it is loaded, and bbox replaces automasking.
     """
 
     item = {"image": image,
             "imagePath": imagePath,
+            "array": array,
+            "mask": mask,
+            "bbox": bbox,
             "auxData": userAuxData,
             "auxPath": auxPath,
             "manualAux": manualAux,
@@ -1031,10 +1242,7 @@ class ImageSensor(PyRegion):
       item["categoryIndex"] = -1
     else:
       # Look up the category in categoryInfo
-      for i in xrange(len(self.categoryInfo)):
-        if self.categoryInfo[i][0] == item["categoryName"]:
-          item["categoryIndex"] = i
-          break
+      item["categoryIndex"] = self._categoryIndices.get(item["categoryName"])
     if item["categoryIndex"] is None:
       # This is the first image of this category (blank categories ignored)
       item["categoryIndex"] = len(self.categoryInfo)
@@ -1044,6 +1252,7 @@ class ImageSensor(PyRegion):
       if not image:
         self._imageQueue.insert(0, len(self._imageList) - 1)
       # Append this category to categoryInfo
+      self._categoryIndices[item["categoryName"]] = len(self.categoryInfo)
       self.categoryInfo.append((item["categoryName"], original))
     elif image:
       # Image is already present, just prepare it
@@ -1060,14 +1269,27 @@ class ImageSensor(PyRegion):
       for categoryInfo.
     """
 
+    if self.collectPerfStats:
+      startTime = time.time()
+    original = self._loadImageUntimed(index, returnOriginal, setErodeFlag)
+    if self.collectPerfStats:
+      self._addPerfTime("loadImage", startTime)
+    return original
+
+
+  def _loadImageUntimed(self, index, returnOriginal, setErodeFlag):
     item = self._imageList[index]
 
     if not item["image"]:
-      # Load the image from disk
-      f = open(item["imagePath"], "rb")
-      item["image"] = Image.open(f)
-      item["image"].load()
-      f.close()
+      if item.get("array") is not None:
+        # Create the image from the array given to loadArrayImages
+        item["image"] = Image.fromarray(item["array"], "L")
+      else:
+        # Load the image from disk
+        f = open(item["imagePath"], "rb")
+        item["image"] = Image.open(f)
+        item["image"].load()
+        f.close()
       # Update the pixel count
       self._pixelCount += item["image"].size[0] * item["image"].size[1]
 
@@ -1116,14 +1338,20 @@ class ImageSensor(PyRegion):
         mask = mask.convert("L")
       f.close()
       item["image"].putalpha(mask)
+    elif item.get("mask") is not None:
+      item["image"].putalpha(Image.fromarray(item["mask"], "L"))
     elif item["image"].mode != "LA":
-      diffImage = ImageChops.difference(
-          item["image"], ImageChops.constant(item["image"], self.background))
-      if self.automaskingTolerance:
-        diffImage = ImageChops.subtract(
-            diffImage, ImageChops.constant(item["image"],
-                                           self.automaskingTolerance))
-      bbox = diffImage.getbbox()
+      if item.get("bbox") is not None:
+        # Computed by loadArrayImages for the whole batch
+        bbox = item["bbox"]
+      else:
+        diffImage = ImageChops.difference(
+            item["image"], ImageChops.constant(item["image"], self.background))
+        if self.automaskingTolerance:
+          diffImage = ImageChops.subtract(
+              diffImage, ImageChops.constant(item["image"],
+                                             self.automaskingTolerance))
+        bbox = diffImage.getbbox()
       if not bbox:
         bbox = (0, 0, item["image"].size[0], item["image"].size[1])
       elif self.automaskingPadding:
@@ -1172,9 +1400,23 @@ class ImageSensor(PyRegion):
 
 
   def _applyFilter(self, image, imageIndex, filterIndex):
-    """Apply the specified filter to the image."""
+    """
+    Apply the specified filter to the image.
 
-    filtered = self.filters[filterIndex][2].process(image)
+    The image may be a (pixels, alpha) tuple. The outputs are left as tuples
+    when the next filter supports arrays; the outputs of the last filter are
+    always images.
+    """
+
+    keepArrays = (filterIndex < len(self.filters) - 1 and
+                  _supportsArrays(self.filters[filterIndex + 1][2]))
+    if self.collectPerfStats:
+      startTime = time.time()
+    filtered = _runFilter(self.filters[filterIndex][2], image, keepArrays)
+    if self.collectPerfStats:
+      self._addPerfTime("filters[%d]:%s" % (filterIndex,
+                                            self.filters[filterIndex][0]),
+                        startTime)
 
     if not isinstance(filtered, list):
       filtered = [filtered]
@@ -1199,7 +1441,7 @@ class ImageSensor(PyRegion):
     for item in filtered:
       for image in item:
         # Verify that the image has the correct mode
-        if image.mode != "LA":
+        if not _isArrays(image) and image.mode != "LA":
           s = ("Filtered image returned by the '%s' filter (index %d) has "
                "illegal mode '%s'. Images must be mode 'LA' (grayscale with "
                "alpha channel containing the mask)." %
@@ -1208,7 +1450,8 @@ class ImageSensor(PyRegion):
             s += " The filter may have removed the alpha channel."
           raise RuntimeError(s)
         # Update the pixel count
-        self._pixelCount += image.size[0] * image.size[1]
+        width, height = _getImageSize(image)
+        self._pixelCount += width * height
 
     if self.logFilteredImages:
       # Save filter output to disk
@@ -1228,11 +1471,11 @@ class ImageSensor(PyRegion):
           # Simultaneous outputs
           for i, image in enumerate(f):
             filename = os.path.join(path, "%02d_%02d.png" % (index, i))
-            image.split()[0].save(filename)
+            _toImage(image).split()[0].save(filename)
         else:
           # Single output
           filename = os.path.join(path, "%02d.png" % index)
-          f[0].split()[0].save(filename)
+          _toImage(f[0]).split()[0].save(filename)
         index += 1
 
     return filtered
@@ -1241,14 +1484,24 @@ class ImageSensor(PyRegion):
   def _applyPostFilters(self, image, filterIndex=0):
     """
     Recursively apply the postFilters to the image and return a list of images.
+
+    The image may be a (pixels, alpha) tuple. Intermediate outputs stay as
+    tuples when the next post filter supports arrays.
     """
     # Filter the image
     rawOutput = None
-    filtered = self.postFilters[filterIndex][2].process(image)
+    keepArrays = (filterIndex < len(self.postFilters) - 1 and
+                  _supportsArrays(self.postFilters[filterIndex + 1][2]))
+    if self.collectPerfStats:
+      startTime = time.time()
+    filtered = _runFilter(self.postFilters[filterIndex][2], image, keepArrays)
+    if self.collectPerfStats:
+      self._addPerfTime("postFilters[%d]:%s" % (
+          filterIndex, self.postFilters[filterIndex][0]), startTime)
 
     # Handle special case where the post filter wants to control the output
     # of the image sensor (e.g convolution post filters)
-    if isinstance(filtered, tuple):
+    if isinstance(filtered, tuple) and not _isArrays(filtered):
       assert len(filtered) == 2
       rawOutput = filtered[1]
       assert isinstance(rawOutput, numpy.ndarray)
@@ -1280,7 +1533,7 @@ class ImageSensor(PyRegion):
 
     for image in filtered:
       # Verify that the image has the correct mode
-      if image.mode != "LA":
+      if not _isArrays(image) and image.mode != "LA":
         s = ("Filtered image returned by the '%s' postFilter (index %d) has "
              "illegal mode '%s'. Images must be mode 'LA' (grayscale with "
              "alpha channel containing the mask)."
@@ -1302,10 +1555,10 @@ class ImageSensor(PyRegion):
       if len(filtered) > 1:
         for i, image in enumerate(filtered):
           name = os.path.join(path, "%09d_%02d.png" % (self._iteration, i))
-          image.save(name)
+          _toImage(image).save(name)
       else:
         name = os.path.join(path, "%09d.png" % self._iteration)
-        filtered[0].save(name)
+        _toImage(filtered[0]).save(name)
 
     if filterIndex == len(self.postFilters) - 1:
       return filtered, rawOutput
@@ -1415,7 +1668,8 @@ class ImageSensor(PyRegion):
 
     # Update the queues to mark this image as recently accessed
     # Only mark the original image if it could be loaded from disk again
-    if self._imageList[position["image"]]["imagePath"]:
+    if (self._imageList[position["image"]]["imagePath"] or
+        self._imageList[position["image"]].get("array") is not None):
       if position["image"] in self._imageQueue:
         self._imageQueue.remove(position["image"])
       self._imageQueue.insert(0, position["image"])
@@ -1462,6 +1716,8 @@ class ImageSensor(PyRegion):
     else:
       # Get the image(s) to send out
       allImages = self._getFilteredImages()
+      if self.collectPerfStats:
+        startTime = time.time()
 
       # Calculate a scale factor in each dimension for adjusting the offset
       scaleX = [image.size[0] / float(allImages[0].size[0])
@@ -1502,10 +1758,14 @@ class ImageSensor(PyRegion):
                                    int(round(self.enabledWidth * scaleX[i])),
                                    int(round(self.enabledHeight * scaleY[i]))))
                        for i, image in enumerate(newImages)]
+      if self.collectPerfStats:
+        self._addPerfTime("crop", startTime)
 
       # Filter through the post filters
       finalOutput = None
       if self.postFilters:
+        if self.collectPerfStats:
+          startTime = time.time()
 
         newCroppedImages = []
         for i in xrange(len(croppedImages)):
@@ -1517,6 +1777,8 @@ class ImageSensor(PyRegion):
             responses = responses[0]
           newCroppedImages.extend(responses)
         croppedImages = newCroppedImages
+        if self.collectPerfStats:
+          self._addPerfTime("postFilters", startTime)
 
       # Check that the number of images matches the depth
       if len(croppedImages) != self.depth:
@@ -1798,6 +2060,8 @@ class ImageSensor(PyRegion):
     for item in self._imageList:
       if item["filtered"]:
         item["filtered"] = {}
+        if item["image"] is not None:
+          releaseScalePyramid(item["image"])
     self._filterQueue = [] #pylint: disable=W0201
     # Update the pixel count to only count to the original images
     self._pixelCount = 0 #pylint: disable=W0201
@@ -1982,10 +2246,20 @@ class ImageSensor(PyRegion):
       if len(self._filterQueue) > 1:
         # Unload the filtered image used least recently
         imageIndex, filterPosition = self._filterQueue.pop()
-        filtered = self._imageList[imageIndex]["filtered"][filterPosition]
+        allFilteredImages = self._imageList[imageIndex]["filtered"]
+        filtered = allFilteredImages[filterPosition]
         for i in xrange(len(filtered)):
-          self._pixelCount -= filtered[i].size[0] * filtered[i].size[1]
-        self._imageList[imageIndex]["filtered"].pop(filterPosition)
+          width, height = _getImageSize(filtered[i])
+          self._pixelCount -= width * height
+        allFilteredImages.pop(filterPosition)
+        # The filter may have cached a scale pyramid on its input image,
+        # which would keep uncounted pixels alive
+        if len(filterPosition) > 1:
+          source = allFilteredImages.get(filterPosition[:-1], [None])[0]
+        else:
+          source = self._imageList[imageIndex]["image"]
+        if source is not None and not _isArrays(source):
+          releaseScalePyramid(source)
       elif self._imageQueue:
         if len(self._imageQueue) == 1 and not self.filters:
           # No filters and this is the current image - don't unload it
@@ -2014,14 +2288,83 @@ class ImageSensor(PyRegion):
 
   def compute(self, inputs=None, outputs=None):
     """
-    Generate the next sensor output and send it out.
+    Generate the next sensor output and send it out. If batchSize is above 0,
+    generate the next batchSize outputs and also send them out together.
 
     This method is called by the runtime engine.
     """
+    if self.batchSize > 0 and outputs and "dataOutBatch" in outputs:
+      dataOutBatch = outputs["dataOutBatch"].reshape(self.batchSize, -1)
+      self._computeRows(dataOutBatch, outputs["categoryOutBatch"],
+                        outputs["resetOutBatch"], outputs)
+      # The regular outputs hold the last output of the batch
+      outputs["dataOut"][:] = dataOutBatch[-1]
+      outputs["categoryOut"][:] = outputs["categoryOutBatch"][-1]
+      if "resetOut" in outputs:
+        outputs["resetOut"][:] = outputs["resetOutBatch"][-1]
+    else:
+      self._computeSingle(outputs)
+
+
+  def iterateBatches(self, batchSize, numIterations=None):
+    """
+    Generate the sensor outputs in batches, for use without a network,
+    starting from the explorer's current position.
+
+    Yields (data, categories, resets) with one row per output: data is a
+    (batchSize, depth * height * width) array of dataOut vectors, categories
+    and resets the matching categoryOut and resetOut values. The last batch
+    may be smaller. Each batch is a new set of arrays.
+
+    batchSize -- Number of outputs per batch.
+    numIterations -- Total number of outputs. Defaults to the numIterations
+      parameter, i.e. one pass of the explorer over the loaded images, if the
+      explorer supports it.
+    """
+    if numIterations is None:
+      numIterations = self.getNumIterations()
+      if numIterations < 0:
+        raise RuntimeError("The explorer cannot compute the number of "
+                           "iterations; specify numIterations")
+
+    vectorSize = self.getOutputElementCount("dataOut")
+    outputs = {"auxDataOut": numpy.zeros(
+        self.getOutputElementCount("auxDataOut"), _REAL_NUMPY_DTYPE)}
+    for start in xrange(0, numIterations, batchSize):
+      numRows = min(batchSize, numIterations - start)
+      data = numpy.zeros((numRows, vectorSize), _REAL_NUMPY_DTYPE)
+      categories = numpy.zeros(numRows, _REAL_NUMPY_DTYPE)
+      resets = numpy.zeros(numRows, _REAL_NUMPY_DTYPE)
+      self._computeRows(data, categories, resets, outputs)
+      yield data, categories, resets
+
+
+  def _computeRows(self, data, categories, resets, outputs):
+    """
+    Compute once for each row of data, writing the dataOut, categoryOut and
+    resetOut of each output to the row's views of data, categories and resets.
+    The other outputs hold the last output.
+    """
+    stepOutputs = dict(outputs)
+    for i in xrange(len(data)):
+      stepOutputs["dataOut"] = data[i]
+      stepOutputs["categoryOut"] = categories[i:i + 1]
+      stepOutputs["resetOut"] = resets[i:i + 1]
+      self._computeSingle(stepOutputs)
+
+
+  def _computeSingle(self, outputs):
+    """
+    Generate the next sensor output and write it to outputs.
+    """
     #from dbgp.client import brk; brk(port=9019)
     if len(self._imageList) == 0:
       raise RuntimeError("ImageSensor can't run compute: no images loaded")
 
+    collectPerfStats = self.collectPerfStats
+    if collectPerfStats:
+      computeStartTime = time.time()
+
     # Check to see if new image belongs to a new sequence, if so force Reset
     prevPosition = self.prevPosition
     if prevPosition is not None:
@@ -2044,11 +2387,20 @@ class ImageSensor(PyRegion):
     self._holdForOffset += 1
     if self._holdForOffset >= holdFor:
       self._holdForOffset = 0 #pylint: disable=W0201
+      if collectPerfStats:
+        startTime = time.time()
       self.explorer[2].next()
+      if collectPerfStats:
+        self._addPerfTime("explorer", startTime)
     self._iteration += 1
 
     # Get the image(s) to send out
+    if collectPerfStats:
+      startTime = time.time()
     outputImages, finalOutput = self._getOutputImages()
+    if collectPerfStats:
+      self._addPerfTime("getOutputImages", startTime)
+      startTime = time.time()
 
     # Compile information about this iteration and log it
     imageInfo = self._getImageInfo()
@@ -2096,6 +2448,9 @@ class ImageSensor(PyRegion):
 
     # Save category to file
     self._writeCategoryToFile(category)
+    if collectPerfStats:
+      self._addPerfTime("logging", startTime)
+      startTime = time.time()
 
     if outputs:
       # Convert the output images to a numpy vector
@@ -2170,6 +2525,26 @@ class ImageSensor(PyRegion):
         outputs["partitionOut"][:] = numpy.array([float(partition)],
                                                  _REAL_NUMPY_DTYPE)
 
+    if collectPerfStats:
+      self._addPerfTime("outputs", startTime)
+      self._addPerfTime("compute", computeStartTime)
+
+
+  def _addPerfTime(self, stage, startTime):
+    """Add the time since startTime to the perfStats of a compute stage."""
+
+    stats = self._perfStats.get(stage)
+    if stats is None:
+      stats = self._perfStats[stage] = [0, 0.0]
+    stats[0] += 1
+    stats[1] += time.time() - startTime
+
+
+  def resetPerfStats(self):
+    """Clear the timings collected while collectPerfStats is on."""
+
+    self._perfStats = {} #pylint: disable=W0201
+
 
   def getParameter(self, parameterName, index=-1):
     """Get the value of an ImageSensor parameter."""
@@ -2190,7 +2565,8 @@ class ImageSensor(PyRegion):
       return len(self._imageList)
 
     elif parameterName == "numMasks":
-      return len([True for x in self._imageList if x["maskPath"]])
+      return len([True for x in self._imageList
+                  if x["maskPath"] or x.get("mask") is not None])
 
     elif parameterName in ("numIterations", "maxOutputVectorCount"):
       return self.getNumIterations()
@@ -2262,6 +2638,13 @@ class ImageSensor(PyRegion):
     elif parameterName == "sequenceCount":
       return self.getSequenceCount()
 
+    elif parameterName == "perfStats":
+      return yaml.dump(dict((stage, {"count": count,
+                                     "totalTime": totalTime,
+                                     "meanTime": totalTime / count})
+                            for stage, (count, totalTime)
+                            in self._perfStats.iteritems()))
+
     elif parameterName == "metadata":
       metadata = dict()
       # Compute the position relative to center
@@ -2316,8 +2699,15 @@ class ImageSensor(PyRegion):
         self._categoryOutputFile = None #pylint: disable=W0201
       self.categoryOutputFile = parameterValue #pylint: disable=W0201
 
+    elif parameterName == "batchSize":
+      raise RuntimeError("batchSize can only be set when the sensor is "
+                         "created, as the batch outputs are sized from it")
+
     elif parameterName == "categoryInfo":
       self.categoryInfo = deserializeCategoryInfo(parameterValue) #pylint: disable=W0201
+      self._categoryIndices = {} #pylint: disable=W0201
+      for i, (name, _) in reversed(list(enumerate(self.categoryInfo))):
+        self._categoryIndices[name] = i
       # TODO change the names and indices of the loaded image?
 
     elif parameterName == "background":
@@ -2366,7 +2756,8 @@ class ImageSensor(PyRegion):
     for name in ["width", "height", "depth", "mode", "blankWithReset",
                  "enabledWidth", "enabledHeight", "invertOutput", "background",
                  "automaskingTolerance", "automaskingPadding", "memoryLimit",
-                 "minimalBoundingBox", "_cubeOutputs", "_auxDataWidth"]:
+                 "minimalBoundingBox", "_cubeOutputs", "_auxDataWidth",
+                 "batchSize"]:
       state[name] = getattr(self, name)
 
     # Add attributes that have been manipulated
@@ -2419,6 +2810,8 @@ class ImageSensor(PyRegion):
     self.logLocationOnOriginalImage = False #pylint: disable=W0201
     self.logBoundingBox = False #pylint: disable=W0201
     self.logDir = "imagesensor_log" #pylint: disable=W0201
+    self.collectPerfStats = False #pylint: disable=W0201
+    self._perfStats = {} #pylint: disable=W0201
     self.categoryOutputFile = None #pylint: disable=W0201
     self._categoryOutputFile = None #pylint: disable=W0201
     self.outputImage = None  #pylint: disable=W0201
@@ -2445,6 +2838,9 @@ class ImageSensor(PyRegion):
     if not hasattr(self, "_auxDataWidth"):
       self._auxDataWidth = 0 #pylint: disable=W0201
 
+    if not hasattr(self, "batchSize"):
+      self.batchSize = 0 #pylint: disable=W0201
+
     if version < 1.65:
       # Set to True, the old behavior, though it is set to False by default
       # in new networks
@@ -2510,6 +2906,29 @@ class ImageSensor(PyRegion):
                 count=0,
                 regionLevel=True,
                 isDefaultOutput=False),
+
+            dataOutBatch=dict(
+                description="""Pixels of the batchSize images of the last
+                  compute, one dataOut vector after the other.""",
+                dataType="Real32",
+                count=0,
+                regionLevel=True,
+                isDefaultOutput=False),
+
+            categoryOutBatch=dict(
+                description="""Category index of each image in
+                  dataOutBatch.""",
+                dataType="Real32",
+                count=0,
+                regionLevel=True,
+                isDefaultOutput=False),
+
+            resetOutBatch=dict(
+                description="""Reset flag of each image in dataOutBatch.""",
+                dataType="Real32",
+                count=0,
+                regionLevel=True,
+                isDefaultOutput=False),
         ),
         parameters = dict(
             outputImageWithAlpha=dict(
@@ -2836,6 +3255,33 @@ class ImageSensor(PyRegion):
                 count=1,
                 constraints="bool",
                 accessMode="ReadWrite"),
+            batchSize=dict(
+                description="""Number of outputs generated by each compute
+                  and sent out through the batch outputs; 0 turns the batch
+                  outputs off. Can only be set when the sensor is created,
+                  as the batch outputs are sized from it.""",
+                dataType="UInt32",
+                count=1,
+                constraints="",
+                accessMode="Create"),
+            collectPerfStats=dict(
+                description="""Toggle for timing each stage of compute.""",
+                dataType="Bool",
+                count=1,
+                constraints="bool",
+                accessMode="ReadWrite"),
+            perfStats=dict(
+                description="""YAML serialized dictionary containing the
+                  number of calls and the total and mean time in seconds of
+                  each compute stage, while collectPerfStats is on. Filters
+                  are keyed by their index and name, e.g.
+                  'filters[0]:Resize'. Stages include the stages they trigger,
+                  e.g. 'explorer' includes loading and filtering the images
+                  that the explorer looks at.""",
+                dataType="Byte",
+                count=0,
+                constraints="",
+                accessMode="Read"),
             blankWithReset=dict(
                 description="""** DEPRECATED ** Whether to send a blank output
                   every time the explorer generates a reset signal (such as
@@ -2875,7 +3321,8 @@ class ImageSensor(PyRegion):
         ),
         commands=dict(
             loadSingleImage=dict(description="load a single image"),
-            loadMultipleImages=dict(description="load multiple images"))
+            loadMultipleImages=dict(description="load multiple images"),
+            resetPerfStats=dict(description="clear the perfStats timings"))
     )
 
     return ns
@@ -2892,6 +3339,10 @@ class ImageSensor(PyRegion):
       return self.width * self.height * self.depth
     elif name == "alphaOut":
       return 1
+    elif name == "dataOutBatch":
+      return self.batchSize * self.width * self.height * self.depth
+    elif name in ("categoryOutBatch", "resetOutBatch"):
+      return self.batchSize
     else:
       raise Exception("Unknown output: " + name)
 
@@ -2941,7 +3392,7 @@ def _deserializeImageList(sImageList):
 def _serializeAllImages(old):
   new = {}
   for key in old:
-    new[key] = [serializeImage(image) for image in old[key]]
+    new[key] = [serializeImage(_toImage(image)) for image in old[key]]
   return new
 
 
@@ -19,6 +19,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import copy
 import random
 
 
@@ -175,6 +176,30 @@ class BaseExplorer(object):
 
     self.random.setstate(self.initialRandomState)
 
+  def getState(self):
+    """
+    Return a picklable copy of the explorer's state, including the current
+    position and the state of the random number generator.
+
+    The ImageSensor methods passed to the constructor are not included.
+    """
+
+    state = dict((name, value) for name, value in self.__dict__.iteritems()
+                 if name not in ("getOriginalImage", "getFilteredImages",
+                                 "getImageInfo", "random"))
+    state = copy.deepcopy(state)
+    state["randomState"] = self.random.getstate()
+    return state
+
+  def setState(self, state):
+    """
+    Restore the state returned by getState() for the same images.
+    """
+
+    state = copy.deepcopy(state)
+    self.random.setstate(state.pop("randomState"))
+    self.__dict__.update(state)
+
   def isBlank(self, fallOffObject, position=None):
     """
     Return True if the enabled region of the image specified by the current
@@ -20,9 +20,10 @@
 # ----------------------------------------------------------------------
 
 import numpy
-from PIL import Image
 
-from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter
+from nupic.vision.regions.ImageSensorFilters.BaseFilter import (BaseFilter,
+                                                                arraysToImage,
+                                                                imageToArrays)
 
 
 class AddNoise(BaseFilter):
@@ -31,6 +32,8 @@ class AddNoise(BaseFilter):
   Add noise to the image.
   """
 
+  supportsArrays = True
+
   def __init__(self, noiseLevel=0.0, doForeground=True, doBackground=False,
                dynamic=True, noiseThickness=1):
     """
@@ -45,6 +48,10 @@ class AddNoise(BaseFilter):
       (the ImageSensor 'background' parameter) is foreground, and the rest is
       background.
     doBackground -- Whether to add noise to the background (see above).
+    dynamic -- Whether to generate new noise on each call. If False, the same
+      noise is added to every image.
+    noiseThickness -- For black and white images, the width and height of
+      each block of pixels that is flipped together.
     """
 
     BaseFilter.__init__(self)
@@ -55,11 +62,10 @@ class AddNoise(BaseFilter):
     self.dynamic = dynamic
     self.noiseThickness = noiseThickness
 
-    # Generate and save our random state
-    saveState = numpy.random.get_state()
-    numpy.random.seed(0)
-    self._randomState = numpy.random.get_state()
-    numpy.random.set_state(saveState)
+    # Dedicated generator, so that the global numpy random state is left alone.
+    # Without dynamic noise it is reset to its initial state on every call.
+    self._random = numpy.random.RandomState(0)
+    self._initialState = self._random.get_state()
 
   def process(self, image):
     """
@@ -67,74 +73,66 @@ class AddNoise(BaseFilter):
 
     Returns a single image, or a list containing one or more images.
     """
-    # Get our random state back
-    saveState = numpy.random.get_state()
-    numpy.random.set_state(self._randomState)
+    pixels, alpha = imageToArrays(image)
+    pixels, alpha = self.processArray(pixels, alpha)
+    return arraysToImage(pixels, alpha)
+
+  def processArray(self, pixels, alpha):
+    """
+    @param pixels -- 2D numpy array of gray levels.
+    @param alpha -- 2D uint8 numpy array containing the mask.
 
+    Returns a (pixels, alpha) tuple.
+    """
     # Send through parent class first
-    BaseFilter.process(self, image)
+    BaseFilter.processArray(self, pixels, alpha)
+
+    if not self.dynamic:
+      # Generate the same noise every time
+      self._random.set_state(self._initialState)
 
-    alpha = image.split()[1]
     # -----------------------------------------------------------------------
     # black and white
     if self.mode == 'bw':
       # For black and white images, our doBackground pixels are 255 and our figure pixels
       #  are 0.
       assert self.noiseThickness != 0, "ImageSensor parameter noiseThickness cannot be 0"
-      pixels = numpy.array(image.split()[0].getdata(), dtype=int)
-      (imgWidth,imgHeight) = image.size
-      pixels2d = (numpy.array(pixels)).reshape(imgHeight, imgWidth)
-      noiseArrayW = numpy.floor(imgWidth/float(self.noiseThickness))
-      noiseArrayH = numpy.floor(imgHeight/float(self.noiseThickness))
-      thickNoise = numpy.random.random((noiseArrayH, noiseArrayW))
-      thickNoise = 255*(thickNoise < self.noiseLevel)
-      idxW = numpy.array([int(self.noiseThickness*i) for i in xrange(noiseArrayW)])
-      idxH = numpy.array([int(self.noiseThickness*i) for i in xrange(noiseArrayH)])
-      for nt1 in xrange(self.noiseThickness):
-        for nt2 in xrange(self.noiseThickness):
-          submatIdx = numpy.ix_(idxH + nt1, idxW + nt2)
-          if self.doForeground and self.doBackground:
-            pixels2d[submatIdx] ^= thickNoise
-          elif self.doForeground:
-            pixels2d[submatIdx] = (pixels2d[submatIdx]^thickNoise) | pixels2d[submatIdx]
-          elif self.doBackground:
-            pixels2d[submatIdx] = (pixels2d[submatIdx]^thickNoise) & pixels2d[submatIdx]
-        pixels2d = numpy.abs(pixels2d)
-        pixels = pixels2d.reshape(1,imgWidth*imgHeight)[0]
+      pixels = numpy.array(pixels, dtype=numpy.uint8)
+      (imgHeight,imgWidth) = pixels.shape
+      noiseArrayW = imgWidth // self.noiseThickness
+      noiseArrayH = imgHeight // self.noiseThickness
+      thickNoise = self._random.random_sample((noiseArrayH, noiseArrayW))
+      thickNoise = (thickNoise < self.noiseLevel).astype(numpy.uint8) * 255
+      # Expand each noise value to a noiseThickness x noiseThickness block.
+      # Pixels beyond the last whole block are left alone.
+      thickNoise = thickNoise.repeat(self.noiseThickness, axis=0)
+      thickNoise = thickNoise.repeat(self.noiseThickness, axis=1)
+      block = pixels[:thickNoise.shape[0], :thickNoise.shape[1]]
+      if self.doForeground and self.doBackground:
+        block ^= thickNoise
+      elif self.doForeground:
+        block |= thickNoise
+      elif self.doBackground:
+        block &= ~thickNoise
 
     # -----------------------------------------------------------------------
     # gray-scale
     elif self.mode == 'gray':
-      pixels = numpy.array(image.split()[0].getdata(), dtype=int)
-      noise = numpy.random.random(len(pixels))  # get array of floats from 0 to 1
+      pixels = numpy.array(pixels, dtype=float)
+      noise = self._random.random_sample(pixels.shape)  # floats from 0 to 1
 
       # Add +/- self.noiseLevel to each pixel
       noise = (noise - 0.5) * 2 * self.noiseLevel * 255
-      mask = numpy.array(alpha.getdata(), dtype=int) != self.background
+      mask = alpha != self.background
       if self.doForeground and self.doBackground:
         pixels += noise
       elif self.doForeground:
-        pixels[mask!=0] += noise[mask!=0]
+        pixels[mask] += noise[mask]
       elif self.doBackground:
-        pixels[mask==0] += noise[mask==0]
+        pixels[~mask] += noise[~mask]
       pixels = pixels.clip(min=0, max=255)
 
     else:
       raise ValueError("This image mode not supported")
 
-    # write out the new pixels
-    #from dbgp.client import brk; brk(port=9049)
-    newimage = Image.new(image.mode, image.size)
-
-    #newimage.putdata([uint(p) for p in pixels])
-    newimage.putdata(pixels.tolist())
-    newimage.putalpha(alpha)
-
-    # If generating dynamic noise, change our random state each time.
-    if self.dynamic:
-      self._randomState = numpy.random.get_state()
-
-    # Restore random state
-    numpy.random.set_state(saveState)
-
-    return newimage
+    return pixels.astype(numpy.uint8), alpha
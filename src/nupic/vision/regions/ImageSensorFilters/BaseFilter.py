@@ -21,6 +21,9 @@
 import sys
 import random
 
+import numpy
+from PIL import Image
+
 sys_maxint = sys.maxint
 
 def uint(i):
@@ -39,9 +42,149 @@ def uint(i):
     return i
 
 
+def imageToArrays(image):
+  """
+  Split an 'LA' image into a (pixels, alpha) tuple of 2D uint8 numpy arrays.
+
+  The arrays may be read-only; filters must not modify them in place.
+  """
+  pixels, alpha = image.split()
+  return numpy.asarray(pixels), numpy.asarray(alpha)
+
+
+def arraysToImage(pixels, alpha):
+  """
+  Merge (pixels, alpha) numpy arrays into an 'LA' image.
+
+  Pixels that are not uint8 (e.g. float32 responses) are clipped to [0, 255]
+  and truncated.
+  """
+  if pixels.dtype != numpy.uint8:
+    pixels = pixels.clip(0, 255).astype(numpy.uint8)
+  if alpha.dtype != numpy.uint8:
+    alpha = alpha.clip(0, 255).astype(numpy.uint8)
+  image = Image.fromarray(pixels)
+  image.putalpha(Image.fromarray(alpha))
+  return image
+
+
+class ScalePyramid(object):
+  """
+  Resized versions of a single image, shared by the multi-scale filters.
+
+  Each downsampled level is built from the smallest already-computed level
+  that covers it, rather than from the full-resolution image. Sizes that are
+  larger than the image in either dimension are resized from the image
+  itself. Use getScalePyramid() to obtain the pyramid for an image.
+  """
+
+  def __init__(self, image):
+    self.image = image
+    # {resample: {size: image}}
+    self._levels = {}
+
+  def resize(self, size, resample=Image.NEAREST):
+    """
+    Return the image resized to size (width, height) using resample.
+
+    Like Image.resize(), a new image is returned when size is the size of the
+    image, so that callers may modify it (e.g. its info dict) without
+    affecting the original.
+    """
+
+    size = tuple(size)
+    if size == self.image.size:
+      image = self.image.copy()
+      image.info.pop("scalePyramid", None)
+      return image
+
+    levels = self._levels.setdefault(resample, {})
+    if size not in levels:
+      width, height = self.image.size
+      if size[0] > width or size[1] > height:
+        levels[size] = self.image.resize(size, resample)
+      else:
+        # Start from the smallest computed level that covers the target
+        source = self.image
+        for levelSize, level in levels.iteritems():
+          if (size[0] <= levelSize[0] <= width and
+              size[1] <= levelSize[1] <= height and
+              levelSize[0] * levelSize[1] <
+              source.size[0] * source.size[1]):
+            source = level
+        levels[size] = source.resize(size, resample)
+      # Resizing copies the info dict; the level must not hold the pyramid
+      levels[size].info.pop("scalePyramid", None)
+    return levels[size]
+
+  def resizeAll(self, sizes, resample=Image.NEAREST):
+    """
+    Resize the image to each of sizes and return the images in that order.
+
+    The largest sizes are computed first so that every smaller size can be
+    built from the nearest larger level.
+    """
+
+    sizes = [tuple(size) for size in sizes]
+    levelSizes = set(sizes) - set([self.image.size])
+    for size in sorted(levelSizes, key=lambda s: s[0] * s[1], reverse=True):
+      self.resize(size, resample)
+    return [self.resize(size, resample) for size in sizes]
+
+  def resizeHighQuality(self, sizes):
+    """
+    Like resizeAll(), but antialias sizes that are smaller than the image and
+    use bicubic interpolation for the others.
+    """
+
+    sizes = [tuple(size) for size in sizes]
+    downsampled = [size < self.image.size for size in sizes]
+    antialiased = iter(self.resizeAll(
+        [size for size, d in zip(sizes, downsampled) if d], Image.ANTIALIAS))
+    bicubic = iter(self.resizeAll(
+        [size for size, d in zip(sizes, downsampled) if not d], Image.BICUBIC))
+    return [antialiased.next() if d else bicubic.next() for d in downsampled]
+
+
+def getScalePyramid(image):
+  """
+  Return the ScalePyramid for image, creating it if necessary.
+
+  The pyramid is cached in the image's info dict, so filters that scale the
+  same cached image (e.g. sibling filter positions) reuse its levels. The
+  levels are released along with the image, or by releaseScalePyramid() when
+  ImageSensor releases the filter outputs built from it. Copies of the image inherit the
+  info dict, so the cached pyramid is only used if it was built for this
+  image object.
+  """
+
+  pyramid = image.info.get("scalePyramid")
+  if pyramid is None or pyramid.image is not image:
+    pyramid = ScalePyramid(image)
+    image.info["scalePyramid"] = pyramid
+  return pyramid
+
+
+def releaseScalePyramid(image):
+  """
+  Drop the ScalePyramid cached on image, if any.
+
+  The levels are not counted against ImageSensor's memory limit, so
+  ImageSensor calls this when it releases the filter outputs that were built
+  from image. Outputs that are still held keep their own levels.
+  """
+
+  image.info.pop("scalePyramid", None)
+
+
 class BaseFilter(object):
   # Save the lookup on the sys.maxint because it will be called a LOT
 
+  # Set to True by filters that implement processArray(). ImageSensor then
+  # passes images to the filter, and between adjacent filters that both
+  # support it, as numpy arrays instead of PIL images.
+  supportsArrays = False
+
   def __init__(self, seed=None, reproducible=False):
     """
     seed -- Seed for the random number generator. A specific random number
@@ -77,6 +220,27 @@ class BaseFilter(object):
       # Seed the random instance with a hash of the image pixels
       self.random.seed(hash(image.tostring()))
 
+  def processArray(self, pixels, alpha):
+    """
+    Optional array-native version of process().
+
+    @param pixels -- 2D numpy array (height x width) of gray levels, either
+      uint8 or float32.
+    @param alpha -- 2D uint8 numpy array containing the mask.
+
+    Returns a (pixels, alpha) tuple, or a list containing one or more such
+    tuples, nested the same way as the images returned by process(). The
+    input arrays may be read-only and must not be modified in place.
+
+    Subclasses that override this method must set supportsArrays to True and
+    call it first, as process() does with BaseFilter.process().
+    """
+
+    if self.reproducible:
+      # Seed with the same bytes as image.tostring() for an 'LA' image
+      interleaved = numpy.dstack((pixels, alpha)).astype(numpy.uint8)
+      self.random.seed(hash(interleaved.tostring()))
+
   def getOutputCount(self):
     """
     Return the number of images returned by each call to process().
@@ -183,9 +183,7 @@ class BoxFixer(BaseFilter):
 
     imgbox = smotion.crop(expandedBox)
     #imgbox = smotion.crop(origBox)
-    w, h = imgbox.size
-    imgdata = numpy.array(imgbox.getdata())
-    imgdata.shape = (h, w)
+    imgdata = numpy.asarray(imgbox)
 
     # Create binary image indicating whether non-zero
     # S-Motion exists
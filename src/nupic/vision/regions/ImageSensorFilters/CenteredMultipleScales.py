@@ -25,7 +25,8 @@
 
 from PIL import Image
 
-from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter
+from nupic.vision.regions.ImageSensorFilters.BaseFilter import (
+  BaseFilter, getScalePyramid)
 
 
 class CenteredMultipleScales(BaseFilter):
@@ -64,12 +65,11 @@ class CenteredMultipleScales(BaseFilter):
     sizes = [(int(round(image.size[0]*s)), int(round(image.size[1]*s)))
       for s in self.scales]
 
+    # Smaller scales are built from larger ones
+    scaledImages = getScalePyramid(image).resizeHighQuality(sizes)
+
     resizedImages = []
-    for size in sizes:
-      if size < image.size:
-        resizedImage = image.resize(size,Image.ANTIALIAS)
-      else:
-        resizedImage = image.resize(size,Image.BICUBIC)
+    for size, resizedImage in zip(sizes, scaledImages):
       x = (originalSize[0] - size[0])/2
       y = (originalSize[1] - size[1])/2
       newImage = Image.new(mode,originalSize,self.background)
@@ -26,6 +26,7 @@ import os
 import ctypes
 import imp
 import platform
+from collections import OrderedDict
 
 import numpy
 from PIL import Image
@@ -35,6 +36,31 @@ from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter, uint
 # Global counter used for some debugging operations
 id = 0
 
+
+class _PreparedDims(object):
+  """Buffers, mask and pre-bound C arguments for one input size.
+
+  Instances are created by Convolution._prepare() and reused for every image
+  of the same size, so steady-state convolutions allocate no working memory
+  and do not re-wrap any numpy array with ctypes.
+  """
+
+  def __init__(self, outWidth, outHeight, inBuffer, outBuffer, mask,
+               inputVector, outputVector, bbox, imageBox, offImagePixelValue):
+    self.outWidth = outWidth
+    self.outHeight = outHeight
+    self.inBuffer = inBuffer
+    self.outBuffer = outBuffer
+    self.mask = mask
+    self.inputVector = inputVector
+    self.outputVector = outputVector
+    self.bbox = bbox
+    self.imageBox = imageBox
+    # ctypes.c_float updated in place before each call
+    self.offImagePixelValue = offImagePixelValue
+    self.args = None
+
+
 class Convolution(BaseFilter):
   """Base class for filters that perform a 2D convolution on the iamge
   """
@@ -68,6 +94,11 @@ class Convolution(BaseFilter):
   _integerMathShifts = 12     # 2^12 = 4096
   _integerMathScale  = 1 << _integerMathShifts
 
+  # Maximum number of distinct input sizes kept in the buffer pool. Filters
+  # such as Tracking, Resize(sizes=...) and BoxFixer produce variable-size
+  # images; the least recently used sizes are evicted beyond this limit.
+  _maxPoolSize = 32
+
   def __init__(self,
                scaleDecimation=[1],
                filterDim=9,
@@ -118,7 +149,8 @@ class Convolution(BaseFilter):
     self._filterBank = None
     self._outputPlaneCount = self._calcPlaneCount()
 
-    self._cache = {}
+    # Pool of _PreparedDims keyed by input dimensions, in LRU order
+    self._cache = OrderedDict()
     self._bbox_cache = {}
 
     # Load the _algorithms C library that contains the fast convolution code
@@ -164,7 +196,10 @@ class Convolution(BaseFilter):
       bbox = bbox.astype(int)
       images.append(self._processImage(resized_image, bbox))
 
-    raw_output = numpy.concatenate([x[1] for x in images])
+    if len(images) == 1:
+      raw_output = images[0][1]
+    else:
+      raw_output = numpy.concatenate([x[1] for x in images])
     images = [x[0] for x in images]
 
     return ([images], raw_output)
@@ -176,21 +211,15 @@ class Convolution(BaseFilter):
     """
     BaseFilter.process(self, image)
 
-    inWidth, inHeight = image.size
+    # Get output dims, buffers and bound C arguments (pooled)
+    prepared = self._prepare(image.size)
+    outWidth = prepared.outWidth
+    outHeight = prepared.outHeight
+    mask = prepared.mask
 
-    # Get output dims and buffers (cached)
-    outWidth, outHeight, inBuffer, outBuffer, mask = self._prepare(image.size)
-
-    # Ask the sub-class the build the filter bank
-    self._buildFilterBank()
-
-    inputOffset  = 0
-    outputOffset = 0
-
-    data = image.split()[0]
-    inputVector = numpy.asarray(data, dtype=numpy.float32)
-
-    inputVector.shape = (inHeight, inWidth)
+    # Copy the pixels into the pooled float32 input buffer
+    inputVector = prepared.inputVector
+    inputVector[:] = numpy.asarray(image.split()[0])
 
     # If we are using "color-key" mode, then detect the value of
     # the upper-left pixel and use it as the value of
@@ -199,24 +228,15 @@ class Convolution(BaseFilter):
       offImagePixelValue = inputVector[0, 0]
     else:
       offImagePixelValue = self._offImagePixelValue
+    prepared.offImagePixelValue.value = offImagePixelValue
 
-    result = []
-
-    # Compute the convolution responses
-
-    # Determine proper input/output dimensions
-    outputSize = outHeight * outWidth * self._outputPlaneCount
-
-    # Locate correct portion of output
-    outputVector = numpy.zeros((outHeight,
-                                outWidth,
-                                self._outputPlaneCount),
-                                dtype=numpy.float32)
-    outputVector.shape = (self._outputPlaneCount, outHeight, outWidth)
+    # The bounding box depends on the original image size and scale, so it
+    # is copied into the pooled buffer rather than bound once
+    prepared.bbox[:] = bbox
 
-
-    # Compute the bounding box to use for our C implementation
-    imageBox = numpy.array([0, 0, inWidth, inHeight], dtype=numpy.int32)
+    # Responses outside the bounding box are left untouched by the C code
+    outputVector = prepared.outputVector
+    outputVector.fill(0)
 
     ## --- DEBUG CODE ----
     #global id
@@ -229,21 +249,19 @@ class Convolution(BaseFilter):
     ## --- DEBUG CODE END ----
 
     # Call the fast convolution C code
-    self._convolve(inputVector,
-                   bbox,
-                   imageBox,
-                   outputVector,
-                   offImagePixelValue,
-                   inBuffer,
-                   outBuffer)
-
-    outputVector = numpy.rollaxis(outputVector, 0, 3)
-    outputVector = outputVector.reshape(outWidth * outHeight,
-                                        self._outputPlaneCount).flatten()
-    assert outputVector.dtype == numpy.float32
-
-    locationCount = len(outputVector) / self._outputPlaneCount
-    response = outputVector.reshape(locationCount, self._outputPlaneCount)
+    self._convolutionProc(*prepared.args)
+
+    # The C code writes the responses plane by plane, so each plane is a
+    # contiguous view of the pooled buffer
+    planes = outputVector.reshape(self._outputPlaneCount, outWidth * outHeight)
+    assert planes.dtype == numpy.float32
+
+    # The raw output interleaves the planes at each location. It is copied
+    # out of the pooled buffer in one pass, as the buffer is reused for the
+    # next image of the same size.
+    rawOutput = numpy.empty(planes.size, dtype=numpy.float32)
+    rawOutput.reshape(outWidth * outHeight, self._outputPlaneCount)[:] = \
+        planes.T
 
     ## --- DEBUG CODE ----
     #global id
@@ -258,15 +276,15 @@ class Convolution(BaseFilter):
 
     # Convert the reponses to images
     result = []
-    for i in range(response.shape[1]):
+    for i in range(planes.shape[0]):
       newImage = Image.new('L', (outWidth, outHeight))
-      #data = (self._gainConstant * 255.0 * response[:,i]).clip(min=0.0, max=255.0).astype(numpy.uint8)
-      data = (255.0 * response[:,i]).clip(min=0.0, max=255.0).astype(numpy.uint8)
+      #data = (self._gainConstant * 255.0 * planes[i]).clip(min=0.0, max=255.0).astype(numpy.uint8)
+      data = (255.0 * planes[i]).clip(min=0.0, max=255.0).astype(numpy.uint8)
       newImage.putdata([uint(p) for p in data])
       newImage.putalpha(mask)
       result.append(newImage)
 
-    return (result, outputVector)
+    return (result, rawOutput)
 
   #+=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=+
 
@@ -344,28 +362,57 @@ class Convolution(BaseFilter):
     output dims and the buffers
 
     @param inputDims: width and height of image
-    @return outWidth, outHeight, inBuffer, outBuffer
+    @return _PreparedDims holding the output dims, buffers, mask and the
+          ctypes argument tuple for the C convolution function
     """
 
-    # If already cached  just bail out
-    if not inputDims in self._cache:
+    # If already pooled, mark as most recently used and bail out
+    prepared = self._cache.pop(inputDims, None)
+    if prepared is None:
       # Compute output dims
       outputDims = self.getOutputDims(inputDims)
       outWidth, outHeight = outputDims
+      inWidth, inHeight = inputDims
 
       # Allocate working buffers to be used by the C implementation
-      #self._buffers = [numpy.zeros(inputDim, dtype=numpy.int32) for inputDim in inputDims]
       inBuffer, outBuffer = self._allocBuffers(inputDims, outputDims)
 
       # Prepare the mask
-      mask_box = (0, 0, outWidth, outHeight)
       mask = Image.new('L', outputDims, 255)
 
-
-
-      self._cache[inputDims] = (outWidth, outHeight, inBuffer, outBuffer, mask)
-
-    return self._cache[inputDims]
+      # Allocate the input, output and bounding box arrays that are
+      # refilled for each image
+      inputVector = numpy.zeros((inHeight, inWidth), dtype=numpy.float32)
+      outputVector = numpy.zeros((self._outputPlaneCount,
+                                  outHeight,
+                                  outWidth),
+                                 dtype=numpy.float32)
+      bbox = numpy.zeros(4, dtype=numpy.int32)
+      imageBox = numpy.array([0, 0, inWidth, inHeight], dtype=numpy.int32)
+
+      prepared = _PreparedDims(outWidth, outHeight, inBuffer, outBuffer, mask,
+                               inputVector, outputVector, bbox, imageBox,
+                               ctypes.c_float(0.0))
+
+      # Wrap the arrays once; the pool entry keeps them alive. The filter
+      # bank is built once and never replaced, so it can be bound as well.
+      if self._filterBank is None:
+        self._buildFilterBank()
+      prepared.args = self._makeConvolutionArgs(inputVector,
+                                                bbox,
+                                                imageBox,
+                                                outputVector,
+                                                prepared.offImagePixelValue,
+                                                inBuffer,
+                                                outBuffer)
+
+      # Evict the least recently used sizes
+      while len(self._cache) >= self._maxPoolSize:
+        self._cache.popitem(last=False)
+
+    self._cache[inputDims] = prepared
+
+    return prepared
 
   #+=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=+
 
@@ -502,6 +549,9 @@ class Convolution(BaseFilter):
     self._postProcLUT = postProcLUT
     self._postProcLutScalar = postProcScalar
 
+    # Pooled C arguments reference the previous LUT, so rebind them
+    self._cache.clear()
+
   #+=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=+
 
   def _allocBuffers(self, inputDims, outputDims):
@@ -645,35 +695,62 @@ class Convolution(BaseFilter):
       assert type(offImagePixelValue) in [type(0), type(0.0)]
       offImagePixelValue = self._offImagePixelValue
 
+    # Invoke C function
+    self._convolutionProc(*self._makeConvolutionArgs(
+        inputVector,
+        bbox,
+        imageBox,
+        outputVector,
+        ctypes.c_float(offImagePixelValue),
+        inBuffer,
+        outBuffer))
+
+  #+=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=+
+
+  def _makeConvolutionArgs(self,
+                           inputVector,
+                           bbox,
+                           imageBox,
+                           outputVector,
+                           offImagePixelValue,
+                           inBuffer,
+                           outBuffer):
+    """
+    Build the argument tuple for the C convolution function.
+
+    The numpy arrays are wrapped by reference, so the tuple stays valid
+    (and can be reused) for as long as the arrays themselves are alive
+    and are only modified in place.
+
+    @param offImagePixelValue: a ctypes.c_float
+    """
     # No alpha mask
     validAlpha = None
 
-    # Invoke C function
     #self._postProcLutScalar = 141.38911437988281
-    self._convolutionProc(
-              self._wrapArray(self._filterBank),
-              self._wrapArray(inputVector),
-              self._wrapArray(validAlpha),
-              self._wrapArray(bbox),
-              self._wrapArray(imageBox),
-              self._wrapArray(outputVector),
-              ctypes.c_float(self._gainConstant),
-              self._mapParamFromPythonToC('boundaryMode'),
-              ctypes.c_float(offImagePixelValue),
-              self._mapParamFromPythonToC('phaseMode'),
-              self._mapParamFromPythonToC('normalizationMethod'),
-              self._mapParamFromPythonToC('perPlaneNormalization'),
-              self._mapParamFromPythonToC('perPhaseNormalization'),
-              self._mapParamFromPythonToC('postProcessingMethod'),
-              ctypes.c_float(self._postProcessingSlope),
-              ctypes.c_float(self._postProcessingCenter),
-              ctypes.c_float(self._postProcessingMin),
-              ctypes.c_float(self._postProcessingMax),
-              self._wrapArray(inBuffer),
-              self._wrapArray(outBuffer),
-              self._wrapArray(self._postProcLUT),
-              ctypes.c_float(self._postProcLutScalar),
-              )
+    return (self._wrapArray(self._filterBank),
+            self._wrapArray(inputVector),
+            self._wrapArray(validAlpha),
+            self._wrapArray(bbox),
+            self._wrapArray(imageBox),
+            self._wrapArray(outputVector),
+            ctypes.c_float(self._gainConstant),
+            self._mapParamFromPythonToC('boundaryMode'),
+            offImagePixelValue,
+            self._mapParamFromPythonToC('phaseMode'),
+            self._mapParamFromPythonToC('normalizationMethod'),
+            self._mapParamFromPythonToC('perPlaneNormalization'),
+            self._mapParamFromPythonToC('perPhaseNormalization'),
+            self._mapParamFromPythonToC('postProcessingMethod'),
+            ctypes.c_float(self._postProcessingSlope),
+            ctypes.c_float(self._postProcessingCenter),
+            ctypes.c_float(self._postProcessingMin),
+            ctypes.c_float(self._postProcessingMax),
+            self._wrapArray(inBuffer),
+            self._wrapArray(outBuffer),
+            self._wrapArray(self._postProcLUT),
+            ctypes.c_float(self._postProcLutScalar),
+            )
 
   #+=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=++=+=+=+=+=+=+=+=+=+=+=+
 
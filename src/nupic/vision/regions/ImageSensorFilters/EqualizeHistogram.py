@@ -30,12 +30,39 @@ import numpy
 from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter, uint
 
 
+def _equalize(pixels):
+  """
+  Equalize a 2D uint8 array, using the same lookup table as ImageOps.equalize.
+  """
+  histogram = numpy.bincount(pixels.ravel(), minlength=256)
+  nonzero = numpy.flatnonzero(histogram)
+  if len(nonzero) == 0:
+    return pixels.copy()
+  step = (histogram.sum() - histogram[nonzero[-1]]) // 255
+  if not step:
+    return pixels.copy()
+  cumulative = numpy.concatenate(([0], numpy.cumsum(histogram)[:-1]))
+  lut = ((step // 2 + cumulative) // step).clip(max=255).astype(numpy.uint8)
+  return lut[pixels]
+
+
+def _composite(foreground, background, alpha):
+  """
+  Blend two 2D uint8 arrays through alpha, like Image.composite.
+  """
+  alpha = alpha.astype(numpy.int32)
+  blended = (foreground * alpha + background * (255 - alpha) + 127) // 255
+  return blended.astype(numpy.uint8)
+
+
 class EqualizeHistogram(BaseFilter):
 
   """
   Equalize the image's histogram.
   """
 
+  supportsArrays = True
+
   def __init__(self, region='all', mode=None):
     """
     @param region -- Options are 'all' (equalize the entire image), 'bbox'
@@ -100,3 +127,43 @@ class EqualizeHistogram(BaseFilter):
       image = ImageOps.equalize(image.split()[0])
       image.putalpha(alpha)
     return image
+
+  def processArray(self, pixels, alpha):
+    """
+    @param pixels -- 2D uint8 numpy array of gray levels.
+    @param alpha -- 2D uint8 numpy array containing the mask.
+
+    Returns a (pixels, alpha) tuple.
+    """
+
+    BaseFilter.processArray(self, pixels, alpha)
+
+    if self.mode != 'gray':
+      raise RuntimeError("EqualizeHistogram only supports grayscale images.")
+
+    pixels = pixels.astype(numpy.uint8)
+    if self.region == 'all':
+      return _equalize(pixels), alpha
+
+    # Find the bounding box of the mask
+    rows = numpy.flatnonzero(alpha.any(axis=1))
+    cols = numpy.flatnonzero(alpha.any(axis=0))
+    if not len(rows):
+      return pixels, alpha
+    window = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+    cropped = pixels[window]
+    croppedAlpha = alpha[window]
+
+    if self.region == 'bbox':
+      equalized = _equalize(cropped)
+    elif self.region == 'mask':
+      # Fill in the part of the cropped image outside the mask with
+      # uniformly-distributed noise
+      noise = numpy.random.randint(0, 255, cropped.shape).astype(numpy.uint8)
+      equalized = _equalize(_composite(cropped, noise, croppedAlpha))
+      # Keep the equalized pixels only within the mask
+      equalized = _composite(equalized, cropped, croppedAlpha)
+
+    pixels = pixels.copy()
+    pixels[window] = equalized
+    return pixels, alpha
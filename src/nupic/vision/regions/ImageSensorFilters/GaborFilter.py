@@ -57,6 +57,8 @@ class GaborFilter(BaseFilter):
   containing the Gabor responses.
   """
 
+  supportsArrays = True
+
   #+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+
   # Public API methods
   #+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+
@@ -271,28 +273,48 @@ class GaborFilter(BaseFilter):
     self._imageCounter += 1
     return [imageSet]
 
-  def processArray(self, origImageData):
+  def processArray(self, origImageData, alpha=None):
     """
     Perform Gabor filtering on the input array and return one or more
     response maps having dimension identical to the input image array.
 
     @param origImageData -- two-dimensional numpy array representing the image.
+    @param alpha -- Optional two-dimensional uint8 numpy array containing the
+      mask. If given, the responses are returned in the same form as the
+      images returned by process(), as (pixels, alpha) tuples.
 
     Returns a list containing the response maps. Each map is a 2D numpy array.
     """
 
+    if alpha is not None:
+      if self.mode != 'gray':
+        raise RuntimeError("GaborFilter only supports grayscale images.")
+      BaseFilter.processArray(self, origImageData, alpha)
 
     if self._debugMode:
       print 'GaborFilter: processArray()'
 
-    # Perform the actual Gabor filtering
-    responseSet = self._doProcessing(origImageData)
+    # Perform the actual Gabor filtering on a private copy, since
+    # _doProcessing scales the data in place
+    imageData = numpy.array(origImageData, dtype=dtype)
+    if alpha is not None and self._wipeOutsideMask:
+      maskData = numpy.asarray(alpha, dtype=dtype)
+    else:
+      maskData = None
+    responseSet = self._doProcessing(imageData, maskData)
 
     if self._debugMode:
       print 'Responses generated: %d' % len(responseSet)
 
     self._imageCounter += 1
-    return responseSet
+
+    if alpha is None:
+      return responseSet
+
+    # Scale the responses to gray levels, as _convertToPIL does
+    return [[((response * 255.0).clip(min=0, max=255.0).astype(numpy.uint8),
+              alpha)
+             for response in responseSet]]
 
 
   def getDefaultParamSet(self):
@@ -25,6 +25,9 @@ This file defines the LogPolar filter, an ImageSensor filter that distorts
 incoming images in a "fish-eye" manner.
 """
 
+import os
+from collections import OrderedDict
+
 from PIL import Image
 import numpy
 
@@ -37,7 +40,18 @@ class LogPolar(BaseFilter):
   Apply a LogPolar transformation to the original image
   """
 
-  def __init__(self, xsize, ysize, c, preserveCenterResolution=False, Debug=False):
+  supportsArrays = True
+
+  # Flattened gather indices shared by all LogPolar instances, keyed by
+  # (input size, xsize, ysize, c, preserveCenterResolution, Mirror) and kept
+  # in least recently used order
+  _kernelCache = OrderedDict()
+
+  # Maximum number of gather indices kept in _kernelCache
+  _maxKernelCacheSize = 16
+
+  def __init__(self, xsize, ysize, c, preserveCenterResolution=False, Debug=False,
+               kernelCacheDir=None):
     """
     Initializes the kernel matrices, a one-time cost, which are then applied to
     each image.
@@ -52,6 +66,9 @@ class LogPolar(BaseFilter):
                     outside corners at the original resolution.
     @param Debug -- Determines whether to compute and save some intermediate
                     data structures for debugging (deltaxmat, deltaymat, scales).
+    @param kernelCacheDir -- If set, directory in which the gather indices for
+                    each input size are saved, so that later runs load them
+                    instead of recomputing the kernel.
     """
 
     BaseFilter.__init__(self)
@@ -65,8 +82,7 @@ class LogPolar(BaseFilter):
     self._debug = Debug
     self._kernelx = None
     self._kernely = None
-    self._kernel = None
-    self._imgSize = (-1,-1)
+    self._kernelCacheDir = kernelCacheDir
 
   def process(self, image):
     """
@@ -79,16 +95,50 @@ class LogPolar(BaseFilter):
     BaseFilter.process(self, image)
     #image.save("logPolarDebugPostBase.png")
 
-    out = self._applyKernel(image, 0)
-    outImg = Image.fromarray(out.astype(numpy.int8))
+    # Transform the image and its mask with a single gather
+    pixels = numpy.asarray(image.split()[0])
+    alpha = numpy.asarray(image.split()[1])
+    out, maskOut = self.processArray(pixels, alpha)
+    outImg = Image.fromarray(out.astype(numpy.uint8))
     #outImg.save("logPolarDebug.png")
-    maskOut = self._applyKernel(image, 1)
-    maskOutImg = Image.fromarray(maskOut.astype(numpy.int8))
-    outImg.putalpha(maskOutImg)
+    outImg.putalpha(Image.fromarray(maskOut.astype(numpy.uint8)))
     #outImg.save("logPolarDebugMask.png")
     self._lastOutputImage = outImg
     return outImg
 
+  def processArray(self, pixels, alpha=None, Mirror=False):
+    """
+    Perform LogPolar filtering on numpy arrays using one gather.
+
+    @param pixels -- Array of shape (..., height, width). Leading axes may hold
+                     a batch of images, stacked (image, mask) planes, or both.
+    @param alpha  -- Optional mask of shape (height, width) or matching pixels.
+                     If given, it is transformed together with pixels and a
+                     tuple (pixels, alpha) is returned.
+    @param Mirror -- If the image is smaller than the output, whether to mirror
+                     the image (or to fill with the background)
+    """
+    pixels = numpy.asarray(pixels)
+    if alpha is not None:
+      alphaDType = numpy.asarray(alpha).dtype
+      alpha = numpy.broadcast_to(alpha, pixels.shape)
+      BaseFilter.processArray(self, pixels, alpha)
+      out = self.processArray(numpy.stack((pixels, alpha)), Mirror=Mirror)
+      return out[0], out[1].astype(alphaDType, copy=False)
+
+    height, width = pixels.shape[-2:]
+    kernel, matSize = self._getKernel((width, height), Mirror)
+
+    # Flatten each plane and add a sentinel pixel at the end which is set
+    # to the background color
+    leading = pixels.shape[:-2]
+    data = numpy.empty(leading + (width * height + 1,), dtype=pixels.dtype)
+    data[..., :-1] = pixels.reshape(leading + (width * height,))
+    data[..., -1] = self.background
+
+    # Map the output from the kernel
+    return data.take(kernel, axis=-1).reshape(leading + matSize)
+
   def _applyKernel(self, img, channel=0, Mirror=False):
     """
     The "guts" of the filter.  Takes an input PIL image and returns a numpy
@@ -101,53 +151,108 @@ class LogPolar(BaseFilter):
     @param Mirror  -- If the image is smaller than the output, whether to mirror
                        the image (or to fill with zeros)
     """
+    data = numpy.asarray(img.split()[channel])
+    return self.processArray(data, Mirror=Mirror)
 
+  def _getKernel(self, imgSize, Mirror=False):
+    """
+    Return the flattened gather indices and output shape for an input image
+    of size imgSize (width, height).
 
+    Indices are looked up in the shared LRU cache, then in kernelCacheDir,
+    and are only computed from the kernel matrices when both miss.
+    """
+    key = (tuple(imgSize), self._xsize, self._ysize, self._c, bool(self._pcr),
+           bool(Mirror))
+    cache = LogPolar._kernelCache
+
+    entry = cache.pop(key, None)
+    if entry is None:
+      entry = self._loadKernel(key)
+      if entry is None:
+        entry = self._computeKernel(imgSize, Mirror)
+        self._saveKernel(key, entry)
+      while len(cache) >= self._maxKernelCacheSize:
+        cache.popitem(last=False)
+    cache[key] = entry
+
+    return entry
+
+  def _computeKernel(self, imgSize, Mirror=False):
+    """
+    Compute the clipped, flattened kernel for an input image of size imgSize
+    (width, height), returned as (kernel, matSize).
+    """
     # Create the kernel if we haven't done so already
     if self._kernelx is None:
       self._makeKernel(self._xsize, self._ysize, self._c, Debug=self._debug, Save=False)
 
-    # Get the input image into a flattened array
-    data = numpy.array(img.split()[channel].getdata())
-
-    # Add a sentinel pixel at the end which is set to the background color
-    data = numpy.resize(data, data.size+1)
-    data[-1] = self.background
-
-    # See if we need to re-compute our clipped, flattened kernel, which depends on the
-    #  image size
-    if img.size != self._imgSize:
-      # Convert our kernel matrix center to the center of the input image, and mark indicies
-      #  that are outside the bounds of the input image with a sentinel
-      sentinel = -1 * img.size[0] * img.size[1]
-      kxBig = self._ceilFoor(self._kernelx, img.size[1], None, Mirror).astype('int')
-      kyBig = self._ceilFoor(self._kernely, img.size[0], None, Mirror).astype('int')
-
-      # When preserving the resolution at the edges, we make the output image size the
-      #  same as the input image size. So, when the input image size is smaller than our
-      #  kernel, we have to clip the outside edges of our kernel
-      if not self._pcr:
-        kx = self._cropMatCenter(kxBig, (img.size[1],img.size[0]))
-        ky = self._cropMatCenter(kyBig, (img.size[1],img.size[0]))
-        matSize = (img.size[1],img.size[0])
-      else:
-        kx = kxBig
-        ky = kyBig
-        matSize = (self._ysize, self._xsize)
+    # Convert our kernel matrix center to the center of the input image, and mark indicies
+    #  that are outside the bounds of the input image with a sentinel
+    kxBig = self._ceilFoor(self._kernelx, imgSize[1], None, Mirror).astype('int')
+    kyBig = self._ceilFoor(self._kernely, imgSize[0], None, Mirror).astype('int')
+
+    # When preserving the resolution at the edges, we make the output image size the
+    #  same as the input image size. So, when the input image size is smaller than our
+    #  kernel, we have to clip the outside edges of our kernel
+    if not self._pcr:
+      kx = self._cropMatCenter(kxBig, (imgSize[1],imgSize[0]))
+      ky = self._cropMatCenter(kyBig, (imgSize[1],imgSize[0]))
+      matSize = (imgSize[1],imgSize[0])
+    else:
+      kx = kxBig
+      ky = kyBig
+      matSize = (self._ysize, self._xsize)
 
-      # Convert our kernel to indices into the flattened array of the input image.
-      kernel = (kx + ky*img.size[0]).flatten()
+    # Convert our kernel to indices into the flattened array of the input image.
+    kernel = (kx + ky*imgSize[0]).flatten().astype(numpy.intp)
 
-      # Convert all negative indices (sentinels) to reference the last element of the data
-      kernel[kernel < 0] = -1
-      self._kernel = kernel
-      self._imgSize = img.size
-      self._matSize = matSize
+    # Convert all negative indices (sentinels) to reference the last element of the data
+    kernel[kernel < 0] = -1
 
-    # Map the output from the kernel
-    output = data[self._kernel].reshape(self._matSize)
-    return output
+    return kernel, matSize
 
+  def _kernelCachePath(self, key):
+    """
+    Return the kernelCacheDir file name for a _kernelCache key.
+    """
+    (width, height), xsize, ysize, c, pcr, mirror = key
+    name = "logPolar_%dx%d_%dx%d_c%r_pcr%d_mirror%d.npy" % (
+        width, height, xsize, ysize, float(c), pcr, mirror)
+    return os.path.join(self._kernelCacheDir, name)
+
+  def _loadKernel(self, key):
+    """
+    Load gather indices saved by _saveKernel, or return None.
+    """
+    if self._kernelCacheDir is None:
+      return None
+    path = self._kernelCachePath(key)
+    if not os.path.exists(path):
+      return None
+
+    kernel = numpy.load(path)
+    if self._pcr:
+      matSize = (self._ysize, self._xsize)
+    else:
+      matSize = (key[0][1], key[0][0])
+    return kernel, matSize
+
+  def _saveKernel(self, key, entry):
+    """
+    Save gather indices to kernelCacheDir, if set.
+    """
+    if self._kernelCacheDir is None:
+      return
+    if not os.path.exists(self._kernelCacheDir):
+      os.makedirs(self._kernelCacheDir)
+
+    # Write to a temporary file first so readers never see a partial file
+    path = self._kernelCachePath(key)
+    tmpPath = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmpPath, "wb") as f:
+      numpy.save(f, entry[0])
+    os.rename(tmpPath, path)
 
   def _ceilFoor(self, mat, width, sentinel, Mirror=False):
     """
@@ -23,9 +23,8 @@
 ## @file
 """
 
-from PIL import Image
-
-from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter
+from nupic.vision.regions.ImageSensorFilters.BaseFilter import (
+  BaseFilter, getScalePyramid)
 
 
 class MultipleScales(BaseFilter):
@@ -61,12 +60,8 @@ class MultipleScales(BaseFilter):
     sizes = [(int(round(image.size[0]*s)), int(round(image.size[1]*s)))
       for s in self.scales]
 
-    resizedImages = []
-    for size in sizes:
-      if size < image.size:
-        resizedImages.append(image.resize(size,Image.ANTIALIAS))
-      else:
-        resizedImages.append(image.resize(size,Image.BICUBIC))
+    # Smaller scales are built from larger ones
+    resizedImages = getScalePyramid(image).resizeHighQuality(sizes)
 
     if not self.simultaneous:
       return resizedImages
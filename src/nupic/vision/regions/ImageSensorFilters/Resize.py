@@ -21,7 +21,8 @@
 
 from PIL import Image
 
-from nupic.vision.regions.ImageSensorFilters.BaseFilter import BaseFilter
+from nupic.vision.regions.ImageSensorFilters.BaseFilter import (
+  BaseFilter, getScalePyramid)
 
 
 class Resize(BaseFilter):
@@ -126,24 +127,19 @@ class Resize(BaseFilter):
       else:
         sizes.append((int(size[0]), int(size[1])))
 
+    # Work out the scaled size for each target size, then resize the image
+    # to all of them at once so that smaller scales are built from larger ones
+    scaledSizes = [self._getScaledSize(image.size, size) for size in sizes]
+    scaledImages = iter(self._resizeAll(image,
+                                        [s for s in scaledSizes if s]))
+
     newImages = []
-    for size in sizes:
+    for size, scaledSize in zip(sizes, scaledSizes):
       if image.size == size:
         newImage = image
 
       elif self.method == 'fit':
-        # Resize the image to fit in the target size, preserving aspect ratio
-        targetRatio = size[0] / float(size[1])
-        imageRatio = image.size[0] / float(image.size[1])
-        if imageRatio > targetRatio:
-          xSize = size[0]
-          scale = size[0] / float(image.size[0])
-          ySize = int(scale * image.size[1])
-        else:
-          ySize = size[1]
-          scale = size[1] / float(image.size[1])
-          xSize = int(scale * image.size[0])
-        newImage = self._resize(image, (xSize, ySize))
+        newImage = scaledImages.next()
         # Pad with the background color if necessary
         if newImage.size != size:
           paddedImage = Image.new('LA', size, self.background)
@@ -153,29 +149,16 @@ class Resize(BaseFilter):
           newImage = paddedImage
 
       elif self.method == 'crop':
-        # Resize the image to fill the new size
-        targetRatio = size[0] / float(size[1])
-        imageRatio = image.size[0] / float(image.size[1])
-        if imageRatio > targetRatio:
-          # Original image is too wide
-          scale = size[1] / float(image.size[1])
-          newSize = (int(scale * image.size[0]), size[1])
-          cropStart = ((newSize[0] - size[0]) / 2, 0)
-        else:
-          # Original image is too tall
-          scale = size[0] / float(image.size[0])
-          newSize = (size[0], int(scale * image.size[1]))
-          cropStart = (0, (newSize[1] - size[1]) / 2)
-
-        newImage = self._resize(image, newSize)
+        newImage = scaledImages.next()
         # Crop if necessary
-        if newSize != size:
+        if scaledSize != size:
+          cropStart = ((scaledSize[0] - size[0]) / 2,
+                       (scaledSize[1] - size[1]) / 2)
           newImage = newImage.crop((cropStart[0], cropStart[1],
             cropStart[0] + size[0], cropStart[1] + size[1]))
 
       elif self.method == 'stretch':
-        # Resize the image to each target size, ignoring aspect ratio
-        newImage = self._resize(image, size)
+        newImage = scaledImages.next()
 
       elif self.method == 'center':
         # Center the original image in the new image without rescaling it
@@ -207,15 +190,50 @@ class Resize(BaseFilter):
     else:
       return 1, len(self.sizes)
 
-  def _resize(self, image, size):
+  def _getScaledSize(self, imageSize, size):
     """
-    Resize the image with the appropriate sampling method.
+    Return the size to which the image is scaled before it is padded or
+    cropped to the target size, or None if it is not scaled.
     """
 
-    if self.highQuality:
-      if size < image.size:
-        return image.resize(size, Image.ANTIALIAS)
+    if imageSize == size or self.method == 'center':
+      return None
+
+    elif self.method == 'fit':
+      # Resize the image to fit in the target size, preserving aspect ratio
+      targetRatio = size[0] / float(size[1])
+      imageRatio = imageSize[0] / float(imageSize[1])
+      if imageRatio > targetRatio:
+        scale = size[0] / float(imageSize[0])
+        return (size[0], int(scale * imageSize[1]))
       else:
-        return image.resize(size, Image.BICUBIC)
+        scale = size[1] / float(imageSize[1])
+        return (int(scale * imageSize[0]), size[1])
+
+    elif self.method == 'crop':
+      # Resize the image to fill the new size
+      targetRatio = size[0] / float(size[1])
+      imageRatio = imageSize[0] / float(imageSize[1])
+      if imageRatio > targetRatio:
+        # Original image is too wide
+        scale = size[1] / float(imageSize[1])
+        return (int(scale * imageSize[0]), size[1])
+      else:
+        # Original image is too tall
+        scale = size[0] / float(imageSize[0])
+        return (size[0], int(scale * imageSize[1]))
+
+    elif self.method == 'stretch':
+      # Resize the image to each target size, ignoring aspect ratio
+      return size
+
+  def _resizeAll(self, image, sizes):
+    """
+    Resize the image to each of sizes with the appropriate sampling method.
+    """
+
+    pyramid = getScalePyramid(image)
+    if self.highQuality:
+      return pyramid.resizeHighQuality(sizes)
     else:
-      return image.resize(size)
+      return pyramid.resizeAll(sizes)
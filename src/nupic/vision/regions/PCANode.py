@@ -22,9 +22,11 @@
 
 """PCANode implements PCA."""
 
+import os
+
 import numpy
 
-from nupic.bindings.regions.PyRegion import PyRegion
+from nupic.bindings.regions.PyRegion import PyRegion, RealNumpyDType
 
 
 
@@ -33,13 +35,26 @@ class PCANode(PyRegion):
   PCANode implements PCA.
   """
 
+  # Number of samples whose outer products are summed at once when the raw
+  # samples are not stored, and the batch size of the incremental SVD
+  _covarianceBatchSize = 256
+
+  # Extra dimensions sampled by the randomized SVD range finder
+  _randomizedOversampling = 10
+
+  # Size in bytes of the buffer used to write the log file
+  _logBufferSize = 1 << 16
+
   def __init__(self,
                SVDSampleCount=-1,
                SVDDimCount=-1,
                fractionOfMax=0.0,
                keepSamples=False,  # Keep the original inputs around
                logPath='',
-               bottomUpCount=None):
+               bottomUpCount=None,
+               storeSamples=True,
+               SVDMethod='full',
+               SVDPowerIterations=2):
 
     self._testInputs = None
 
@@ -53,6 +68,15 @@ class PCANode(PyRegion):
     self._logPath = logPath
 
     self.keepSamples = 1 if keepSamples else 0
+    self.storeSamples = 1 if storeSamples else 0
+
+    if SVDMethod not in ('full', 'randomized', 'incremental'):
+      raise ValueError("Unknown SVDMethod '%s' (options are 'full', "
+                       "'randomized' and 'incremental')" % SVDMethod)
+    if SVDMethod == 'randomized' and not storeSamples:
+      raise ValueError("SVDMethod 'randomized' requires storeSamples")
+    self.SVDMethod = SVDMethod
+    self.SVDPowerIterations = SVDPowerIterations
 
     self.clear()
 
@@ -63,11 +87,13 @@ class PCANode(PyRegion):
     self._inferenceMode = False
     self._inputWidth = None
     self._samples = None
+    self._numSamples = 0
     self._labels  = None
     self._partitionIds = None
     self._upcomingPartitionIds = None
 
     # Logging
+    self._closeLog()
     self._logFileCreated = False
 
     # PCA
@@ -76,6 +102,19 @@ class PCANode(PyRegion):
     self._vt = None
     self._mean = None
 
+    # Running sums of the samples and of their outer products, used for the
+    # mean and covariance
+    self._sampleSum = None
+    self._outerSum = None
+    self._pendingSamples = None
+    self._numPendingSamples = 0
+
+    # Incremental SVD of the samples seen so far
+    self._incrementalS = None
+    self._incrementalVt = None
+    self._incrementalMean = None
+    self._incrementalCount = 0
+
   def _setInferenceMode(self, value):
     value = bool(int(value))
     self._inferenceMode == value
@@ -141,16 +180,16 @@ class PCANode(PyRegion):
     # Perform PCA if it is time to do so
     if self._vt is None and self._SVDDimCount != -1 \
         and self._SVDSampleCount != -1 \
-        and self._samples.shape[0] == self._SVDSampleCount:
+        and self._numSamples == self._SVDSampleCount:
       self.computeSVD()
 
-    # Project the vector onto the PCA basis if present
-    if self._vt is not None:
+    if self._vt is None:
+      # Still collecting samples for the SVD
+      self._addSample(inputVector)
+    else:
+      # Project the vector onto the PCA basis. Projected vectors are not
+      # stored, so memory does not grow during inference.
       inputVector = numpy.dot(self._vt, inputVector - self._mean)
-
-    self._samples = numpy.concatenate((self._samples, numpy.atleast_2d(inputVector)),axis=0)
-
-    if self._vt is not None:
       allOutputs = outputs
       allOutputs.fill(0)
       allOutputs[:len(inputVector)] = inputVector
@@ -161,26 +200,48 @@ class PCANode(PyRegion):
     self._testInputs = None
 
 
+  def projectBatch(self, matrix):
+    """
+    Project each row of matrix onto the PCA basis and return the projections
+    as the rows of a new matrix. Used for offline feature extraction; nothing
+    is stored or logged.
+    """
+    if self._vt is None:
+      raise RuntimeError("The SVD has not been computed yet")
+    matrix = numpy.atleast_2d(numpy.asarray(matrix, dtype=RealNumpyDType))
+    return numpy.dot(matrix - self._mean, self._vt.T)
+
+
   def _doLogging(self, pcaCoeffs):
     """
-    Log output coefficients to a .CSV file
+    Log output coefficients to a .CSV file. The file is kept open and
+    written through a buffer; it is flushed and closed by _closeLog.
     """
     if self._logPath:
-      if not hasattr(self, '_logFileCreated') or not self._logFileCreated:
-        logDir = os.path.split(self._logPath)[0]
-        if not os.path.exists(logDir):
-          print "Creating logging directory: %s" % logDir
-          os.makedirs(logDir)
-        fpOut = open(self._logPath, 'w')
-        # Write initial line containing correct length
-        # of coefficient vector
-        print >>fpOut, '%d' % len(pcaCoeffs)
-        fpOut.close()
-        self._logFileCreated = True
+      if self._logFile is None:
+        if not self._logFileCreated:
+          logDir = os.path.split(self._logPath)[0]
+          if logDir and not os.path.exists(logDir):
+            print "Creating logging directory: %s" % logDir
+            os.makedirs(logDir)
+          self._logFile = open(self._logPath, 'w', self._logBufferSize)
+          # Write initial line containing correct length
+          # of coefficient vector
+          print >>self._logFile, '%d' % len(pcaCoeffs)
+          self._logFileCreated = True
+        else:
+          self._logFile = open(self._logPath, 'a', self._logBufferSize)
       output = ",".join([str(x) for x in pcaCoeffs.tolist()])
-      fpOut = open(self._logPath, 'a')
-      print >>fpOut, output
-      fpOut.close()
+      print >>self._logFile, output
+
+
+  def _closeLog(self):
+    """
+    Flush and close the log file if it is open.
+    """
+    if getattr(self, '_logFile', None) is not None:
+      self._logFile.close()
+    self._logFile = None
 
 
   @classmethod
@@ -269,6 +330,41 @@ class PCANode(PyRegion):
           defaultValue=0,
           accessMode='ReadWrite'),
 
+        storeSamples=dict(
+          description="""If 0, the input samples are not stored. The SVD is
+                        then computed from the running mean and covariance
+                        of all the samples, which is enough when only the
+                        projection basis is needed.""",
+          dataType='UInt32',
+          count=1,
+          constraints='bool',
+          defaultValue=1,
+          accessMode='Read'),
+
+        SVDMethod=dict(
+          description="""How the SVD is computed: 'full' (exact SVD of the
+                        samples), 'randomized' (truncated SVD of the samples
+                        using a randomized range finder) or 'incremental'
+                        (truncated SVD updated with each batch of samples
+                        during learning). The truncated methods keep
+                        SVDDimCount dimensions, or all of them when
+                        SVDDimCount is -1.""",
+          dataType='Byte',
+          count=0,
+          constraints='string',
+          defaultValue='full',
+          accessMode='Read'),
+
+        SVDPowerIterations=dict(
+          description="""Number of power iterations used by the randomized
+                        SVD. More iterations are more accurate when the
+                        singular values decay slowly.""",
+          dataType='UInt32',
+          count=1,
+          constraints='',
+          defaultValue=2,
+          accessMode='ReadWrite'),
+
         trainingSampleCount=dict(
           description="""the current number of training samples.""",
           dataType='UInt32',
@@ -319,17 +415,15 @@ class PCANode(PyRegion):
     if name == "SVDSampleCount":
       self._SVDSampleCount = value
     elif name == "logPath":
+      self._closeLog()
+      self._logFileCreated = False
       self._logPath = value
     else:
       PyRegion.setParameter(self, name, index, value)
 
 
   def gettrainingSampleCount(self):
-    if self._samples is None:
-      numSamples = 0
-    else:
-      numSamples = self._samples.shape[0]
-    return numSamples
+    return self._numSamples
 
 
   def __setstate__(self, state):
@@ -341,6 +435,7 @@ class PCANode(PyRegion):
     # saved networks in which these attributes were
     # not defined.
     self._testInputs = None
+    self._logFile = None
     if not hasattr(self, "_vt"):
       self._vt = None
     if not hasattr(self, 'keepSamples'):
@@ -351,6 +446,23 @@ class PCANode(PyRegion):
       self._adaptiveSVDDims = False
     if not hasattr(self, "_fractionOfMax"):
       self._fractionOfMax = 0.0
+    if not hasattr(self, "_numSamples"):
+      # Saved before the sample buffer, when _samples held exactly the samples
+      self.storeSamples = 1
+      self._numSamples = 0 if self._samples is None else self._samples.shape[0]
+      self._sampleSum = None
+      if self._samples is not None and self._vt is None:
+        self._sampleSum = self._samples.sum(axis=0, dtype=numpy.float64)
+      self._outerSum = None
+      self._pendingSamples = None
+      self._numPendingSamples = 0
+    if not hasattr(self, "SVDMethod"):
+      self.SVDMethod = 'full'
+      self.SVDPowerIterations = 2
+      self._incrementalS = None
+      self._incrementalVt = None
+      self._incrementalMean = None
+      self._incrementalCount = 0
 
 
   def __getstate__(self):
@@ -360,6 +472,8 @@ class PCANode(PyRegion):
     are defined as those that do not need to be (nor should be) stored
     in any kind of persistent file (e.g., NuPIC network XML file.)
     """
+    if self._logFile is not None:
+      self._logFile.flush()
     state = self.__dict__.copy()
     for ephemeralMemberName in [x for x in self._getEphemeralMembers() if x in state]:
       del state[ephemeralMemberName]
@@ -370,7 +484,7 @@ class PCANode(PyRegion):
     """
     Returns list of all ephemeral class members.
     """
-    return []
+    return ['_logFile']
 
 
   def _initDataStructures(self, inputWidth):
@@ -378,18 +492,165 @@ class PCANode(PyRegion):
     Initialize internal data structures.
     """
     self._inputWidth = inputWidth
-    self._samples = numpy.zeros((0, self._inputWidth), dtype=RealNumpyDType)
+    # Preallocate room for the samples that will be used for the SVD
+    capacity = 0
+    if self.storeSamples and self._SVDSampleCount > 0:
+      capacity = self._SVDSampleCount
+    self._samples = numpy.zeros((capacity, self._inputWidth),
+                                dtype=RealNumpyDType)
+    self._numSamples = 0
+    self._sampleSum = numpy.zeros(self._inputWidth, dtype=numpy.float64)
+    if self.SVDMethod == 'incremental' or not self.storeSamples:
+      if self.SVDMethod != 'incremental':
+        self._outerSum = numpy.zeros((self._inputWidth, self._inputWidth),
+                                     dtype=numpy.float64)
+      self._pendingSamples = numpy.zeros(
+          (self._covarianceBatchSize, self._inputWidth), dtype=numpy.float64)
+      self._numPendingSamples = 0
+
+
+  def _addSample(self, inputVector):
+    """
+    Add a sample to the buffer, doubling its capacity when it is full, and
+    update the running sums until the SVD has been computed.
+    """
+    if self._vt is None:
+      self._sampleSum += inputVector
+      if self._pendingSamples is not None:
+        self._pendingSamples[self._numPendingSamples] = inputVector
+        self._numPendingSamples += 1
+        if self._numPendingSamples == self._covarianceBatchSize:
+          self._processPendingSamples()
+
+    if self.storeSamples:
+      if self._numSamples == self._samples.shape[0]:
+        capacity = max(2 * self._samples.shape[0], 16)
+        samples = numpy.zeros((capacity, self._samples.shape[1]),
+                              dtype=self._samples.dtype)
+        samples[:self._numSamples] = self._samples[:self._numSamples]
+        self._samples = samples
+      self._samples[self._numSamples] = inputVector
+    self._numSamples += 1
+
+
+  def _processPendingSamples(self):
+    """
+    Add the pending samples to the incremental SVD, or add their outer
+    products to the running sum.
+    """
+    pending = self._pendingSamples[:self._numPendingSamples]
+    if self.SVDMethod == 'incremental':
+      self._updateIncrementalSVD(pending)
+    else:
+      self._outerSum += numpy.dot(pending.T, pending)
+    self._numPendingSamples = 0
+
+
+  def _getTruncatedDimCount(self, numSamples):
+    """
+    Number of dimensions kept by the truncated SVD methods.
+    """
+    maxDims = min(numSamples, self._inputWidth)
+    if self._adaptiveSVDDims or self._SVDDimCount <= 0:
+      return maxDims
+    return min(self._SVDDimCount, maxDims)
+
+
+  def _updateIncrementalSVD(self, batch):
+    """
+    Update the truncated SVD of all the samples seen so far with a batch of
+    samples, correcting for the shift of the mean.
+    """
+    if not len(batch):
+      return
+    batchMean = batch.mean(axis=0)
+    count = self._incrementalCount + len(batch)
+    if self._incrementalCount == 0:
+      matrix = batch - batchMean
+      mean = batchMean
+    else:
+      meanCorrection = (numpy.sqrt(self._incrementalCount * len(batch) /
+                                   float(count)) *
+                        (self._incrementalMean - batchMean))
+      matrix = numpy.vstack((self._incrementalS[:, numpy.newaxis] *
+                             self._incrementalVt,
+                             batch - batchMean,
+                             meanCorrection))
+      mean = self._incrementalMean + (len(batch) / float(count) *
+                                      (batchMean - self._incrementalMean))
+    u, s, vt = numpy.linalg.svd(matrix, full_matrices=False)
+    numDims = self._getTruncatedDimCount(count)
+    self._incrementalS = s[:numDims]
+    self._incrementalVt = vt[:numDims]
+    self._incrementalMean = mean
+    self._incrementalCount = count
+
+
+  def _randomizedSVD(self, samples):
+    """
+    Truncated SVD of the (centered) samples: finds an orthonormal basis for
+    the range of the samples from random projections refined with power
+    iterations, then takes the exact SVD of the samples in that basis.
+    """
+    numDims = self._getTruncatedDimCount(samples.shape[0])
+    numProjections = min(numDims + self._randomizedOversampling,
+                         samples.shape[0], samples.shape[1])
+    rng = numpy.random.RandomState(0)
+    q = numpy.dot(samples, rng.normal(size=(samples.shape[1],
+                                            numProjections)))
+    q = numpy.linalg.qr(q)[0]
+    for _ in xrange(self.SVDPowerIterations):
+      z = numpy.linalg.qr(numpy.dot(samples.T, q))[0]
+      q = numpy.linalg.qr(numpy.dot(samples, z))[0]
+    u, s, vt = numpy.linalg.svd(numpy.dot(q.T, samples), full_matrices=False)
+    return s[:numDims], vt[:numDims]
 
 
   def computeSVD(self, SVDSampleCount=None, finalize=True):
 
+    self._mean = (self._sampleSum / self._numSamples).astype(RealNumpyDType)
+
+    if self.SVDMethod == 'incremental':
+      self._processPendingSamples()
+      self._pendingSamples = None
+      self._s = self._incrementalS
+      self._vt = self._incrementalVt.astype(RealNumpyDType)
+      self._incrementalVt = None
+      if self.storeSamples:
+        # Center the samples so that finalizeSVD can project them
+        self._samples[:self._numSamples] -= self._mean
+      if finalize:
+        self.finalizeSVD()
+      return self._s
+
+    if not self.storeSamples:
+      # Get the singular values and right singular vectors of the centered
+      # samples from the eigendecomposition of their covariance
+      self._processPendingSamples()
+      covariance = (self._outerSum -
+                    self._numSamples * numpy.outer(self._mean, self._mean))
+      eigenvalues, eigenvectors = numpy.linalg.eigh(covariance)
+      self._s = numpy.sqrt(eigenvalues[::-1].clip(min=0))
+      self._vt = eigenvectors[:, ::-1].T.astype(RealNumpyDType)
+      self._outerSum = None
+      self._pendingSamples = None
+      if finalize:
+        self.finalizeSVD()
+      return self._s
+
     # Samples are in self._samples, not in the SVM yet
     if SVDSampleCount is None:
-      SVDSampleCount = self._samples.shape[0]
+      SVDSampleCount = self._numSamples
 
-    self._mean = numpy.mean(self._samples, axis=0)
-    self._samples -= self._mean
-    u, self._s, self._vt = numpy.linalg.svd(self._samples[:SVDSampleCount,:])
+    samples = self._samples[:self._numSamples]
+    samples -= self._mean
+    if self.SVDMethod == 'randomized':
+      self._s, vt = self._randomizedSVD(samples[:SVDSampleCount,:])
+      self._vt = vt.astype(RealNumpyDType)
+    else:
+      # Only the right singular vectors are needed, so skip the full u
+      u, self._s, self._vt = numpy.linalg.svd(samples[:SVDSampleCount,:],
+                                              full_matrices=False)
     if finalize:
       self.finalizeSVD()
     return self._s
@@ -421,7 +682,8 @@ class PCANode(PyRegion):
     self._vt = self._vt[:self._SVDDimCount]
 
     # Project all the vectors (mean has already been subtracted from each one)
-    self._samples = numpy.dot(self._samples, self._vt.T)
+    if self.storeSamples:
+      self._samples = numpy.dot(self._samples[:self._numSamples], self._vt.T)
 
 
   def getOutputElementCount(self, name):
@@ -844,6 +844,37 @@ class SaccadeSensor(PyRegion):
     self.explorer[2].seek(iteration=iteration, position=position)
 
 
+  def getExplorerState(self):
+    """
+    Return the state of the explorer and of the sensor's iteration counters,
+    such that setExplorerState() continues from the current position.
+
+    Together with the saved network, this allows a checkpointed run to resume
+    exactly where it stopped. The images themselves are not included.
+    """
+
+    return {"explorer": self.explorer[0],
+            "explorerState": self.explorer[2].getState(),
+            "iteration": self._iteration,
+            "holdForOffset": self._holdForOffset,
+            "prevPosition": copy.deepcopy(self.prevPosition)}
+
+
+  def setExplorerState(self, state):
+    """
+    Restore a state returned by getExplorerState(). The same explorer must be
+    set and the same images loaded.
+    """
+
+    if state["explorer"] != self.explorer[0]:
+      raise RuntimeError("Explorer state is for '%s', but the explorer is '%s'"
+                         % (state["explorer"], self.explorer[0]))
+    self.explorer[2].setState(state["explorerState"])
+    self._iteration = state["iteration"] #pylint: disable=W0201
+    self._holdForOffset = state["holdForOffset"] #pylint: disable=W0201
+    self.prevPosition = copy.deepcopy(state["prevPosition"]) #pylint: disable=W0201
+
+
   def getNumIterations(self, image=None):
     """
     Calculate how many samples the explorer will provide.
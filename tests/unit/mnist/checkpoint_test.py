@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2014, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+import unittest2 as unittest
+import os
+import random
+import shutil
+import tempfile
+
+import numpy
+
+from nupic.vision.mnist.checkpoint import Checkpointer
+
+
+
+class FakeNetwork(object):
+  """
+  Stands in for a Network, only writes a marker file when saved.
+  """
+
+
+  def __init__(self, name):
+    self.name = name
+
+
+  def save(self, path):
+    with open(path, "w") as f:
+      f.write(self.name)
+
+
+
+class FailingNetwork(object):
+
+
+  def save(self, path):
+    raise IOError("Disk full")
+
+
+
+class CheckpointerTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.checkpointDir = os.path.join(self.tmpDir, "checkpoints")
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def _listCheckpoints(self):
+    return sorted(name for name in os.listdir(self.checkpointDir)
+                  if name.startswith("checkpoint_"))
+
+
+  def testLoadEmpty(self):
+    checkpointer = Checkpointer(self.checkpointDir)
+    self.assertTrue(os.path.isdir(self.checkpointDir))
+    self.assertIsNone(checkpointer.load())
+
+
+  def testSave(self):
+    checkpointer = Checkpointer(self.checkpointDir)
+    checkpointer.save(FakeNetwork("first"), {"imageIndex": 10})
+    first = self._listCheckpoints()
+    self.assertEqual(len(first), 1)
+    self.assertEqual(checkpointer._getLatestName(), first[0])
+
+    checkpointer.save(FakeNetwork("second"), {"imageIndex": 20})
+    second = self._listCheckpoints()
+    self.assertEqual(len(second), 1)
+    self.assertNotEqual(second, first)
+    self.assertEqual(checkpointer._getLatestName(), second[0])
+
+    networkPath, state = Checkpointer(self.checkpointDir).load()
+    self.assertEqual(networkPath, os.path.join(self.checkpointDir, second[0],
+                                               "network.nta"))
+    with open(networkPath) as f:
+      self.assertEqual(f.read(), "second")
+    self.assertEqual(state, {"imageIndex": 20})
+
+
+  def testFailedSave(self):
+    checkpointer = Checkpointer(self.checkpointDir)
+    checkpointer.save(FakeNetwork("first"), {"imageIndex": 10})
+    names = os.listdir(self.checkpointDir)
+
+    self.assertRaises(IOError, checkpointer.save, FailingNetwork(), {})
+    # The previous checkpoint is still the latest, and nothing is left over
+    self.assertEqual(os.listdir(self.checkpointDir), names)
+    _, state = checkpointer.load()
+    self.assertEqual(state, {"imageIndex": 10})
+
+
+  def testRandomState(self):
+    checkpointer = Checkpointer(self.checkpointDir)
+    random.seed(42)
+    numpy.random.seed(42)
+    checkpointer.save(FakeNetwork("net"), {})
+    expected = (random.random(), numpy.random.rand(5))
+
+    random.seed(1)
+    numpy.random.seed(1)
+    checkpointer.load()
+    self.assertEqual(random.random(), expected[0])
+    numpy.testing.assert_array_equal(numpy.random.rand(5), expected[1])
+
+
+  def testStep(self):
+    checkpointer = Checkpointer(self.checkpointDir, everyImages=3)
+    self.assertFalse(checkpointer.step())
+    self.assertFalse(checkpointer.step())
+    self.assertTrue(checkpointer.step())
+
+    # Saving restarts the count
+    checkpointer.save(FakeNetwork("net"), {})
+    self.assertFalse(checkpointer.step(2))
+    self.assertTrue(checkpointer.step(2))
+
+    self.assertFalse(Checkpointer(self.checkpointDir).step(1000))
+
+    checkpointer = Checkpointer(self.checkpointDir, everyMinutes=1)
+    self.assertFalse(checkpointer.step())
+    checkpointer._lastSaveTime -= 61
+    self.assertTrue(checkpointer.step())
+
+
+
+if __name__ == "__main__":
+  unittest.main()
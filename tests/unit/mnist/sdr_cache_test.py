@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2014, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+import unittest2 as unittest
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from nupic.bindings.math import GetNTAReal
+from nupic.vision.mnist.sdr_cache import SDRCache
+
+
+
+class SDRCacheTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.sdrs = [numpy.array([1, 5, 9]),
+                 numpy.array([], dtype=int),
+                 numpy.array([0, 63])]
+    self.labels = [3, 7, 0]
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testFromSDRs(self):
+    cache = SDRCache.fromSDRs(self.sdrs, self.labels, 64)
+    self.assertEqual(len(cache), 3)
+    numpy.testing.assert_array_equal(cache.offsets, [0, 3, 3, 5])
+    for i, sdr in enumerate(self.sdrs):
+      numpy.testing.assert_array_equal(cache.getSDR(i), sdr)
+    numpy.testing.assert_array_equal(cache.labels, self.labels)
+
+    # An image with no active columns
+    self.assertEqual(len(cache.getSDR(1)), 0)
+
+
+  def testFromNoSDRs(self):
+    cache = SDRCache.fromSDRs([], [], 64)
+    self.assertEqual(len(cache), 0)
+    numpy.testing.assert_array_equal(cache.offsets, [0])
+    self.assertEqual(len(cache.indices), 0)
+    self.assertEqual(cache.indices.dtype, numpy.int16)
+
+
+  def testGetIndexDType(self):
+    self.assertEqual(SDRCache.getIndexDType(2048), numpy.int16)
+    self.assertEqual(SDRCache.getIndexDType(32768), numpy.int16)
+    self.assertEqual(SDRCache.getIndexDType(32769), numpy.int32)
+
+    # The largest column index must survive the conversion
+    for columnCount in (32768, 32769, 40000):
+      cache = SDRCache.fromSDRs([numpy.array([0, columnCount - 1])], [0],
+                                columnCount)
+      self.assertEqual(cache.indices.dtype,
+                       SDRCache.getIndexDType(columnCount))
+      self.assertEqual(cache.getSDR(0)[-1], columnCount - 1)
+
+
+  def testSaveLoad(self):
+    path = os.path.join(self.tmpDir, "cache.npz")
+    cache = SDRCache.fromSDRs(self.sdrs, self.labels, 64)
+    cache.save(path)
+    # No suffix is appended to the path
+    self.assertEqual(os.listdir(self.tmpDir), ["cache.npz"])
+
+    loaded = SDRCache.load(path)
+    self.assertEqual(loaded.columnCount, 64)
+    for name in ("offsets", "indices", "labels"):
+      self.assertEqual(getattr(loaded, name).dtype,
+                       getattr(cache, name).dtype)
+      numpy.testing.assert_array_equal(getattr(loaded, name),
+                                       getattr(cache, name))
+
+
+  def testGetDense(self):
+    cache = SDRCache.fromSDRs(self.sdrs, self.labels, 64)
+    for i, sdr in enumerate(self.sdrs):
+      dense = cache.getDense(i)
+      self.assertEqual(dense.dtype, GetNTAReal())
+      self.assertEqual(dense.shape, (64,))
+      numpy.testing.assert_array_equal(dense.nonzero()[0], sdr)
+      self.assertEqual(dense.sum(), len(sdr))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2014, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+import unittest2 as unittest
+
+import numpy
+
+from nupic.vision.ocr.classifiers import bitPackedMatch, exactMatch
+
+
+
+def denseVote(patterns, categories, inputPattern, k):
+  """
+  Reference k nearest vote on the dense patterns: the k patterns with the
+  largest overlap vote, ties going to the category of the closest pattern.
+  """
+  overlaps = numpy.dot((patterns != 0).astype(int), inputPattern != 0)
+  order = sorted(range(len(patterns)), key=lambda i: -overlaps[i])
+  votes = {}
+  for i in order[:k]:
+    votes[categories[i]] = votes.get(categories[i], 0) + 1
+  best = max(votes.values())
+  return [categories[i] for i in order[:k] if votes[categories[i]] == best][0]
+
+
+
+class BitPackedMatchTest(unittest.TestCase):
+
+
+  def setUp(self):
+    # 100 bits so the last 64 bit word is only partially used
+    rng = numpy.random.RandomState(42)
+    self.patterns = (rng.rand(30, 100) < 0.1).astype(numpy.uint8)
+    self.categories = rng.randint(0, 5, size=30).tolist()
+    self.queries = (rng.rand(20, 100) < 0.1).astype(numpy.uint8)
+
+
+  def _learn(self, classifier):
+    for pattern, category in zip(self.patterns, self.categories):
+      classifier.learn(pattern, category)
+    return classifier
+
+
+  def testExactMatch(self):
+    dense = self._learn(exactMatch())
+    packed = self._learn(bitPackedMatch(k=0))
+    self.assertEqual(packed.numPatterns, len(self.patterns))
+
+    for pattern in self.patterns:
+      self.assertEqual(packed.infer(pattern), dense.infer(pattern))
+
+    # A repeated SDR keeps the category it was first learned with
+    dense.learn(self.patterns[3], self.categories[3] + 1)
+    packed.learn(self.patterns[3], self.categories[3] + 1)
+    self.assertEqual(packed.numPatterns, len(self.patterns))
+    self.assertEqual(packed.infer(self.patterns[3])[0], self.categories[3])
+    self.assertEqual(packed.infer(self.patterns[3]),
+                     dense.infer(self.patterns[3]))
+
+    # Without k there is no fallback to the nearest SDRs
+    self.assertEqual(packed.infer(self.queries[0])[0], None)
+
+
+  def testOverlaps(self):
+    packed = self._learn(bitPackedMatch())
+    for query in self.queries:
+      numpy.testing.assert_array_equal(
+          packed.overlaps(packed._pack(query)),
+          numpy.dot(self.patterns.astype(int), query))
+
+      _, _, dist, _ = packed.infer(query)
+      overlaps = numpy.dot(self.patterns.astype(int), query)
+      numpy.testing.assert_allclose(
+          dist, 1.0 - overlaps / float(max(query.sum(), 1)))
+
+
+  def testNearestVote(self):
+    for k in (1, 3, 5):
+      packed = self._learn(bitPackedMatch(k=k))
+      for query in self.queries:
+        winner, votes, _, _ = packed.infer(query)
+        self.assertEqual(winner,
+                         denseVote(self.patterns, self.categories, query, k))
+        self.assertEqual(sum(votes), k)
+
+
+  def testTie(self):
+    # Both stored SDRs overlap the query in 2 bits
+    a = numpy.array([1, 1, 1, 0, 0, 0, 0, 0], dtype=numpy.uint8)
+    b = numpy.array([0, 0, 0, 0, 1, 1, 1, 0], dtype=numpy.uint8)
+    query = numpy.array([1, 1, 0, 0, 1, 1, 0, 0], dtype=numpy.uint8)
+
+    for k in (1, 2):
+      for patterns, categories in (((a, b), [0, 1]), ((b, a), [1, 0])):
+        packed = bitPackedMatch(k=k)
+        for pattern, category in zip(patterns, categories):
+          packed.learn(pattern, category)
+        winner, votes, dist, categoryDist = packed.infer(query)
+        # The tie goes to the SDR learned first
+        self.assertEqual(winner, categories[0])
+        self.assertEqual(winner,
+                         denseVote(numpy.array(patterns), categories, query, k))
+        numpy.testing.assert_allclose(dist, [0.5, 0.5])
+        numpy.testing.assert_allclose(categoryDist, [0.5, 0.5])
+        self.assertEqual(list(votes), [1, 1] if k == 2 else
+                         [1 - categories[0], categories[0]])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -26,6 +26,7 @@ import os
 
 from PIL import Image, ImageDraw
 import numpy
+import yaml
 
 from nupic.engine import Network
 from nupic.vision.regions.ImageSensor import ImageSensor
@@ -133,6 +134,185 @@ class ImageSensorTest(unittest.TestCase):
     os.removedirs(os.path.join(tmpDir,'1'))
 
 
+  def testLoadArrayImages(self):
+    net = Network()
+    net.addRegion("sensor", "py.ImageSensor",
+                  "{width: 32, height: 32, explorer: '[Flash]'}")
+    pysensor = net.regions['sensor'].getSelf()
+
+    # Two unique rectangles, as in testLoadImages
+    pixels = numpy.zeros((2, 32, 32), dtype=numpy.uint8)
+    for i, offset in enumerate((10, 15)):
+      im = Image.new("L",(32,32))
+      draw = ImageDraw.Draw(im)
+      draw.rectangle((offset,offset,offset+10,offset+10), outline=255)
+      pixels[i] = numpy.asarray(im)
+
+    numImages, numMasks = pysensor.loadArrayImages(pixels, ['0', '1'])
+    self.assertEqual(numImages, 2)
+    self.assertEqual(numMasks, 0)
+    self.assertEqual([name for name, _ in pysensor.categoryInfo], ['0', '1'])
+    # Images are views of the array, not copies
+    self.assertTrue(numpy.may_share_memory(pysensor._imageList[1]["array"],
+                                           pixels))
+
+    outputs = {"dataOut": numpy.zeros(32 * 32, dtype=numpy.float32),
+               "categoryOut": numpy.zeros(1, dtype=numpy.float32),
+               "resetOut": numpy.zeros(1, dtype=numpy.float32)}
+    categories = []
+    for _ in range(2):
+      pysensor.compute(None, outputs)
+      category = int(outputs["categoryOut"][0])
+      categories.append(category)
+      numpy.testing.assert_array_equal(outputs["dataOut"].reshape(32, 32),
+                                       pixels[category])
+    self.assertEqual(sorted(categories), [0, 1])
+
+    # Category indices are shared with images loaded later
+    pysensor.loadArrayImages(pixels[::-1], ['1', '0'], clearImageList=False)
+    self.assertEqual(pysensor.getParameter('numImages'), 4)
+    self.assertEqual([item["categoryIndex"] for item in pysensor._imageList],
+                     [0, 1, 1, 0])
+
+
+  def testBatchOutputs(self):
+    pixels = numpy.zeros((5, 16, 16), dtype=numpy.uint8)
+    for i in range(5):
+      pixels[i, i:i+8, i:i+8] = 255
+    categories = ['0', '1', '2', '3', '4']
+
+    single = ImageSensor(width=16, height=16, explorer="[Flash]")
+    single.loadArrayImages(pixels, categories)
+    outputs = {"dataOut": numpy.zeros(16 * 16, dtype=numpy.float32),
+               "categoryOut": numpy.zeros(1, dtype=numpy.float32),
+               "resetOut": numpy.zeros(1, dtype=numpy.float32)}
+    expected = []
+    for _ in range(5):
+      single.compute(None, outputs)
+      expected.append(outputs["dataOut"].copy())
+
+    batched = ImageSensor(width=16, height=16, explorer="[Flash]",
+                          batchSize=5)
+    batched.loadArrayImages(pixels, categories)
+    self.assertEqual(batched.getOutputElementCount("dataOutBatch"), 5 * 256)
+    outputs.update(
+        dataOutBatch=numpy.zeros(5 * 16 * 16, dtype=numpy.float32),
+        categoryOutBatch=numpy.zeros(5, dtype=numpy.float32),
+        resetOutBatch=numpy.zeros(5, dtype=numpy.float32))
+    batched.compute(None, outputs)
+    numpy.testing.assert_array_equal(
+        outputs["dataOutBatch"].reshape(5, -1), expected)
+    self.assertEqual(sorted(outputs["categoryOutBatch"]), range(5))
+    # The batch outputs are sized from batchSize
+    self.assertRaises(RuntimeError, batched.setParameter, "batchSize", -1, 2)
+
+    # One epoch of the explorer in batches of 2
+    batches = list(single.iterateBatches(2))
+    self.assertEqual([len(data) for data, _, _ in batches], [2, 2, 1])
+    numpy.testing.assert_array_equal(
+        numpy.concatenate([data for data, _, _ in batches]), expected)
+
+
+  def testPerfStats(self):
+    pixels = numpy.zeros((4, 32, 32), dtype=numpy.uint8)
+    for i in range(4):
+      pixels[i, i:i+16, i:i+16] = 255
+    sensor = ImageSensor(width=16, height=16, explorer="[Flash]",
+                         filters=yaml.dump([["Resize", {"size": [16, 16]}]]),
+                         collectPerfStats=True)
+    # The first image of each category is loaded right away, and the
+    # explorer filters the first image to center on it
+    sensor.loadArrayImages(pixels, ['0', '0', '1', '1'])
+    perfStats = yaml.load(sensor.getParameter("perfStats"))
+    self.assertEqual(perfStats["loadImage"]["count"], 2)
+    self.assertEqual(perfStats["filters[0]:Resize"]["count"], 1)
+    sensor.resetPerfStats()
+    self.assertEqual(yaml.load(sensor.getParameter("perfStats")), {})
+
+    outputs = {"dataOut": numpy.zeros(16 * 16, dtype=numpy.float32),
+               "categoryOut": numpy.zeros(1, dtype=numpy.float32),
+               "resetOut": numpy.zeros(1, dtype=numpy.float32)}
+    # Two passes over the images. Only the images that were not loaded or
+    # filtered yet are, and the filter outputs are cached after that.
+    for _ in range(8):
+      sensor.compute(None, outputs)
+    perfStats = yaml.load(sensor.getParameter("perfStats"))
+    expectedCounts = {"explorer": 8, "loadImage": 2, "filters[0]:Resize": 3,
+                      "getOutputImages": 8, "crop": 8, "logging": 8,
+                      "outputs": 8, "compute": 8}
+    self.assertEqual(dict((stage, stats["count"])
+                          for stage, stats in perfStats.iteritems()),
+                     expectedCounts)
+    for stats in perfStats.itervalues():
+      self.assertGreaterEqual(stats["totalTime"], 0)
+      self.assertAlmostEqual(stats["meanTime"],
+                             stats["totalTime"] / stats["count"])
+    # The stages are part of compute
+    self.assertLessEqual(perfStats["outputs"]["totalTime"],
+                         perfStats["compute"]["totalTime"])
+
+    sensor.resetPerfStats()
+    self.assertEqual(yaml.load(sensor.getParameter("perfStats")), {})
+
+    # Nothing is recorded while collectPerfStats is off
+    sensor.setParameter("collectPerfStats", -1, False)
+    sensor.compute(None, outputs)
+    sensor.loadArrayImages(pixels, ['0', '0', '1', '1'])
+    self.assertEqual(yaml.load(sensor.getParameter("perfStats")), {})
+
+
+  def testScaleToSameSize(self):
+    pixels = numpy.zeros((2, 16, 16), dtype=numpy.uint8)
+    pixels[:, 4:12, 4:12] = 255
+    sensor = ImageSensor(width=16, height=16, explorer="[Flash]",
+                         filters=yaml.dump([["MultipleScales",
+                                             {"scales": [1.0]}]]))
+    sensor.loadArrayImages(pixels, ['0', '1'])
+    outputs = {"dataOut": numpy.zeros(16 * 16, dtype=numpy.float32),
+               "categoryOut": numpy.zeros(1, dtype=numpy.float32),
+               "resetOut": numpy.zeros(1, dtype=numpy.float32)}
+    sensor.compute(None, outputs)
+
+    # The filter output is a new image, not the cached original
+    imageIndex, filterPosition = sensor._filterQueue[0]
+    item = sensor._imageList[imageIndex]
+    filtered = item["filtered"][filterPosition][0]
+    self.assertIsNot(filtered, item["image"])
+    numpy.testing.assert_array_equal(numpy.asarray(filtered),
+                                     numpy.asarray(item["image"]))
+    self.assertNotIn("scalePyramid", filtered.info)
+
+
+  def testScalePyramidReleased(self):
+    pixels = numpy.zeros((3, 32, 32), dtype=numpy.uint8)
+    for i in range(3):
+      pixels[i, i:i+16, i:i+16] = 255
+    # Room for the three originals and a single filtered image
+    sensor = ImageSensor(width=16, height=16, explorer="[Flash]",
+                         filters=yaml.dump([["Resize", {"size": [16, 16]}]]),
+                         memoryLimit=(3 * 32 * 32 + 16 * 16) * 4 / 1000000.0)
+    sensor.loadArrayImages(pixels, ['0', '1', '2'])
+    outputs = {"dataOut": numpy.zeros(16 * 16, dtype=numpy.float32),
+               "categoryOut": numpy.zeros(1, dtype=numpy.float32),
+               "resetOut": numpy.zeros(1, dtype=numpy.float32)}
+
+    originals = []
+    for _ in range(3):
+      sensor.compute(None, outputs)
+      # The most recently filtered image is first in the queue
+      imageIndex, _ = sensor._filterQueue[0]
+      image = sensor._imageList[imageIndex]["image"]
+      self.assertIn("scalePyramid", image.info)
+      originals.append(image)
+
+    # Only the pyramid of the image whose output is still held is kept
+    self.assertEqual(len(sensor._filterQueue), 1)
+    self.assertIn("scalePyramid", originals[-1].info)
+    self.assertEqual(len(set(map(id, originals))), 3)
+    for image in originals[:-1]:
+      self.assertNotIn("scalePyramid", image.info)
+
+
   @unittest.skip("Currently failing...")
   def testRunPCANode(self):
     from nupic.engine import *
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2014, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+import unittest2 as unittest
+
+import numpy
+
+from nupic.vision.regions.PCANode import PCANode
+
+
+
+class PCANodeTest(unittest.TestCase):
+
+
+  def setUp(self):
+    # Samples close to a 3 dimensional subspace, with an offset so the mean
+    # matters. More than one incremental batch of 256 samples.
+    rng = numpy.random.RandomState(37)
+    basis = numpy.linalg.qr(rng.normal(size=(20, 3)))[0].T
+    coefficients = rng.normal(size=(600, 3)) * [10.0, 5.0, 2.0]
+    self.samples = (numpy.dot(coefficients, basis) + 3.0 +
+                    0.001 * rng.normal(size=(600, 20)))
+
+
+  def _computeSVD(self, **kwargs):
+    node = PCANode(SVDDimCount=3, **kwargs)
+    for sample in self.samples:
+      node.compute(sample, None)
+    node.computeSVD()
+    return node
+
+
+  def testUnknownSVDMethod(self):
+    self.assertRaises(ValueError, PCANode, SVDMethod='lanczos')
+    self.assertRaises(ValueError, PCANode, SVDMethod='randomized',
+                      storeSamples=False)
+
+
+  def testSVDMethods(self):
+    full = self._computeSVD(SVDMethod='full')
+    self.assertEqual(full._vt.shape, (3, 20))
+    numpy.testing.assert_allclose(full._mean, self.samples.mean(axis=0),
+                                  rtol=1e-5)
+
+    for kwargs in (dict(SVDMethod='randomized'),
+                   dict(SVDMethod='incremental'),
+                   dict(SVDMethod='incremental', storeSamples=False)):
+      node = self._computeSVD(**kwargs)
+      numpy.testing.assert_allclose(node._mean, full._mean, rtol=1e-5)
+      numpy.testing.assert_allclose(node._s[:3], full._s[:3], rtol=1e-4)
+      # The basis vectors are the same up to their sign
+      self.assertEqual(node._vt.shape, (3, 20))
+      numpy.testing.assert_allclose(
+          numpy.abs(numpy.dot(node._vt, full._vt.T)), numpy.eye(3),
+          atol=1e-4)
+
+      projections = node.projectBatch(self.samples)
+      numpy.testing.assert_allclose(
+          numpy.abs(projections), numpy.abs(full.projectBatch(self.samples)),
+          rtol=1e-3, atol=1e-3)
+
+
+
+if __name__ == "__main__":
+  unittest.main()